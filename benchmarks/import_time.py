@@ -0,0 +1,74 @@
+"""Measures flow's cold-start import cost with `python -X importtime`.
+
+Exits non-zero if importing a module takes longer than the budget or pulls in
+one of the heavy libraries that backends are supposed to import lazily:
+
+```bash
+PYTHONPATH='.' python benchmarks/import_time.py --budget_ms 300
+```
+"""
+
+import subprocess
+import sys
+
+from absl import app
+from absl import flags
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_list(
+    "modules",
+    ["flow.task_spec", "flow.task_parser", "flow.event_handler", "flow.task_io"],
+    "Modules whose cold import is measured.",
+)
+flags.DEFINE_float("budget_ms", 300, "Maximum cumulative import time per module.")
+flags.DEFINE_integer("top", 10, "Number of slowest imports to list.")
+
+HEAVY_MODULES = [
+    "google.cloud.storage",
+    "googleapiclient.discovery",
+    "lucid.misc.io",
+    "numpy",
+    "tensorflow",
+]
+
+
+def import_times(module):
+    """Returns {imported module: cumulative microseconds} for a cold import."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main(argv):
+    del argv  # Unused.
+    failed = False
+    for module in FLAGS.modules:
+        times = import_times(module)
+        total_ms = times[module] / 1000
+        heavy = [name for name in HEAVY_MODULES if name in times]
+        print(f"{module}: {total_ms:.1f}ms")
+        slowest = sorted(times.items(), key=lambda item: -item[1])[1 : FLAGS.top + 1]
+        for name, microseconds in slowest:
+            print(f"    {microseconds / 1000:8.1f}ms  {name}")
+        if total_ms > FLAGS.budget_ms:
+            print(f"  over budget of {FLAGS.budget_ms}ms!")
+            failed = True
+        if heavy:
+            print(f"  imports heavy modules eagerly: {heavy}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    app.run(main)
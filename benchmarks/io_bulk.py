@@ -0,0 +1,95 @@
+"""Benchmarks bulk IOAdapter calls against per-item calls.
+
+Uses a local directory as a fake object store, with a fixed per-request
+latency to approximate a remote store such as GCS:
+
+```bash
+PYTHONPATH='.' python benchmarks/io_bulk.py --num_files 200 --latency 0.02
+```
+"""
+
+import time
+from tempfile import mkdtemp
+from timeit import default_timer as timer
+from os.path import join
+from os import makedirs
+
+from absl import app
+from absl import flags
+
+from flow.io_adapter import LocalFSAdapter
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer("num_files", 200, "Number of objects in the fake store.")
+flags.DEFINE_float("latency", 0.02, "Simulated per-request latency in seconds.")
+
+
+class LatentLocalFSAdapter(LocalFSAdapter):
+    """A LocalFSAdapter that sleeps before every request, like a remote store."""
+
+    def __init__(self, root_dir: str, latency: float) -> None:
+        super().__init__(root_dir)
+        self.latency = latency
+
+    def _download(self, path):
+        time.sleep(self.latency)
+        return super()._download(path)
+
+    def _upload(self, local_path, remote_path):
+        time.sleep(self.latency)
+        return super()._upload(local_path, remote_path)
+
+    def _stat(self, path):
+        time.sleep(self.latency)
+        return super()._stat(path)
+
+
+def report(name, duration, num_items):
+    print(f"{name:>24}: {duration:7.3f}s ({num_items / duration:8.1f} items/s)")
+
+
+def main(argv):
+    del argv  # Unused.
+    root_dir = mkdtemp()
+    makedirs(join(root_dir, "data"))
+    paths = []
+    for i in range(FLAGS.num_files):
+        path = f"/data/file{i:05}.txt"
+        with open(join(root_dir, path[1:]), "w") as handle:
+            handle.write(str(i))
+        paths.append(path)
+    adapter = LatentLocalFSAdapter(root_dir, FLAGS.latency)
+
+    start = timer()
+    for path in paths:
+        adapter.download(path)
+    report("download (sequential)", timer() - start, len(paths))
+
+    start = timer()
+    adapter.download_many(paths)
+    report("download_many", timer() - start, len(paths))
+
+    start = timer()
+    for path in paths:
+        adapter.stat(path)
+    report("stat (sequential)", timer() - start, len(paths))
+
+    start = timer()
+    adapter.stat_many(paths)
+    report("stat_many", timer() - start, len(paths))
+
+    local_path = join(root_dir, paths[0][1:])
+    transfers = [(local_path, f"/uploads/file{i:05}.txt") for i in range(len(paths))]
+    start = timer()
+    for transfer in transfers:
+        adapter.upload(*transfer)
+    report("upload (sequential)", timer() - start, len(paths))
+
+    start = timer()
+    adapter.upload_many(transfers)
+    report("upload_many", timer() - start, len(paths))
+
+
+if __name__ == "__main__":
+    app.run(main)
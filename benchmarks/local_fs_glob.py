@@ -0,0 +1,60 @@
+"""Benchmarks LocalFSAdapter's scandir-built glob index against `glob.glob`.
+
+```bash
+PYTHONPATH='.' python benchmarks/local_fs_glob.py --num_dirs 100 --files_per_dir 100
+```
+"""
+
+from glob import glob
+from os import makedirs
+from os.path import join
+from tempfile import mkdtemp
+from timeit import default_timer as timer
+
+from absl import app
+from absl import flags
+
+from flow.io_adapter import LocalFSAdapter
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer("num_dirs", 100, "Number of input directories.")
+flags.DEFINE_integer("files_per_dir", 100, "Number of files per directory.")
+flags.DEFINE_integer("num_globs", 200, "Number of globs to evaluate.")
+
+
+def report(name, duration, num_globs):
+    print(f"{name:>24}: {duration:7.3f}s ({duration / num_globs * 1e3:8.3f}ms/glob)")
+
+
+def main(argv):
+    del argv  # Unused.
+    root_dir = mkdtemp()
+    for d in range(FLAGS.num_dirs):
+        directory = join(root_dir, "data", f"dir{d:04}")
+        makedirs(directory)
+        for f in range(FLAGS.files_per_dir):
+            open(join(directory, f"file{f:05}.txt"), "w").close()
+    patterns = [
+        f"/data/dir{i % FLAGS.num_dirs:04}/*.txt" for i in range(FLAGS.num_globs)
+    ]
+
+    start = timer()
+    for pattern in patterns:
+        glob(join(root_dir, pattern[1:]))
+    report("glob.glob", timer() - start, len(patterns))
+
+    adapter = LocalFSAdapter(root_dir)
+    start = timer()
+    adapter.file_list
+    build_duration = timer() - start
+    print(f"{'index build (scandir)':>24}: {build_duration:7.3f}s")
+
+    start = timer()
+    for pattern in patterns:
+        adapter.glob(pattern)
+    report("LocalFSAdapter.glob", timer() - start, len(patterns))
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -0,0 +1,72 @@
+"""Benchmarks job planning, execution and enqueueing against a simulated store.
+
+Uses MemoryIOAdapter with injected latency and bandwidth instead of GCS:
+
+```bash
+PYTHONPATH='.' python benchmarks/planner.py --num_names 1000 --latency 0.02
+```
+"""
+
+from tempfile import mkdtemp
+from timeit import default_timer as timer
+
+from absl import app
+from absl import flags
+
+from flow.io_adapter import io
+from flow.memory_io_adapter import MemoryIOAdapter
+from flow.task_parser import TaskParser
+from flow.queue import LocalEnqueuer
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer("num_names", 1000, "Number of input files.")
+flags.DEFINE_integer("num_executions", 20, "Number of jobs to execute.")
+flags.DEFINE_float("latency", 0.02, "Simulated per-request latency in seconds.")
+flags.DEFINE_float("bandwidth", 50e6, "Simulated bandwidth in bytes per second.")
+
+TASK_SOURCE = b"""
+x = [1, 2, 3]
+name = "/data/names/{name_file}.txt"
+output = "/data/greetings/{name_file}-{x}.txt"
+
+def main():
+    return "Hello {name} for the {x} time!".format(name=name, x=x)
+"""
+
+
+def report(name, duration, num_items):
+    print(f"{name:>24}: {duration:7.3f}s ({num_items / duration:10.1f} items/s)")
+
+
+def main(argv):
+    del argv  # Unused.
+    adapter = MemoryIOAdapter(latency=FLAGS.latency, bandwidth=FLAGS.bandwidth)
+    adapter.put("/tasks/greetings.py", TASK_SOURCE)
+    for i in range(FLAGS.num_names):
+        adapter.put(f"/data/names/name{i:05}.txt", f"name {i}".encode())
+    io.configure(adapter)
+
+    start = timer()
+    task_spec = TaskParser("/tasks/greetings.py").to_spec()
+    report("parse task", timer() - start, 1)
+
+    start = timer()
+    bindings = task_spec.all_bindings()
+    report("all_bindings", timer() - start, len(bindings))
+
+    job_specs = list(task_spec.to_job_specs())
+    start = timer()
+    for job_spec in job_specs[: FLAGS.num_executions]:
+        job_spec.execute()
+    report("JobSpec.execute", timer() - start, FLAGS.num_executions)
+
+    FLAGS.local_queue_export_path = mkdtemp()
+    start = timer()
+    LocalEnqueuer().add(job_specs)
+    report("LocalEnqueuer (export)", timer() - start, len(job_specs))
+    print(f"{'simulated requests':>24}: {adapter.requests}")
+
+
+if __name__ == "__main__":
+    app.run(main)
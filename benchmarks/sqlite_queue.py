@@ -0,0 +1,77 @@
+"""Benchmarks leasing throughput of the SQLite pull queue with many workers.
+
+Each worker process leases batches, "works" for a simulated duration, and acks
+or, at the given failure rate, nacks every task:
+
+```bash
+PYTHONPATH='.' python benchmarks/sqlite_queue.py --num_tasks 10000 --num_workers 8
+```
+"""
+
+import random
+import time
+from os import path
+from tempfile import mkdtemp
+from timeit import default_timer as timer
+
+from absl import app
+from absl import flags
+
+from flow.process_pool import IsolatedProcessPool
+from flow.queue.sqlite import SQLiteQueue
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer("num_tasks", 10000, "Number of tasks to enqueue.")
+flags.DEFINE_integer("num_workers", 8, "Number of worker processes.")
+flags.DEFINE_integer("lease_batch", 10, "Tasks leased per request.")
+flags.DEFINE_float("work_seconds", 0.0, "Simulated work per task in seconds.")
+flags.DEFINE_float("failure_rate", 0.01, "Probability that a task gets nacked.")
+
+
+def work(arguments):
+    queue, lease_batch, work_seconds, failure_rate = arguments
+    acked = nacked = leases = 0
+    while True:
+        leased = queue.lease(lease_batch, lease_seconds=60)
+        if not leased:
+            return acked, nacked, leases
+        leases += 1
+        for task in leased:
+            time.sleep(work_seconds)
+            if random.random() < failure_rate:
+                queue.nack(task, error="Simulated failure.")
+                nacked += 1
+            else:
+                queue.ack(task)
+                acked += 1
+
+
+def report(name, duration, num_items):
+    print(f"{name:>24}: {duration:7.3f}s ({num_items / duration:10.1f} items/s)")
+
+
+def main(argv):
+    del argv  # Unused.
+    queue = SQLiteQueue(path.join(mkdtemp(), "queue.sqlite"))
+
+    start = timer()
+    queue.insert(f'{{"task": {i}}}' for i in range(FLAGS.num_tasks))
+    report("insert", timer() - start, FLAGS.num_tasks)
+
+    arguments = (queue, FLAGS.lease_batch, FLAGS.work_seconds, FLAGS.failure_rate)
+    start = timer()
+    with IsolatedProcessPool(FLAGS.num_workers) as pool:
+        completions = list(
+            pool.imap_unordered(work, [arguments] * FLAGS.num_workers)
+        )
+    duration = timer() - start
+    acked, nacked, leases = (sum(c.result[i] for c in completions) for i in range(3))
+    report("lease + ack/nack", duration, acked + nacked)
+    print(f"{'lease requests':>24}: {leases}")
+    print(f"{'nacked':>24}: {nacked}")
+    print(f"{'dead letters':>24}: {queue.counts()['dead']}")
+
+
+if __name__ == "__main__":
+    app.run(main)
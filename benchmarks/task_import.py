@@ -0,0 +1,82 @@
+"""Measures the cost of importing a task module once per job.
+
+Compares compiling the task source on every import, as `JobSpec.execute` used
+to, with executing code objects from the source hash keyed cache:
+
+```bash
+PYTHONPATH='.' python benchmarks/task_import.py --num_jobs 1000 --num_inputs 200
+```
+"""
+
+import importlib.util
+from os import environ, path
+from tempfile import mkdtemp
+from timeit import default_timer as timer
+from uuid import uuid4
+
+from absl import app
+from absl import flags
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer("num_jobs", 1000, "Number of imports to time.")
+flags.DEFINE_integer("num_inputs", 200, "Inputs declared by the generated task.")
+
+
+def write_task(directory, num_inputs):
+    lines = [f'input_{i} = "/data/{i}/{{name_{i}}}.txt"' for i in range(num_inputs)]
+    lines.append('output = "/out/{name_0}.txt"')
+    lines.append("")
+    lines.append("def main():")
+    lines += [f"  value_{i} = len(input_{i}) * {i}" for i in range(num_inputs)]
+    lines.append("  return value_0")
+    task_path = path.join(directory, "task.py")
+    with open(task_path, "w") as task_file:
+        task_file.write("\n".join(lines) + "\n")
+    return task_path
+
+
+def import_uncached(task_path):
+    module_name = "task_specification_" + str(uuid4())
+    spec = importlib.util.spec_from_file_location(module_name, task_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def report(name, duration, num_jobs):
+    per_job = duration / num_jobs * 1e6
+    print(f"{name:>24}: {duration:7.3f}s ({per_job:8.1f} µs/job)")
+
+
+def main(argv):
+    del argv  # Unused.
+    directory = mkdtemp()
+    environ["FLOW_CACHE_DIR"] = path.join(directory, "cache")
+    # imported after setting the cache directory
+    from flow import dynamic_import
+
+    task_path = write_task(directory, FLAGS.num_inputs)
+
+    start = timer()
+    for _ in range(FLAGS.num_jobs):
+        import_uncached(task_path)
+    report("compile every import", timer() - start, FLAGS.num_jobs)
+
+    start = timer()
+    dynamic_import.import_module_from_local_source(task_path)
+    report("first cached import", timer() - start, 1)
+
+    dynamic_import._code_cache.clear()
+    start = timer()
+    dynamic_import.import_module_from_local_source(task_path)
+    report("from marshal store", timer() - start, 1)
+
+    start = timer()
+    for _ in range(FLAGS.num_jobs):
+        dynamic_import.import_module_from_local_source(task_path)
+    report("from memory", timer() - start, FLAGS.num_jobs)
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -0,0 +1,287 @@
+"""Asyncio counterpart of IOAdapter.
+
+Lets a single process overlap many lookups and transfers, e.g. inside a request
+handler, instead of blocking on every call. Two implementations are provided:
+
+* `ExecutorAsyncIOAdapter` wraps any synchronous IOAdapter (GCS, local FS) and
+  runs its calls on the shared I/O thread pool.
+* `MemoryAsyncIOAdapter` keeps objects in a dict; useful for tests.
+"""
+
+import asyncio
+import fnmatch
+from abc import ABC, abstractmethod
+from io import BytesIO, StringIO
+from os import makedirs
+from os.path import dirname, normpath
+from tempfile import mkdtemp
+from typing import Any, Awaitable, Callable, Dict, IO, Iterable, List, Optional, Tuple
+
+from flow.file_list import FileStat
+from flow.io_adapter import IOAdapter, TransferResult
+from flow.path import AbsolutePath
+from flow.util import io_executor, MAX_IO_WORKERS
+
+
+class _AsyncReading(object):
+    """Async context manager returned by `AsyncIOAdapter.reading`."""
+
+    def __init__(self, adapter: "AsyncIOAdapter", path: str, mode: str) -> None:
+        self.adapter = adapter
+        self.path = path
+        self.mode = mode
+
+    async def __aenter__(self) -> IO:
+        data = await self.adapter._read_bytes(self.adapter.normpath(self.path))
+        if "b" in self.mode:
+            self.handle = BytesIO(data)  # type: IO
+        else:
+            self.handle = StringIO(data.decode())
+        return self.handle
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.handle.close()
+
+
+class _AsyncWriting(object):
+    """Async context manager returned by `AsyncIOAdapter.writing`.
+
+    Buffers writes in memory and stores them once the block exits cleanly.
+    """
+
+    def __init__(self, adapter: "AsyncIOAdapter", path: str, mode: str) -> None:
+        self.adapter = adapter
+        self.path = path
+        self.mode = mode
+
+    async def __aenter__(self) -> IO:
+        self.handle = BytesIO() if "b" in self.mode else StringIO()  # type: IO
+        return self.handle
+
+    async def __aexit__(self, exc_type: Any, *exc_info: Any) -> None:
+        data = self.handle.getvalue()
+        self.handle.close()
+        if exc_type is None:
+            if isinstance(data, str):
+                data = data.encode()
+            await self.adapter._write_bytes(self.adapter.normpath(self.path), data)
+
+
+class AsyncIOAdapter(ABC):
+
+    max_concurrency: int = MAX_IO_WORKERS
+
+    def reading(self, path: str, mode: str = "rb") -> _AsyncReading:
+        return _AsyncReading(self, path, mode)
+
+    def writing(self, path: str, mode: str = "w+b") -> _AsyncWriting:
+        return _AsyncWriting(self, path, mode)
+
+    async def glob(self, path: str) -> List[AbsolutePath]:
+        return await self._glob(self.normpath(path))
+
+    async def exists(self, path: str) -> bool:
+        return await self._exists(self.normpath(path))
+
+    async def exist(self, paths: List[str]) -> List[bool]:
+        normalized = [self.normpath(path) for path in paths]
+        return await self._gather_bounded(self._exists, normalized)
+
+    async def stat(self, path: str) -> Optional[FileStat]:
+        return await self._stat(self.normpath(path))
+
+    async def stat_many(self, paths: List[str]) -> List[Optional[FileStat]]:
+        normalized = [self.normpath(path) for path in paths]
+        return await self._gather_bounded(self._stat, normalized)
+
+    async def download(self, path: str) -> AbsolutePath:
+        return await self._download(self.normpath(path))
+
+    async def upload(self, local_path: str, remote_path: str) -> None:
+        return await self._upload(local_path, self.normpath(remote_path))
+
+    # Bulk operations
+
+    async def download_many(self, paths: List[str]) -> List[TransferResult]:
+        normalized = [self.normpath(path) for path in paths]
+        return await self._gather_results(self._download, normalized)
+
+    async def upload_many(
+        self, transfers: List[Tuple[str, str]]
+    ) -> List[TransferResult]:
+        remote_paths = [self.normpath(remote) for _, remote in transfers]
+
+        async def upload(index: int) -> None:
+            return await self._upload(transfers[index][0], remote_paths[index])
+
+        results = await self._gather_results(upload, range(len(transfers)))
+        return [
+            result._replace(path=remote_path)
+            for result, remote_path in zip(results, remote_paths)
+        ]
+
+    async def _gather_bounded(
+        self, function: Callable[[Any], Awaitable[Any]], items: Iterable[Any]
+    ) -> List[Any]:
+        """Awaits `function` for all items, at most `max_concurrency` at a time."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(item: Any) -> Any:
+            async with semaphore:
+                return await function(item)
+
+        return await asyncio.gather(*[bounded(item) for item in items])
+
+    async def _gather_results(
+        self, function: Callable[[Any], Awaitable[Any]], items: Iterable[Any]
+    ) -> List[TransferResult]:
+        async def capture(item: Any) -> TransferResult:
+            try:
+                return TransferResult(item, await function(item))
+            except Exception as error:
+                return TransferResult(item, error=error)
+
+        return await self._gather_bounded(capture, items)
+
+    @abstractmethod
+    def normpath(self, path: str) -> AbsolutePath:
+        pass
+
+    @abstractmethod
+    async def _read_bytes(self, path: AbsolutePath) -> bytes:
+        pass
+
+    @abstractmethod
+    async def _write_bytes(self, path: AbsolutePath, data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    async def _glob(self, path: AbsolutePath) -> List[AbsolutePath]:
+        pass
+
+    @abstractmethod
+    async def _exists(self, path: AbsolutePath) -> bool:
+        pass
+
+    @abstractmethod
+    async def _stat(self, path: AbsolutePath) -> Optional[FileStat]:
+        pass
+
+    @abstractmethod
+    async def _download(self, path: AbsolutePath) -> AbsolutePath:
+        pass
+
+    @abstractmethod
+    async def _upload(self, local_path: str, remote_path: AbsolutePath) -> None:
+        pass
+
+
+# ExecutorAsyncIOAdapter
+
+
+class ExecutorAsyncIOAdapter(AsyncIOAdapter):
+    """Runs a synchronous IOAdapter's blocking calls on the shared I/O pool."""
+
+    def __init__(self, adapter: IOAdapter) -> None:
+        self.adapter = adapter
+
+    def normpath(self, path: str) -> AbsolutePath:
+        return self.adapter.normpath(path)
+
+    async def _run(self, function: Callable, *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(io_executor(), function, *args)
+
+    def _read_bytes_sync(self, path: AbsolutePath) -> bytes:
+        with self.adapter.reading(path) as handle:
+            return handle.read()
+
+    def _write_bytes_sync(self, path: AbsolutePath, data: bytes) -> None:
+        with self.adapter.writing(path) as handle:
+            handle.write(data)
+
+    async def _read_bytes(self, path: AbsolutePath) -> bytes:
+        return await self._run(self._read_bytes_sync, path)
+
+    async def _write_bytes(self, path: AbsolutePath, data: bytes) -> None:
+        return await self._run(self._write_bytes_sync, path, data)
+
+    async def _glob(self, path: AbsolutePath) -> List[AbsolutePath]:
+        return await self._run(self.adapter.glob, path)
+
+    async def _exists(self, path: AbsolutePath) -> bool:
+        return await self._run(self.adapter.exists, path)
+
+    async def _stat(self, path: AbsolutePath) -> Optional[FileStat]:
+        return await self._run(self.adapter.stat, path)
+
+    async def _download(self, path: AbsolutePath) -> AbsolutePath:
+        return await self._run(self.adapter.download, path)
+
+    async def _upload(self, local_path: str, remote_path: AbsolutePath) -> None:
+        return await self._run(self.adapter.upload, local_path, remote_path)
+
+
+# MemoryAsyncIOAdapter
+
+
+class MemoryAsyncIOAdapter(AsyncIOAdapter):
+    """Keeps all objects in a dict. Downloads materialize into a temp dir.
+
+  Every call waits `latency` seconds, like a request to remote storage would.
+  """
+
+    objects: Dict[AbsolutePath, bytes]
+
+    def __init__(
+        self, objects: Optional[Dict[str, bytes]] = None, latency: float = 0.0
+    ) -> None:
+        self.latency = latency
+        self.objects = {}
+        for path, data in (objects or {}).items():
+            self.objects[self.normpath(path)] = data
+        self.tempdir = AbsolutePath(mkdtemp())
+
+    def normpath(self, path: str) -> AbsolutePath:
+        path = normpath(path)
+        if not path.startswith("/"):
+            path = "/" + path
+        return AbsolutePath(path)
+
+    async def _read_bytes(self, path: AbsolutePath) -> bytes:
+        await asyncio.sleep(self.latency)
+        try:
+            return self.objects[path]
+        except KeyError:
+            raise FileNotFoundError(path)
+
+    async def _write_bytes(self, path: AbsolutePath, data: bytes) -> None:
+        await asyncio.sleep(self.latency)
+        self.objects[path] = data
+
+    async def _glob(self, path: AbsolutePath) -> List[AbsolutePath]:
+        await asyncio.sleep(self.latency)
+        return sorted(fnmatch.filter(self.objects.keys(), path))
+
+    async def _exists(self, path: AbsolutePath) -> bool:
+        await asyncio.sleep(self.latency)
+        return path in self.objects
+
+    async def _stat(self, path: AbsolutePath) -> Optional[FileStat]:
+        await asyncio.sleep(self.latency)
+        if path not in self.objects:
+            return None
+        return FileStat(path, len(self.objects[path]))
+
+    async def _download(self, path: AbsolutePath) -> AbsolutePath:
+        data = await self._read_bytes(path)
+        local_path = self.tempdir.append(path.as_relative_path())
+        makedirs(dirname(local_path), exist_ok=True)
+        with open(local_path, "wb") as handle:
+            handle.write(data)
+        return local_path
+
+    async def _upload(self, local_path: str, remote_path: AbsolutePath) -> None:
+        with open(local_path, "rb") as handle:
+            data = handle.read()
+        await self._write_bytes(remote_path, data)
@@ -0,0 +1,113 @@
+"""Registry of IOAdapter and Enqueuer backends.
+
+Backends are registered by name as "module:attribute" strings and are only
+imported when first created, so importing flow stays cheap no matter which
+cloud client libraries a backend needs.
+
+The environment picks the defaults:
+
+* FLOW_IO_BACKEND: "gcs" (default), "local" or "memory". USE_LOCAL_FS=TRUE is a
+  shorthand for "local", which is rooted at FLOW_LOCAL_FS_ROOT.
+* FLOW_QUEUE_BACKEND: "gcpulltasks" (default), "gctasks", "gcpubsub", "local"
+  or "sqlite". USE_LOCAL_QUEUE=TRUE is a shorthand for "local". The sqlite
+  queue lives in the file FLOW_SQLITE_QUEUE_PATH. Pull workers lease from the
+  same backend, which must be "gcpulltasks" or "sqlite".
+"""
+
+import logging
+from importlib import import_module
+from os import getenv
+from typing import Any, Callable, Dict, Optional, Union
+
+Factory = Union[str, Callable[..., Any]]
+
+IO_BACKENDS: Dict[str, Factory] = {
+    "gcs": "flow.io_adapter:GCStorageAdapter",
+    "local": "flow.io_adapter:LocalFSAdapter",
+    "memory": "flow.memory_io_adapter:MemoryIOAdapter",
+}
+
+QUEUE_BACKENDS: Dict[str, Factory] = {
+    "gcpulltasks": "flow.queue.gcpulltasks:GCPullTasksEnqueuer",
+    "gctasks": "flow.queue.gctasks:GCTasksEnqueuer",
+    "gcpubsub": "flow.queue.gcpubsub:GCPubSubEnqueuer",
+    "local": "flow.queue.local:LocalEnqueuer",
+    "sqlite": "flow.queue.sqlite:SQLiteQueue",
+}
+
+PULL_QUEUE_BACKENDS: Dict[str, Factory] = {
+    "gcpulltasks": "flow.queue.gcpulltasks:GCPullQueueClient",
+    "sqlite": "flow.queue.sqlite:SQLiteQueue",
+}
+
+
+def register_io_backend(name: str, factory: Factory) -> None:
+    IO_BACKENDS[name] = factory
+
+
+def register_queue_backend(name: str, factory: Factory) -> None:
+    QUEUE_BACKENDS[name] = factory
+
+
+def register_pull_queue_backend(name: str, factory: Factory) -> None:
+    PULL_QUEUE_BACKENDS[name] = factory
+
+
+def _resolve(factory: Factory) -> Callable[..., Any]:
+    if callable(factory):
+        return factory
+    module_name, attribute = factory.split(":")
+    return getattr(import_module(module_name), attribute)
+
+
+def _create(registry: Dict[str, Factory], kind: str, name: str, **kwargs: Any) -> Any:
+    try:
+        factory = registry[name]
+    except KeyError:
+        raise ValueError(f"Unknown {kind} backend `{name}`; known: {list(registry)}.")
+    return _resolve(factory)(**kwargs)
+
+
+def io_backend_name() -> str:
+    name = getenv("FLOW_IO_BACKEND", "").lower()
+    if name:
+        return name
+    return "local" if getenv("USE_LOCAL_FS", "").startswith("TRUE") else "gcs"
+
+
+def queue_backend_name() -> str:
+    name = getenv("FLOW_QUEUE_BACKEND", "").lower()
+    if name:
+        return name
+    return (
+        "local" if getenv("USE_LOCAL_QUEUE", "").startswith("TRUE") else "gcpulltasks"
+    )
+
+
+def create_io_adapter(name: Optional[str] = None, **kwargs: Any) -> Any:
+    """Creates an IOAdapter; `name` defaults to the configured backend."""
+    name = name or io_backend_name()
+    if name == "local":
+        kwargs.setdefault("root_dir", getenv("FLOW_LOCAL_FS_ROOT", "."))
+    logging.info("Creating IO backend `%s`.", name)
+    return _create(IO_BACKENDS, "IO", name, **kwargs)
+
+
+def create_enqueuer(name: Optional[str] = None, **kwargs: Any) -> Any:
+    """Creates an Enqueuer; `name` defaults to the configured backend."""
+    name = name or queue_backend_name()
+    if name == "sqlite":
+        path = getenv("FLOW_SQLITE_QUEUE_PATH", "flow-queue.sqlite")
+        kwargs.setdefault("path", path)
+    logging.info("Creating queue backend `%s`.", name)
+    return _create(QUEUE_BACKENDS, "queue", name, **kwargs)
+
+
+def create_pull_client(name: Optional[str] = None, **kwargs: Any) -> Any:
+    """Creates a PullQueueClient; `name` defaults to the configured backend."""
+    name = name or queue_backend_name()
+    if name == "sqlite":
+        path = getenv("FLOW_SQLITE_QUEUE_PATH", "flow-queue.sqlite")
+        kwargs.setdefault("path", path)
+    logging.info("Creating pull queue client `%s`.", name)
+    return _create(PULL_QUEUE_BACKENDS, "pull queue", name, **kwargs)
@@ -1,8 +1,29 @@
-from types import ModuleType
-import importlib
+"""Imports task sources as fresh modules, compiling each source only once.
+
+Compiled code objects are cached by a hash of the source, in memory and as
+marshal files under `cache_dir("bytecode")`, stamped with the interpreter's
+bytecode magic number. Every import still executes the code into a new module
+namespace, so tasks don't share state between jobs.
+"""
+
+import importlib.util
+import logging
+import marshal
+from hashlib import sha256
+from os import replace
+from os.path import exists, join
+from threading import Lock
+from types import CodeType, ModuleType
+from typing import Dict, Optional
 from uuid import uuid4
-from os.path import exists
+
 from flow.path import AbsolutePath
+from flow.util import cache_dir
+
+MAX_CACHED_CODE_OBJECTS = 256
+
+_code_cache: Dict[str, CodeType] = {}
+_code_cache_lock = Lock()
 
 
 def import_module_from_local_source(file_path: AbsolutePath) -> ModuleType:
@@ -14,11 +35,64 @@ def import_module_from_local_source(file_path: AbsolutePath) -> ModuleType:
     module_name = "task_specification_" + str(uuid4())
     spec = importlib.util.spec_from_file_location(module_name, str(file_path))
     module = importlib.util.module_from_spec(spec)
-    loader = spec.loader
-    if loader:
-        loader.exec_module(module)
+    if spec.loader:
+        exec(compiled(file_path), module.__dict__)
         return module
     else:
         raise RuntimeError(
             "Attempt at importing %s did not return a valid module. :/", file_path
         )
+
+
+def compiled(file_path: str) -> CodeType:
+    """Returns the code object for a source file, compiling it if needed.
+
+  Code is keyed by source alone, so tracebacks of a source first compiled at
+  another path show that path.
+  """
+    with open(file_path, "rb") as source_file:
+        source = source_file.read()
+    source_hash = sha256(source).hexdigest()
+    with _code_cache_lock:
+        code = _code_cache.get(source_hash)
+    if code is None:
+        code = _read_cached_code(source_hash)
+        if code is None:
+            code = compile(source, str(file_path), "exec", dont_inherit=True)
+            _write_cached_code(source_hash, code)
+        with _code_cache_lock:
+            if len(_code_cache) >= MAX_CACHED_CODE_OBJECTS:
+                _code_cache.pop(next(iter(_code_cache)))
+            _code_cache[source_hash] = code
+    return code
+
+
+def _cache_path(source_hash: str) -> str:
+    return join(cache_dir("bytecode"), f"{source_hash}.marshal")
+
+
+def _read_cached_code(source_hash: str) -> Optional[CodeType]:
+    magic = importlib.util.MAGIC_NUMBER
+    try:
+        with open(_cache_path(source_hash), "rb") as cache_file:
+            data = cache_file.read()
+    except OSError:
+        return None
+    # marshal's format changes between Python versions
+    if not data.startswith(magic):
+        return None
+    try:
+        return marshal.loads(data[len(magic) :])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def _write_cached_code(source_hash: str, code: CodeType) -> None:
+    try:
+        path = _cache_path(source_hash)
+        temporary_path = f"{path}.{uuid4().hex}"
+        with open(temporary_path, "wb") as cache_file:
+            cache_file.write(importlib.util.MAGIC_NUMBER + marshal.dumps(code))
+        replace(temporary_path, path)
+    except OSError as error:
+        logging.debug("Could not cache compiled task: %s", error)
@@ -1,138 +1,446 @@
+import asyncio
 import logging
+import threading
+import time
 
 from enum import Enum
-from typing import Optional, List
+from typing import Dict, Optional, List, Sequence, Tuple, Union
 from itertools import product
-from collections import ChainMap
+from collections import ChainMap, OrderedDict
 import json
 
+from flow.async_io_adapter import AsyncIOAdapter, ExecutorAsyncIOAdapter
 from flow.io_adapter import io
-from flow.task_parser import TaskParser, TaskParseError
-from flow.task_spec import TaskSpec, PathTemplateOutputSpec
+from flow.manifest import ManifestWriter
+from flow.metrics import Metrics
+from flow.provenance import ProvenanceRecord, ProvenanceStore, provenance_store
+from flow.typing import Bindings
+from flow.task_parser import TaskParseError
+from flow.task_registry import TaskRegistry
+from flow.task_sandbox import TaskSandbox
+from flow.task_spec import TaskSpec
 from flow.job_spec import JobSpec
-from flow.queue import get_enqueuer
+from flow.queue import get_enqueuer, Enqueuer
+
+
+class DeletedOutputs(Enum):
+    """What happens to outputs whose task or a bound input was deleted."""
+
+    KEEP = "keep"
+    # see `ProvenanceStore.orphaned`
+    MARK = "mark"
+    # deleting an output is a deletion event of its own, so this cascades
+    REMOVE = "remove"
 
 
 class FileEventHandler(object):
-    """Provides `handle_file_event` which takes care of new files."""
+    """Provides `handle_file_event` which takes care of new files, and
+  `handle_file_deletion` which takes care of deleted ones."""
 
-    _task_specs: List[TaskSpec]
+    registry: TaskRegistry
+    _enqueuer: Optional[Enqueuer]
     # TODO: make this a flag?
-    def __init__(self) -> None:
-        self._task_specs = []
-        self.enqueuer = get_enqueuer()
+    def __init__(
+        self,
+        sandbox: Optional[TaskSandbox] = None,
+        provenance: Optional[ProvenanceStore] = None,
+        deleted_outputs: Union[DeletedOutputs, str] = DeletedOutputs.KEEP,
+    ) -> None:
+        """Imports tasks in `sandbox` if given, instead of in this process.
+
+    With a `provenance` store, which defaults to the configured one, updated
+    inputs also re-enqueue the recorded jobs that read them, and outputs
+    orphaned by a deletion are handled as `deleted_outputs` says.
+    """
+        if provenance is None:
+            provenance = provenance_store()
+        self.provenance = provenance
+        self.deleted_outputs = DeletedOutputs(deleted_outputs)
+        self.manifests = ManifestWriter()
+        self.registry = TaskRegistry(
+            on_change=self.manifests.write_if_needed,
+            parse=sandbox.parse if sandbox else None,
+        )
+        self._enqueuer = None
+
+    @property
+    def enqueuer(self) -> Enqueuer:
+        """Created on first use, so starting a handler does not connect to the
+    queue backend."""
+        if self._enqueuer is None:
+            self._enqueuer = get_enqueuer()
+        return self._enqueuer
+
+    @enqueuer.setter
+    def enqueuer(self, enqueuer: Enqueuer) -> None:
+        self._enqueuer = enqueuer
 
-    # TODO: rethionk caching here
     @property
     def task_specs(self) -> List[TaskSpec]:
-        if self._task_specs and len(self._task_specs) > 0:
-            return self._task_specs
-        paths = io.file_list.glob(TaskSpec.task_specification_glob)
-        specs = [TaskParser(path).to_spec() for path in paths]
-        self._write_manifest_if_needed(specs)
-        self._task_specs = specs
-        logging.info("EventHandler loaded known task specs: %s", specs)
-        return self._task_specs
+        return self.registry.task_specs
 
     def handle_file_event(self, src_path: str) -> None:
-        if TaskSpec.is_task_path(src_path):
-            self._handle_new_task(src_path)
-        else:
-            self._handle_new_input(src_path)
+        self.handle_file_events([src_path])
 
-    def _handle_new_task(self, src_path: str) -> None:
+    def handle_file_events(self, src_paths: Sequence[str]) -> int:
+        """Handles several new files at once; returns the number of enumerations.
+
+    Each affected task enumerates its jobs only once, over the union of the
+    slices of its binding space that the new inputs fall into. New tasks
+    enumerate all of their jobs, which covers any new inputs they match, and
+    so do tasks whose lambdas read one of the files.
+    """
+        for src_path in src_paths:
+            # the listing's stat of a file that was written again is outdated
+            io.refresh(src_path)
+        task_paths = [path for path in src_paths if TaskSpec.is_task_path(path)]
+        input_paths = [path for path in src_paths if not TaskSpec.is_task_path(path)]
+        handled = set()
+        for src_path in OrderedDict.fromkeys(task_paths):
+            if self._handle_new_task(src_path):
+                handled.add(src_path)
+        for src_path in OrderedDict.fromkeys(input_paths):
+            for task_spec in self.registry.readers(src_path):
+                if task_spec.src_path not in handled:
+                    logging.info("Task %s read %s.", task_spec.name, src_path)
+                    self._create_jobs(task_spec)
+                    handled.add(task_spec.src_path)
+        slices: Dict[str, Tuple[TaskSpec, List[Bindings]]] = OrderedDict()
+        for src_path in OrderedDict.fromkeys(input_paths):
+            self._collect_slices(src_path, slices)
+        for task_path, (task_spec, task_slices) in slices.items():
+            if task_path not in handled:
+                self._create_jobs(task_spec, task_slices)
+                handled.add(task_path)
+        if self.provenance is not None and input_paths:
+            self._enqueue_dependents(input_paths)
+        return len(handled)
+
+    def _handle_new_task(self, src_path: str) -> bool:
         logging.info("Handling new task: %s", src_path)
         try:
-            task_spec = TaskParser(src_path).to_spec()
-            self._create_jobs(task_spec)  # no src_path!
-            # TODO: rethink caching here
-            self._task_specs = []
+            task_spec = self.registry.update(src_path)
+            self._create_jobs(task_spec)  # no slices, all jobs!
+            return True
         except TaskParseError as e:
             logging.error("Parsing task at '%s' failed! Message: %s", src_path, e)
+            return False
 
-    def _handle_new_input(self, src_path: str) -> None:
+    def _collect_slices(
+        self, src_path: str, slices: Dict[str, Tuple[TaskSpec, List[Bindings]]]
+    ) -> None:
         logging.info("Handling new input: %s", src_path)
-
-        relevant = [
-            task_spec
-            for task_spec in self.task_specs
-            if task_spec.should_handle_file(src_path)
-        ]
+        relevant = []
+        for task_spec in self.registry.relevant(src_path):
+            task_slices = task_spec.slices_for(src_path)
+            if not task_slices:
+                continue
+            relevant.append(task_spec.name)
+            slices.setdefault(task_spec.src_path, (task_spec, []))[1].extend(
+                task_slices
+            )
         if relevant:
             logging.info(
-                "Found %d relevant tasks: %s",
-                len(relevant),
-                ", ".join([ts.name for ts in relevant]),
+                "Found %d relevant tasks: %s", len(relevant), ", ".join(relevant)
             )
-            for task_spec in relevant:
-                self._create_jobs(task_spec, src_path)
         else:
             logging.info("No relevant tasks found for file %s", src_path)
 
-    def _create_jobs(self, task_spec: TaskSpec, src_path: Optional[str] = None) -> None:
+    def _enqueue_dependents(self, src_paths: Sequence[str]) -> None:
+        """Enqueues the recorded jobs that read any of `src_paths` again.
+
+    Only jobs of the current version of their task; a changed task enumerates
+    all of its jobs anyway. The enqueuer skips jobs whose output is current.
+    """
+        job_specs = self._current_jobs(self.provenance.dependents(src_paths))
+        if job_specs:
+            logging.info("Enqueueing %d recorded dependent jobs.", len(job_specs))
+            self.enqueuer.add(job_specs)
+
+    def _current_jobs(self, records: Sequence[ProvenanceRecord]) -> List[JobSpec]:
+        job_specs = []
+        for record in records:
+            task_spec = self.registry.get(record.task_path)
+            if task_spec is not None and task_spec.source_hash == record.task_hash:
+                job_specs.append(record.to_job_spec())
+        return job_specs
+
+    def handle_file_deletion(self, src_path: str) -> None:
+        self.handle_file_deletions([src_path])
+
+    def handle_file_deletions(self, src_paths: Sequence[str]) -> int:
+        """Handles several deleted files at once; returns the number of affected
+    jobs.
+
+    Removes the files from the file index and deleted tasks from the registry,
+    and cancels queued jobs that depend on a deleted file. Only jobs this
+    process's enqueuer added within its in-flight TTL are known to depend on
+    it; jobs queued by other processes or before that still run. Provenance
+    can't name them either: their identities include when their inputs were
+    updated, which is only known once they ran. With a provenance
+    store, outputs made by a deleted task or from a deleted input bound to
+    them are orphaned, see `DeletedOutputs`; recorded jobs that only
+    aggregated or read a deleted file are enqueued again. No task enumerates
+    its jobs, so this is proportional to the number of affected jobs.
+    """
+        src_paths = list(OrderedDict.fromkeys(src_paths))
+        for src_path in src_paths:
+            logging.info("Handling deleted file: %s", src_path)
+            io.forget(src_path)
+            if TaskSpec.is_task_path(src_path):
+                self.registry.remove(src_path)
+        affected = self.enqueuer.cancel_dependents(src_paths)
+        if self.provenance is not None:
+            affected += self._handle_deleted_dependencies(src_paths)
+        return affected
+
+    def _handle_deleted_dependencies(self, src_paths: Sequence[str]) -> int:
+        deleted = set(src_paths)
+        orphans, dependents = [], []
+        for record in self.provenance.dependents(src_paths):
+            values = record.bindings.values()
+            bound = {value for value in values if isinstance(value, str)}
+            if record.task_path in deleted or not deleted.isdisjoint(bound):
+                orphans.append(record.output)
+            else:
+                dependents.append(record)
+        job_specs = self._current_jobs(dependents)
+        if job_specs:
+            logging.info("Enqueueing %d jobs that lost an input.", len(job_specs))
+            # their outputs are newer than all remaining inputs, but outdated
+            now = time.time()
+            for job_spec in job_specs:
+                job_spec.inputs_updated = now
+            self.enqueuer.add(job_specs)
+        if orphans:
+            logging.info(
+                "%d outputs are orphaned, policy: %s.",
+                len(orphans),
+                self.deleted_outputs.value,
+            )
+        if self.deleted_outputs is DeletedOutputs.MARK:
+            self.provenance.mark_orphaned(orphans)
+        elif self.deleted_outputs is DeletedOutputs.REMOVE:
+            for output in orphans:
+                io.delete(output)
+            self.provenance.forget(orphans)
+        return len(orphans) + len(job_specs)
+
+    def _create_jobs(
+        self, task_spec: TaskSpec, slices: Optional[Sequence[Bindings]] = None
+    ) -> None:
         """Adds all new jobs for this task.
 
-    If no `src_path` is supplied, assumes the task itself is new and adds all
-    possible jobs for it.
+    If no `slices` are supplied, assumes the task itself is new and adds all
+    possible jobs for it. Otherwise only adds jobs whose bindings extend one
+    of the slices, i.e. the jobs that read one of the new inputs.
     """
         logging.info("Creating new jobs for task '%s'.", task_spec.name)
-
-        # if src_path:
-        # matched_input_spec = task_spec.matching_input_spec(src_path)
-        # else:
-        #   matched_input_spec = None
-        #
-        # inputs = []
-        # for input_spec in task_spec.input_specs:
-        #   if input_spec == matched_input_spec:
-        #     values = matched_input_spec.values(src_path)
-        #     logging.info("Fixing input for input_spec '%s' to %s", matched_input_spec, values)
-        #   else:
-        #     values = input_spec.values()
-        #     logging.info("Found %d inputs for input_spec '%s'", len(values), input_spec.name)
-        #   inputs.append(values)
-        #
-        # job_specs = []
-        # for args_and_assignments in product(*inputs):
-        #   args, assignments = zip(*args_and_assignments) # unzip
-        #   assert len(args) == len(task_spec.input_names)
-        #   job_inputs = list(zip(task_spec.input_names, args))
-        #   replacements = ChainMap(*assignments) # merges dicts
-        #   job_output = task_spec.output_spec.output_path(replacements)
-        #   job_spec = JobSpec(job_inputs, job_output, task_spec.src_path)
-        #   job_specs.append(job_spec)
-        # TODO: fix input dimension again!
-        job_specs = list(task_spec.to_job_specs())
+        if slices is None:
+            job_specs = list(task_spec.to_job_specs())
+        else:
+            all_bindings = task_spec.sliced_bindings(slices)
+            job_specs = list(map(task_spec.to_job_spec, all_bindings))
+            self.manifests.append(task_spec, all_bindings)
         logging.info("Created {} job_specs, enqueueing...".format(len(job_specs)))
         self.enqueuer.add(job_specs)
 
-    def _write_manifest_if_needed(self, task_specs: List[TaskSpec]) -> None:
-        for task_spec in task_specs:
-            if not io.exists(task_spec.manifest_path):
-                bindings = task_spec.all_bindings()
-                keys = task_spec.output_spec.placeholders
-                assignments = sorted(
-                    [binding[key] for key in keys] for binding in bindings
-                )
-                if isinstance(task_spec.output_spec, PathTemplateOutputSpec):
-                    object = {
-                        "output": {
-                            "template": task_spec.output_spec.path_template.template
-                        },
-                        "bindings": {"values": assignments},
-                    }
-                    with io.writing(task_spec.manifest_path, mode="w") as open_file:
-                        json.dump(object, open_file)
-                else:
-                    raise NotImplementedError
+
+class CoalescingFileEventHandler(object):
+    """Buffers file events and hands them to a `FileEventHandler` in batches.
+
+  Uploading many inputs at once would otherwise enumerate the jobs of every
+  matching task once per file. Buffered events are flushed once no new event
+  arrived for `window` seconds, but no later than `max_latency` seconds after
+  the oldest one, or right away once `max_events` distinct paths are buffered.
+  Repeated events for a buffered path are dropped. Deletions are not
+  buffered.
+  """
+
+    def __init__(
+        self,
+        handler: Optional[FileEventHandler] = None,
+        window: float = 1.0,
+        max_latency: float = 10.0,
+        max_events: int = 10000,
+    ) -> None:
+        self.handler = handler or FileEventHandler()
+        self.window = window
+        self.max_latency = max_latency
+        self.max_events = max_events
+        self.metrics = Metrics("file_events")
+        self._buffer: "OrderedDict[str, None]" = OrderedDict()
+        self._oldest = 0.0
+        self._newest = 0.0
+        self._closed = False
+        self._condition = threading.Condition()
+        # the handler caches task specs and is not thread-safe
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def buffered(self) -> int:
+        with self._condition:
+            return len(self._buffer)
+
+    def handle_file_event(self, src_path: str) -> None:
+        with self._condition:
+            if self._closed:
+                raise ValueError("Handler is closed.")
+            self.metrics.increment("events")
+            now = time.time()
+            if src_path in self._buffer:
+                self.metrics.increment("duplicate_events")
+            else:
+                if not self._buffer:
+                    self._oldest = now
+                self._buffer[src_path] = None
+            self._newest = now
+            full = len(self._buffer) >= self.max_events
+            if full:
+                src_paths = self._take()
+            else:
+                self._start_flusher()
+                self._condition.notify()
+        if full:
+            # flushing in the caller's thread pushes back on the event source
+            self._handle(src_paths)
+
+    def handle_file_deletion(self, src_path: str) -> None:
+        """Handles a deletion right away, as it enumerates no task.
+
+    A buffered event for the same path is dropped, the file is gone.
+    """
+        with self._condition:
+            if self._closed:
+                raise ValueError("Handler is closed.")
+            self.metrics.increment("deletion_events")
+            if self._buffer.pop(src_path, False) is None:
+                self.metrics.increment("cancelled_events")
+        with self._flush_lock:
+            try:
+                self.handler.handle_file_deletion(src_path)
+            except Exception:
+                logging.exception("Handling deletion of %s failed.", src_path)
+                self.metrics.increment("failed_events")
+
+    def flush(self) -> None:
+        """Handles all buffered events now."""
+        with self._condition:
+            src_paths = self._take()
+        self._handle(src_paths)
+
+    def close(self) -> None:
+        """Flushes buffered events and stops the background flusher."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        self.metrics.log()
+
+    def __enter__(self) -> "CoalescingFileEventHandler":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _start_flusher(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="CoalescingFileEventHandler", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if self._buffer:
+                        deadline = min(
+                            self._newest + self.window, self._oldest + self.max_latency
+                        )
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    else:
+                        self._condition.wait()
+                if self._closed:
+                    return
+                src_paths = self._take()
+            self._handle(src_paths)
+
+    def _take(self) -> List[str]:
+        src_paths = list(self._buffer)
+        self._buffer.clear()
+        return src_paths
+
+    def _handle(self, src_paths: List[str]) -> None:
+        if not src_paths:
+            return
+        with self._flush_lock:
+            with self.metrics.timer("flush"):
+                try:
+                    enumerations = self.handler.handle_file_events(src_paths)
+                except Exception:
+                    logging.exception("Handling %d file events failed.", len(src_paths))
+                    self.metrics.increment("failed_events", len(src_paths))
+                    return
+        self.metrics.increment("flushed_events", len(src_paths))
+        self.metrics.increment("enumerations", enumerations)
+        logging.info(
+            "Coalesced %d file events into %d task enumerations "
+            "(%.1f events per enumeration overall).",
+            len(src_paths),
+            enumerations,
+            self.metrics.ratio("events", "enumerations"),
+        )
 
 
 class JobEventHandler(object):
     """Provides `handle_job_event` which takes care of new JobSpecs coming in as JSON."""
 
-    def __init__(self) -> None:
-        pass
+    def __init__(self, async_io: Optional[AsyncIOAdapter] = None) -> None:
+        """Looks up outputs through `async_io`, which defaults to the configured
+    adapter run on the I/O thread pool."""
+        self._async_io = async_io
+
+    @property
+    def async_io(self) -> AsyncIOAdapter:
+        if self._async_io is None:
+            self._async_io = ExecutorAsyncIOAdapter(io)
+        return self._async_io
 
     def handle_job_event(self, serialized_job_spec: str) -> None:
         job_spec = JobSpec.from_json(serialized_job_spec)
         job_spec.execute()
+
+    async def handle_job_events(
+        self, serialized_job_specs: List[str], max_concurrency: int = 4
+    ) -> int:
+        """Executes several jobs in one process, overlapping their I/O.
+
+    First stats all outputs at once through `async_io` and skips jobs whose
+    output is current, see `JobSpec.output_is_current`. Then executes the
+    others, `max_concurrency` at a time. Returns how many were executed.
+    """
+        job_specs = [JobSpec.from_json(job) for job in serialized_job_specs]
+        outputs = [job_spec.output for job_spec in job_specs]
+        stats = await self.async_io.stat_many(outputs)
+        pending = []
+        for job_spec, stat in zip(job_specs, stats):
+            if job_spec.output_is_current(stat):
+                logging.info("Skipping %s, its output is up to date.", job_spec)
+            else:
+                pending.append(job_spec)
+        loop = asyncio.get_event_loop()
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def execute(job_spec: JobSpec) -> None:
+            async with semaphore:
+                await loop.run_in_executor(None, job_spec.execute)
+
+        await asyncio.gather(*[execute(job_spec) for job_spec in pending])
+        return len(pending)
@@ -8,19 +8,38 @@ It consists of:
 
 The idea is roughly that a server can get all files from GCS and then use pubsub
 to keep up to date with what files exist. This is not yet implemented.
-"""
-from google.cloud import storage
-from google.cloud.exceptions import NotFound
 
+Where it is known, e.g. from a bucket listing, a path's `FileStat` is kept too,
+so deciding which outputs are out of date doesn't need a request per file.
+A path added again without a stat forgets its old one, as it is outdated.
+
+Paths are kept sorted, so a glob only has to look at the paths that share its
+literal (wildcard-free) prefix.
+"""
 from flow.path import RelativePath, AbsolutePath, ROOT
+from bisect import bisect_left, insort
 import fnmatch
-from typing import List, Set
+import re
+from typing import Dict, List, Set, NamedTuple, Optional
+
+
+class FileStat(NamedTuple):
+    """Metadata about a single stored object, as returned by `IOAdapter.stat`."""
+
+    path: AbsolutePath
+    size: int
+    updated: Optional[float] = None  # seconds since the epoch
+    generation: Optional[int] = None
+
+
+WILDCARDS = re.compile(r"[*?\[]")
 
 
 class FileList(object):
 
     paths: List[AbsolutePath]
     path_set: Set[AbsolutePath]
+    stats: Dict[AbsolutePath, FileStat]
 
     def __init__(
         self,
@@ -30,37 +49,70 @@ class FileList(object):
     ) -> None:
         self.project_name = project
         self.bucket_name = bucket
-        self.paths = paths
-        self.path_set = set(paths)
+        self.path_set = {AbsolutePath(path) for path in paths}
+        self.paths = sorted(self.path_set)
+        self.stats = {}
         # self._get_all_gcs_files()
 
     def glob(self, glob_string: AbsolutePath) -> List[AbsolutePath]:
         if not isinstance(glob_string, AbsolutePath):
             raise ValueError("Can only use AbsolutePath objects with FileList!")
-        paths = fnmatch.filter(self.paths, glob_string)
-        return [AbsolutePath(path) for path in paths]
+        prefix = WILDCARDS.split(glob_string, maxsplit=1)[0]
+        if prefix == glob_string:  # no wildcards, so at most one match
+            return [glob_string] if glob_string in self.path_set else []
+        regex = re.compile(fnmatch.translate(glob_string))
+        matches = []
+        for path in self.paths[bisect_left(self.paths, prefix) :]:
+            if not path.startswith(prefix):
+                break
+            if regex.match(path):
+                matches.append(path)
+        return matches
 
     def exists(self, file_path: AbsolutePath) -> bool:
         if not isinstance(file_path, AbsolutePath):
             raise ValueError("Can only use AbsolutePath objects with FileList!")
         return file_path in self.path_set
 
+    def stat(self, file_path: AbsolutePath) -> Optional[FileStat]:
+        """Returns the path's recorded stat; None if it is missing or unknown."""
+        if not isinstance(file_path, AbsolutePath):
+            raise ValueError("Can only use AbsolutePath objects with FileList!")
+        return self.stats.get(file_path)
+
     def _get_all_gcs_files(self) -> None:
+        from google.cloud import storage
+
         client = storage.Client(project=self.project_name)
         bucket = client.bucket(self.bucket_name)
-        fields = "items/name,nextPageToken"
-        listing = bucket.list_blobs(fields=fields)
-        self.paths = [ROOT.append(RelativePath(blob.name)) for blob in listing]
-        self.path_set = set(self.paths)
-
-    def add(self, file_path: AbsolutePath) -> None:
+        fields = "items/name,items/size,items/updated,items/generation,nextPageToken"
+        stats = {}
+        for blob in bucket.list_blobs(fields=fields):
+            path = ROOT.append(RelativePath(blob.name))
+            updated = blob.updated.timestamp() if blob.updated else None
+            stats[path] = FileStat(path, blob.size, updated, blob.generation)
+        self.stats = stats
+        self.path_set = set(stats)
+        self.paths = sorted(self.path_set)
+
+    def add(self, file_path: AbsolutePath, stat: Optional[FileStat] = None) -> None:
         if not isinstance(file_path, AbsolutePath):
             raise ValueError("Can only use AbsolutePath objects with FileList!")
-        self.paths.append(file_path)
-        self.path_set |= set([file_path])
+        if stat is None:
+            self.stats.pop(file_path, None)
+        else:
+            self.stats[file_path] = stat
+        if file_path not in self.path_set:
+            insort(self.paths, file_path)
+            self.path_set.add(file_path)
 
     def remove(self, file_path: AbsolutePath) -> None:
-        raise NotImplementedError
+        if not isinstance(file_path, AbsolutePath):
+            raise ValueError("Can only use AbsolutePath objects with FileList!")
+        if file_path in self.path_set:
+            del self.paths[bisect_left(self.paths, file_path)]
+            self.path_set.remove(file_path)
+        self.stats.pop(file_path, None)
 
 
 _file_list = None
@@ -1,27 +1,127 @@
 """Adapter for local FS calls vs GC storage API calls."""
-from typing import Any, List, Set, TextIO, Tuple, Optional, IO
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    List,
+    Set,
+    TextIO,
+    Tuple,
+    Optional,
+    IO,
+    Iterator,
+    NamedTuple,
+    cast,
+)
 from contextlib import contextmanager, closing
+from functools import partial
+from concurrent.futures import Future
+import json
 import logging
+import time
 from abc import ABC, abstractmethod
 import fnmatch
 from os.path import join, dirname
-from os import makedirs
+from os import makedirs, fstat
+from mmap import mmap, ACCESS_READ
+from tempfile import SpooledTemporaryFile, mkdtemp, mkstemp
+from builtins import open as localfs_open
+
+from flow.util import memoize, batch, io_executor, MAX_IO_WORKERS
+from flow.file_list import FileList, FileStat
+from flow.path import AbsolutePath, RelativePath, ROOT
+from flow.read_set import ReadSet, record_read, record_reads, tracking_reads
+from flow.ranged_reader import RangedReader, DEFAULT_BLOCK_SIZE, DEFAULT_READ_AHEAD
+from flow.write_behind import WriteBehindUploader
+
+
+class TransferResult(NamedTuple):
+    """Outcome of one item of a bulk call such as `IOAdapter.download_many`.
+
+  Bulk calls never raise for a single failing item; instead `error` is set on
+  that item's result and all other items still complete.
+  """
+
+    path: str
+    value: Any = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+CLAIMS_ROOT = AbsolutePath("/.flow/claims")
+
 
-from flow.util import memoize, batch
-from flow.file_list import FileList
-from flow.path import AbsolutePath, RelativePath
+class Claim(NamedTuple):
+    """A held claim on a path, see `IOAdapter.claim`."""
+
+    path: AbsolutePath
+    owner: str
+    expires: float
+    # version of the claim object, to only release it if it is still ours
+    token: Any
 
 
 class IOAdapter(ABC):
 
     file_list: FileList
+    write_behind: Optional[WriteBehindUploader] = None
 
     @contextmanager
     def reading(self, path: AbsolutePath) -> IO:
         normalized = self.normpath(path)
+        record_read(normalized)
         with self._reading(normalized) as reading_file:
             yield reading_file
 
+    @contextmanager
+    def reading_mapped(self, path: str) -> Iterator[memoryview]:
+        """Yields a read-only memoryview over a memory-mapped local copy.
+
+    Avoids copying the object into Python memory. The view is released when
+    the block exits, so slices of it must not be kept around.
+    """
+        local_path = self.download(path)
+        with localfs_open(local_path, mode="rb") as reading_file:
+            if fstat(reading_file.fileno()).st_size == 0:
+                yield memoryview(b"")  # empty files can not be mapped
+                return
+            with mmap(reading_file.fileno(), 0, access=ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    yield view
+                finally:
+                    view.release()
+
+    def read_range(self, path: str, offset: int, length: int) -> bytes:
+        """Reads up to `length` bytes starting at `offset` without fetching the
+    whole object."""
+        if offset < 0 or length < 0:
+            raise ValueError("offset and length must not be negative.")
+        if length == 0:
+            return b""
+        normalized = self.normpath(path)
+        record_read(normalized)
+        return self._read_range(normalized, offset, length)
+
+    def open_ranged(
+        self,
+        path: str,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        read_ahead: int = DEFAULT_READ_AHEAD,
+    ) -> RangedReader:
+        """Opens a seekable, lazily fetching binary file object on `path`."""
+        normalized = self.normpath(path)
+        stat = self._stat(normalized)
+        if stat is None:
+            raise FileNotFoundError(normalized)
+        record_read(normalized, stat.generation)
+        # `size` is only valid for this generation of the object
+        fetch = partial(self._read_range, normalized, generation=stat.generation)
+        return RangedReader(fetch, stat.size, block_size, read_ahead)
+
     @contextmanager
     def writing(self, path: str, mode: str = "w+b") -> IO:
         normalized = self.normpath(path)
@@ -45,6 +145,7 @@ class IOAdapter(ABC):
 
     def download(self, path: str) -> AbsolutePath:
         normalized = self.normpath(path)
+        record_read(normalized)
         local_path = self._download(normalized)
         logging.debug("Downloaded `%s` to `%s`.", path, local_path)
         return local_path
@@ -54,6 +155,157 @@ class IOAdapter(ABC):
         relative_remote_path = normalized_remote_path.as_relative_path()
         return self._upload(local_path, relative_remote_path)
 
+    def stat(self, path: str) -> Optional[FileStat]:
+        """Returns metadata for `path`, or None if nothing is stored there."""
+        normalized = self.normpath(path)
+        return self._stat(normalized)
+
+    def delete(self, path: str) -> bool:
+        """Deletes `path`; returns False if nothing was stored there."""
+        normalized = self.normpath(path)
+        return self._delete(normalized)
+
+    def refresh(self, path: str) -> None:
+        """Adds `path` to the file index without its stat, e.g. after it was
+    written elsewhere, so the next lookup asks storage."""
+        self.file_list.add(self.normpath(path))
+
+    def forget(self, path: str) -> None:
+        """Drops `path` from the file index, e.g. after it was deleted elsewhere."""
+        self.file_list.remove(self.normpath(path))
+
+    # Claims
+
+    def claim_path(self, path: str) -> AbsolutePath:
+        """Returns where the claim object for `path` is stored."""
+        return AbsolutePath(CLAIMS_ROOT + self.normpath(path) + ".claim")
+
+    def claim(self, path: str, owner: str, ttl: float) -> Optional[Claim]:
+        """Atomically claims `path` for `ttl` seconds, e.g. a job's output.
+
+    Creates a claim object only if none exists. Returns None while someone
+    else holds an unexpired claim; an expired claim is taken over, but only if
+    it did not change since it was read, so at most one claimant wins.
+    """
+        claim_path = self.claim_path(path)
+        now = time.time()
+        expires = now + ttl
+        record = json.dumps({"owner": owner, "expires": expires}).encode()
+        token = self._create_if_absent(claim_path, record)
+        if token is None:
+            current = self._read_versioned(claim_path)
+            if current is None:
+                # released in the meantime
+                token = self._create_if_absent(claim_path, record)
+            else:
+                data, current_token = current
+                if json.loads(data.decode())["expires"] > now:
+                    return None
+                logging.info("Taking over expired claim on `%s`.", path)
+                token = self._replace_if_unchanged(claim_path, record, current_token)
+        if token is None:
+            return None
+        return Claim(claim_path, owner, expires, token)
+
+    def release(self, claim: Claim) -> bool:
+        """Deletes a claim; False if it expired and was taken over meanwhile."""
+        return self._delete_if_unchanged(claim.path, claim.token)
+
+    # Write-behind uploads
+
+    def enable_write_behind(self, **kwargs: Any) -> WriteBehindUploader:
+        """Makes `writing` return before the upload finishes.
+
+    Uploads then happen in the background; see `flow.write_behind`. Only has
+    an effect on adapters that upload on write, such as GCStorageAdapter.
+    """
+        if self.write_behind is None:
+            self.write_behind = WriteBehindUploader(self._upload_absolute, **kwargs)
+        return self.write_behind
+
+    def pending_write(self, path: str) -> Optional[Future]:
+        """Returns a future that resolves once the last write to `path` is
+    durable, or None if no write to `path` is pending."""
+        if self.write_behind is None:
+            return None
+        return self.write_behind.acknowledgement(self.normpath(path))
+
+    def flush_writes(self, timeout: Optional[float] = None) -> None:
+        if self.write_behind is not None:
+            self.write_behind.flush(timeout)
+
+    def disable_write_behind(self) -> None:
+        """Flushes pending uploads and makes `writing` synchronous again."""
+        if self.write_behind is not None:
+            write_behind, self.write_behind = self.write_behind, None
+            write_behind.close()
+
+    def _upload_absolute(self, local_path: str, remote_path: AbsolutePath) -> None:
+        return self._upload(local_path, remote_path.as_relative_path())
+
+    # Bulk operations
+
+    def download_many(self, paths: List[str]) -> List[TransferResult]:
+        """Downloads all `paths` concurrently; values are the local paths."""
+        normalized = [self.normpath(path) for path in paths]
+        for path in normalized:
+            record_read(path)
+        results = self._map_concurrently(self._download_tracking_reads, normalized)
+        for index, result in enumerate(results):
+            if result.ok:
+                local_path, reads = result.value
+                record_reads(reads)
+                results[index] = result._replace(value=local_path)
+        return results
+
+    def upload_many(self, transfers: List[Tuple[str, str]]) -> List[TransferResult]:
+        """Uploads (local_path, remote_path) pairs concurrently."""
+        remote_paths = [self.normpath(remote) for _, remote in transfers]
+
+        def upload(index: int) -> None:
+            local_path = transfers[index][0]
+            return self._upload(local_path, remote_paths[index].as_relative_path())
+
+        results = self._map_concurrently(upload, range(len(transfers)))
+        return [
+            result._replace(path=remote_path)
+            for result, remote_path in zip(results, remote_paths)
+        ]
+
+    def stat_many(self, paths: List[str]) -> List[TransferResult]:
+        """Stats all `paths` concurrently without listing the whole store.
+
+    Values are `FileStat`s, or None for paths that do not exist.
+    """
+        normalized = [self.normpath(path) for path in paths]
+        return self._map_concurrently(self._stat, normalized)
+
+    def _download_tracking_reads(
+        self, path: AbsolutePath
+    ) -> Tuple[AbsolutePath, ReadSet]:
+        # read sets are thread-local, so hand the pool thread's reads back
+        with tracking_reads() as reads:
+            local_path = self._download(path)
+        return local_path, reads
+
+    def _map_concurrently(
+        self, function: Callable[[Any], Any], items: Iterable[Any]
+    ) -> List[TransferResult]:
+        self._prepare_concurrent_access()
+        futures = [(item, io_executor().submit(function, item)) for item in items]
+        results = []
+        for item, future in futures:
+            try:
+                results.append(TransferResult(item, future.result()))
+            except Exception as error:
+                logging.warning("Bulk operation failed for `%s`: %s", item, error)
+                results.append(TransferResult(item, error=error))
+        return results
+
+    def _prepare_concurrent_access(self) -> None:
+        """Hook to set up shared state (e.g. clients) before fanning out."""
+        pass
+
     @abstractmethod
     def normpath(self, path: str) -> AbsolutePath:
         """Transforms a canonical path to a form compatible with the IOAdapter.
@@ -93,63 +345,336 @@ class IOAdapter(ABC):
     def _upload(self, local_path: str, remote_path: str) -> None:
         pass
 
+    @abstractmethod
+    def _stat(self, path: AbsolutePath) -> Optional[FileStat]:
+        pass
+
+    @abstractmethod
+    def _read_range(
+        self,
+        path: AbsolutePath,
+        offset: int,
+        length: int,
+        generation: Optional[int] = None,
+    ) -> bytes:
+        """Reads a byte range, of `generation` if given and the backend has
+    generations."""
+        pass
+
+    @abstractmethod
+    def _delete(self, path: AbsolutePath) -> bool:
+        pass
+
+    @abstractmethod
+    def _create_if_absent(self, path: AbsolutePath, data: bytes) -> Optional[Any]:
+        """Atomically stores `data` unless `path` exists; returns its version."""
+        pass
+
+    @abstractmethod
+    def _read_versioned(self, path: AbsolutePath) -> Optional[Tuple[bytes, Any]]:
+        """Returns the contents of `path` and their version, or None."""
+        pass
+
+    @abstractmethod
+    def _replace_if_unchanged(
+        self, path: AbsolutePath, data: bytes, version: Any
+    ) -> Optional[Any]:
+        """Atomically replaces `path` if still at `version`; returns the new one."""
+        pass
+
+    @abstractmethod
+    def _delete_if_unchanged(self, path: AbsolutePath, version: Any) -> bool:
+        pass
+
 
 # LocalFSAdapter
 
-# from glob import glob as localfs_glob
-from builtins import open as localfs_open
+from os.path import exists as localfs_exists
+from os.path import isdir as localfs_isdir
+from os.path import normpath as localfs_normpath
+from os.path import abspath as localfs_abspath
+from os.path import relpath as localfs_relpath
+from os import stat as localfs_stat
+from os import scandir as localfs_scandir
+from os import link as localfs_link
+from os import remove as localfs_remove
+from os import replace as localfs_replace
+from os import open as localfs_open_fd, close as localfs_close_fd
+from os import O_CREAT, O_EXCL, O_WRONLY
+from os.path import getmtime as localfs_getmtime
+from shutil import copyfile as localfs_copyfile
+from threading import RLock
+from hashlib import sha256
 
-# from os.path import exists as localfs_exists
-# from os.path import normpath as localfs_normpath
-# from os.path import dirname as localfs_dirname
-# from os import makedirs as localfs_makedirs
-#
-#
-# class LocalFSAdapter(IOAdapter):
-#     def normpath(self, path: str) -> str:
-#         path = localfs_normpath(path)
-#         return path
-#
-#     @contextmanager
-#     def _reading(self, path: str, mode: str = "r+b") -> IO:
-#         reading_file = localfs_open(path, mode=mode)
-#         yield reading_file
-#         reading_file.close()
-#
-#     @contextmanager
-#     def _writing(self, path: str, mode: str = "w+b") -> IO:
-#         writing_file = localfs_open(path, mode=mode)
-#         yield writing_file
-#         writing_file.close()
-#
-#     def _makedirs(self, path: str) -> None:
-#         dirpath = localfs_dirname(path)
-#         localfs_makedirs(dirpath, exist_ok=True)
-#
-#     def _glob(self, glob_path: str) -> List[str]:
-#         logging.debug(glob_path)
-#         paths = localfs_glob(glob_path)
-#         logging.debug(str(paths))
-#         # we need to remove the root dir from all returned paths!
-#
-#         return paths  # [path[prefix_length:] for path in paths]
-#
-#     def _exist(self, paths: List[str]) -> List[bool]:
-#         return [localfs_exists(path) for path in paths]
-#
-#     def _download(self, path: str) -> str:
-#         """No-op on local fs. Returns LOCAL path!"""
-#         return path
-#
-#     def _upload(self, local_path: str, remote_path: str) -> None:
-#         raise NotImplementedError("local fs has no concept of uploading")
+# seconds after which a lock left behind by a crashed process is broken
+LOCAL_LOCK_TIMEOUT = 30.0
 
 
-# GCStorageAdapter
+class LocalFSAdapter(IOAdapter):
+    """Stores flow's canonical absolute paths below a local `root_dir`.
+
+  '/data/names/name1.txt' maps to '<root_dir>/data/names/name1.txt'.
+
+  Globs run against an in-memory index of all files below `root_dir`. It is
+  built with `os.scandir` on first use and afterwards kept up to date by this
+  adapter's own writes and by filesystem events, see `watch` and
+  `IndexUpdatingEventHandler`.
+  """
+
+    _index: Optional[FileList]
+
+    def __init__(self, root_dir: str = ".") -> None:
+        self._index_lock = RLock()
+        self.root_dir = root_dir
+
+    @property
+    def root_dir(self) -> str:
+        return self._root_dir
+
+    @root_dir.setter
+    def root_dir(self, root_dir: str) -> None:
+        with self._index_lock:
+            self._root_dir = root_dir
+            self._absolute_root_dir = localfs_abspath(root_dir)
+            self._index = None
+
+    @property
+    def file_list(self) -> FileList:
+        with self._index_lock:
+            if self._index is None:
+                self._index = FileList(paths=self._scan(self._absolute_root_dir))
+            return self._index
+
+    def _scan(self, directory: str) -> List[AbsolutePath]:
+        paths: List[AbsolutePath] = []
+        directories = [directory]
+        while directories:
+            try:
+                entries = localfs_scandir(directories.pop())
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    else:
+                        paths.append(self._flow_path(entry.path))
+        return paths
+
+    def watch(self) -> Any:
+        """Starts a watchdog observer that keeps the index up to date.
+
+    Returns the started observer; callers should `stop()` it when done.
+    """
+        from watchdog.observers import Observer
+
+        observer = Observer()
+        handler = IndexUpdatingEventHandler(self)
+        observer.schedule(handler, self._absolute_root_dir, recursive=True)
+        observer.start()
+        return observer
+
+    def notice_created(self, local_path: str) -> None:
+        """Adds a file (or all files below a directory) to the index."""
+        with self._index_lock:
+            if self._index is None:
+                return
+            if localfs_isdir(local_path):
+                for path in self._scan(local_path):
+                    self._index.add(path)
+            else:
+                self._index.add(self._flow_path(local_path))
+
+    def notice_deleted(self, local_path: str) -> None:
+        """Removes a file (or all files below a directory) from the index."""
+        with self._index_lock:
+            if self._index is None:
+                return
+            path = self._flow_path(local_path)
+            self._index.remove(path)
+            for contained in self._index.glob(AbsolutePath(path + "/*")):
+                self._index.remove(contained)
+
+    def refresh(self, path: str) -> None:
+        # an index that was never built is complete once it is
+        with self._index_lock:
+            if self._index is not None:
+                self._index.add(self.normpath(path))
+
+    def forget(self, path: str) -> None:
+        with self._index_lock:
+            if self._index is not None:
+                self._index.remove(self.normpath(path))
+
+    def normpath(self, path: str) -> AbsolutePath:
+        path = localfs_normpath(path)
+        if not path.startswith("/"):
+            path = "/" + path
+        return AbsolutePath(path)
+
+    def _local_path(self, path: AbsolutePath) -> AbsolutePath:
+        return AbsolutePath(join(self._absolute_root_dir, path[1:]))
+
+    def _flow_path(self, local_path: str) -> AbsolutePath:
+        relative = localfs_relpath(local_path, self._absolute_root_dir)
+        return AbsolutePath("/" + relative)
+
+    @contextmanager
+    def _reading(self, path: AbsolutePath, mode: str = "rb") -> IO:
+        with localfs_open(self._local_path(path), mode=mode) as reading_file:
+            yield reading_file
+
+    @contextmanager
+    def _writing(self, path: AbsolutePath, mode: str = "w+b") -> IO:
+        local_path = self._local_path(path)
+        with localfs_open(local_path, mode=mode) as writing_file:
+            yield writing_file
+        self.notice_created(local_path)
+
+    def _makedirs(self, path: AbsolutePath) -> None:
+        makedirs(dirname(self._local_path(path)), exist_ok=True)
 
-from google.cloud import storage
-from google.cloud.exceptions import NotFound
-from tempfile import SpooledTemporaryFile, mkdtemp
+    def _glob(self, glob_path: AbsolutePath) -> List[AbsolutePath]:
+        with self._index_lock:
+            return self.file_list.glob(glob_path)
+
+    def _exist(self, paths: List[AbsolutePath]) -> List[bool]:
+        return [localfs_exists(self._local_path(path)) for path in paths]
+
+    def _download(self, path: AbsolutePath) -> AbsolutePath:
+        """No-op on local fs. Returns the LOCAL path!"""
+        local_path = self._local_path(path)
+        if not localfs_exists(local_path):
+            raise FileNotFoundError(local_path)
+        return local_path
+
+    def _upload(self, local_path: str, remote_path: RelativePath) -> None:
+        target_path = self._local_path(remote_path.prepend(ROOT))
+        makedirs(dirname(target_path), exist_ok=True)
+        localfs_copyfile(local_path, target_path)
+        self.notice_created(target_path)
+
+    def _stat(self, path: AbsolutePath) -> Optional[FileStat]:
+        try:
+            stat_result = localfs_stat(self._local_path(path))
+        except FileNotFoundError:
+            return None
+        return FileStat(
+            path, stat_result.st_size, stat_result.st_mtime, stat_result.st_mtime_ns
+        )
+
+    def _read_range(
+        self,
+        path: AbsolutePath,
+        offset: int,
+        length: int,
+        generation: Optional[int] = None,
+    ) -> bytes:
+        with localfs_open(self._local_path(path), mode="rb") as reading_file:
+            reading_file.seek(offset)
+            return reading_file.read(length)
+
+    def _delete(self, path: AbsolutePath) -> bool:
+        local_path = self._local_path(path)
+        try:
+            localfs_remove(local_path)
+        except FileNotFoundError:
+            return False
+        self.notice_deleted(local_path)
+        return True
+
+    # Versions are content hashes; claim records are unique, so that suffices.
+
+    def _write_temporary(self, local_path: str, data: bytes) -> str:
+        makedirs(dirname(local_path), exist_ok=True)
+        handle, temporary_path = mkstemp(dir=dirname(local_path), suffix=".tmp")
+        with localfs_open(handle, mode="wb") as temporary_file:
+            temporary_file.write(data)
+        return temporary_path
+
+    @contextmanager
+    def _locked(self, local_path: str) -> Iterator[bool]:
+        """Holds an O_EXCL lock file next to `local_path`, if available."""
+        lock_path = local_path + ".lock"
+        try:
+            localfs_close_fd(localfs_open_fd(lock_path, O_CREAT | O_EXCL | O_WRONLY))
+        except FileExistsError:
+            try:
+                if time.time() - localfs_getmtime(lock_path) > LOCAL_LOCK_TIMEOUT:
+                    localfs_remove(lock_path)
+            except FileNotFoundError:
+                pass
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            localfs_remove(lock_path)
+
+    def _create_if_absent(self, path: AbsolutePath, data: bytes) -> Optional[str]:
+        local_path = self._local_path(path)
+        temporary_path = self._write_temporary(local_path, data)
+        try:
+            # like O_EXCL, but the file appears with its contents complete
+            localfs_link(temporary_path, local_path)
+        except FileExistsError:
+            return None
+        finally:
+            localfs_remove(temporary_path)
+        self.notice_created(local_path)
+        return sha256(data).hexdigest()
+
+    def _read_versioned(self, path: AbsolutePath) -> Optional[Tuple[bytes, str]]:
+        try:
+            with localfs_open(self._local_path(path), mode="rb") as reading_file:
+                data = reading_file.read()
+        except FileNotFoundError:
+            return None
+        return data, sha256(data).hexdigest()
+
+    def _replace_if_unchanged(
+        self, path: AbsolutePath, data: bytes, version: str
+    ) -> Optional[str]:
+        local_path = self._local_path(path)
+        with self._locked(local_path) as locked:
+            current = self._read_versioned(path)
+            if not locked or current is None or current[1] != version:
+                return None
+            localfs_replace(self._write_temporary(local_path, data), local_path)
+        return sha256(data).hexdigest()
+
+    def _delete_if_unchanged(self, path: AbsolutePath, version: str) -> bool:
+        local_path = self._local_path(path)
+        with self._locked(local_path) as locked:
+            current = self._read_versioned(path)
+            if not locked or current is None or current[1] != version:
+                return False
+            localfs_remove(local_path)
+        self.notice_deleted(local_path)
+        return True
+
+
+class IndexUpdatingEventHandler(object):
+    """Watchdog event handler that keeps a LocalFSAdapter's index current.
+
+  Duck-types watchdog's `FileSystemEventHandler` so that watchdog is only
+  imported when actually watching.
+  """
+
+    def __init__(self, adapter: LocalFSAdapter) -> None:
+        self.adapter = adapter
+
+    def dispatch(self, event: Any) -> None:
+        if event.event_type == "created":
+            self.adapter.notice_created(event.src_path)
+        elif event.event_type == "deleted":
+            self.adapter.notice_deleted(event.src_path)
+        elif event.event_type == "moved":
+            self.adapter.notice_deleted(event.src_path)
+            self.adapter.notice_created(event.dest_path)
+
+
+# GCStorageAdapter
 
 
 class GCStorageAdapter(IOAdapter):
@@ -169,7 +694,17 @@ class GCStorageAdapter(IOAdapter):
     @property
     def bucket(self) -> Any:
         if not self._bucket:
+            # deferred, as importing the storage client is slow
+            from google.cloud import storage
+            from requests.adapters import HTTPAdapter
+
             self._client = storage.Client(project=self.project_name)
+            # Size the connection pool to the shared I/O pool so that bulk calls
+            # reuse connections instead of opening one per request.
+            pooled = HTTPAdapter(
+                pool_connections=MAX_IO_WORKERS, pool_maxsize=MAX_IO_WORKERS
+            )
+            self._client._http.mount("https://", pooled)
             self._bucket = self._client.bucket(self.bucket_name)
         return self._bucket
 
@@ -204,13 +739,35 @@ class GCStorageAdapter(IOAdapter):
 
     @contextmanager
     def _writing(self, path: AbsolutePath, mode: str = "w+b") -> IO:
-        blob = storage.blob.Blob(path.as_relative_path(), self.bucket)
+        if self.write_behind is not None:
+            # a fresh file per write, as earlier writes may still be uploading
+            handle, local_path = mkstemp(dir=self.tempdir)
+            writing_file = localfs_open(handle, mode=mode)
+            yield writing_file
+            writing_file.close()
+            self.write_behind.submit(local_path, path)
+            return
+        blob = self.bucket.blob(path.as_relative_path())
         local_path = self.tempdir.append(path.as_relative_path())
         makedirs(dirname(local_path), exist_ok=True)
         writing_file = localfs_open(local_path, mode=mode)
         yield writing_file
         writing_file.close()
         blob.upload_from_filename(local_path)
+        self._notice_written(path)
+
+    def refresh(self, path: str) -> None:
+        self._notice_written(self.normpath(path))
+
+    def forget(self, path: str) -> None:
+        # listing the bucket only to update a path in it would be wasteful
+        if self._file_list is not None:
+            self._file_list.remove(self.normpath(path))
+
+    def _notice_written(self, path: AbsolutePath) -> None:
+        # the listing's stat of an overwritten object is outdated
+        if self._file_list is not None:
+            self._file_list.add(path)
 
     def _makedirs(self, path: str) -> None:
         pass
@@ -239,21 +796,136 @@ class GCStorageAdapter(IOAdapter):
     def _download(self, path: AbsolutePath) -> AbsolutePath:
         local_path = self.tempdir.append(path.as_relative_path())
         makedirs(dirname(local_path), exist_ok=True)
-        blob = storage.blob.Blob(path.as_relative_path(), self.bucket)
+        blob = self.bucket.blob(path.as_relative_path())
         blob.download_to_filename(local_path)
+        # known from the response headers
+        record_read(path, blob.generation)
         return local_path
 
     def _upload(self, local_path: str, remote_path: RelativePath) -> None:
         assert not remote_path.startswith("/")
-        blob = storage.blob.Blob(remote_path, self.bucket)
+        blob = self.bucket.blob(remote_path)
         blob.upload_from_filename(local_path)
+        self._notice_written(ROOT.append(remote_path))
+
+    def _stat(self, path: AbsolutePath) -> Optional[FileStat]:
+        blob = self.bucket.get_blob(path.as_relative_path())
+        if blob is None:
+            return None
+        return FileStat(path, blob.size, blob.updated.timestamp(), blob.generation)
+
+    def _read_range(
+        self,
+        path: AbsolutePath,
+        offset: int,
+        length: int,
+        generation: Optional[int] = None,
+    ) -> bytes:
+        # a replaced generation is not found instead of read in part
+        blob = self.bucket.blob(path.as_relative_path(), generation=generation)
+        # `end` is inclusive; reading past the end of the object is fine
+        end = offset + length - 1
+        if hasattr(blob, "download_as_bytes"):
+            return blob.download_as_bytes(start=offset, end=end)
+        return blob.download_as_string(start=offset, end=end)
+
+    def _delete(self, path: AbsolutePath) -> bool:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.bucket.blob(path.as_relative_path()).delete()
+        except NotFound:
+            return False
+        if self._file_list is not None:
+            self._file_list.remove(path)
+        return True
+
+    # Versions are object generations, checked by GCS preconditions.
+
+    def _create_if_absent(self, path: AbsolutePath, data: bytes) -> Optional[int]:
+        from google.api_core.exceptions import PreconditionFailed
+
+        blob = self.bucket.blob(path.as_relative_path())
+        try:
+            blob.upload_from_string(data, if_generation_match=0)
+        except PreconditionFailed:
+            return None
+        return blob.generation
+
+    def _read_versioned(self, path: AbsolutePath) -> Optional[Tuple[bytes, int]]:
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        blob = self.bucket.get_blob(path.as_relative_path())
+        if blob is None:
+            return None
+        try:
+            data = blob.download_as_bytes(if_generation_match=blob.generation)
+        except (NotFound, PreconditionFailed):
+            # replaced or deleted since we looked it up
+            return None
+        return data, blob.generation
+
+    def _replace_if_unchanged(
+        self, path: AbsolutePath, data: bytes, version: int
+    ) -> Optional[int]:
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        blob = self.bucket.blob(path.as_relative_path())
+        try:
+            blob.upload_from_string(data, if_generation_match=version)
+        except (NotFound, PreconditionFailed):
+            return None
+        return blob.generation
+
+    def _delete_if_unchanged(self, path: AbsolutePath, version: int) -> bool:
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        blob = self.bucket.blob(path.as_relative_path())
+        try:
+            blob.delete(if_generation_match=version)
+        except (NotFound, PreconditionFailed):
+            return False
+        return True
+
+    def _prepare_concurrent_access(self) -> None:
+        # create the client once, before worker threads race to do it
+        self.bucket
+
+
+# Backend selection
+
+
+class LazyIOAdapter(object):
+    """Stands in for the configured IOAdapter, creating it on first use.
+
+  Attribute access, assignment and deletion are forwarded, so modules can keep
+  importing `io` at import time without paying for backend setup. See
+  `flow.backends` for how the backend is chosen.
+  """
+
+    def __init__(self) -> None:
+        object.__setattr__(self, "_adapter", None)
+
+    @property
+    def adapter(self) -> IOAdapter:
+        if self._adapter is None:
+            from flow.backends import create_io_adapter
+
+            object.__setattr__(self, "_adapter", create_io_adapter())
+        return self._adapter
+
+    def configure(self, adapter: IOAdapter) -> None:
+        """Replaces the backend, e.g. to use a LocalFSAdapter in the simulator."""
+        object.__setattr__(self, "_adapter", adapter)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.adapter, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.adapter, name, value)
 
+    def __delattr__(self, name: str) -> None:
+        delattr(self.adapter, name)
 
-from os import getenv
 
-io: IOAdapter
-# if getenv("USE_LOCAL_FS", "").startswith("TRUE"):
-#     logging.warn("Using LocalFSAdapter!")
-#     io = LocalFSAdapter()
-# else:
-io = GCStorageAdapter()
+io: IOAdapter = cast(IOAdapter, LazyIOAdapter())
@@ -1,33 +1,59 @@
 import logging
-from typing import List, Tuple, Any, Dict
+from concurrent.futures import Future
+from typing import List, Tuple, Any, Dict, Optional
 import json as JSON
+from hashlib import sha256
 from imp import load_source
 from os.path import basename, splitext, join, exists
-from os import getenv
+from os import getenv, getpid
+from socket import gethostname
 from timeit import default_timer as timer
 
 from flow.typing import Bindings, Variable, Value
+from flow.read_set import ReadSet, tracking_reads
+from flow.file_list import FileStat
 from flow.io_adapter import io
 from flow.dynamic_import import import_module_from_local_source
 from flow.path_template import PathTemplate, PathTemplateError
 from flow.path import AbsolutePath, AbsoluteGCSURL
 
-from lucid.misc.io import load, save
+
+def claim_owner() -> str:
+    return f"{gethostname()}:{getpid()}"
 
 
 class JobSpec(object):
     """Serializable data object describing which task to execute and its bindings."""
 
+    # seconds a worker claims a job's output for while executing it; should
+    # exceed the job timeout. 0 disables claims.
+    claim_ttl: float = float(getenv("FLOW_CLAIM_TTL", "0"))
+
+    _fields = ("bindings", "output", "task_path", "task_hash", "inputs_updated")
+
     def __init__(
-        self, bindings: Bindings, output: str, task_path: AbsolutePath
+        self,
+        bindings: Bindings,
+        output: str,
+        task_path: AbsolutePath,
+        task_hash: Optional[str] = None,
+        inputs_updated: Optional[float] = None,
     ) -> None:
         self.bindings = bindings
         self.output = output
         self.task_path = task_path
+        # sha256 of the task's source, see `identity`
+        self.task_hash = task_hash
+        # when the task source or an input last changed, see `flow.staleness`
+        self.inputs_updated = inputs_updated
+        # set by `execute`
+        self._skipped = False
+        self._reads: ReadSet = {}
+        self._save_acknowledgement: Optional[Future] = None
 
     def __eq__(self, other: object) -> bool:
         if isinstance(self, other.__class__):
-            return self.__dict__ == other.__dict__
+            return self._public_dict() == other._public_dict()  # type: ignore
         return False
 
     def __repr__(self) -> str:
@@ -35,6 +61,46 @@ class JobSpec(object):
             self=self
         )
 
+    @property
+    def identity(self) -> str:
+        """Stable content hash; repeated enqueues of the same job share it.
+
+    Covers the task's path and source hash, the canonical (sorted, JSON
+    encoded) bindings and the output. Without a `task_hash`, edits to the task
+    source do not change the identity. With `inputs_updated`, neither do
+    updated inputs.
+    """
+        fields = [self.task_path, self.task_hash, self.bindings, self.output]
+        if self.inputs_updated is not None:
+            fields.append(self.inputs_updated)
+        canonical = JSON.dumps(
+            fields,
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return sha256(canonical.encode()).hexdigest()
+
+    def input_paths(self) -> List[str]:
+        """Returns all input paths the bindings resolve to.
+
+    Aggregating inputs resolve to every path their template currently matches,
+    like in `value_for_input`.
+    """
+        paths = []
+        for value in self.bindings.values():
+            if isinstance(value, str) and value.startswith("/"):
+                paths.append(value)
+            elif isinstance(value, dict) and len(value) == 1:
+                template = next(iter(value.values()))
+                if not isinstance(template, str):
+                    continue
+                try:
+                    paths.extend(io.glob(PathTemplate(template).glob))
+                except PathTemplateError:
+                    continue
+        return paths
+
     @classmethod
     def value_for_input(cls, input: object) -> object:
         if isinstance(input, str):
@@ -100,37 +166,138 @@ class JobSpec(object):
                     output_file.write(result.encode())
                 # TODO: loaders and savers? Assume serialized already for now.
             else:
+                from lucid.misc.io import save  # deferred, imports TensorFlow
+
                 with io.writing(output) as output_file:
                     save(result, output_file)
         else:
             raise NotImplementedError
 
+    def output_is_current(self, output_stat: Optional[FileStat]) -> bool:
+        """Whether an output with this stat needs no recomputation.
+
+    It does if it's missing, or older than `inputs_updated`.
+    """
+        if output_stat is None:
+            return False
+        if self.inputs_updated is None or output_stat.updated is None:
+            return True
+        return output_stat.updated >= self.inputs_updated
+
     def execute(self) -> Any:
+        """Runs the task and saves its result.
+
+    With a `claim_ttl`, first checks that the output is not current yet and
+    claims it, so that concurrent workers don't compute it twice; skips the
+    job otherwise. The claim is released once the result is durable.
+
+    Executed jobs are recorded in the provenance store, if one is configured.
+    """
+        claim = None
+        if self.claim_ttl:
+            if self.output_is_current(io.stat(self.output)):
+                logging.info("Skipping %s, its output is up to date.", self)
+                return self._skip()
+            claim = io.claim(self.output, claim_owner(), self.claim_ttl)
+            if claim is None:
+                logging.info("Skipping %s, another worker claimed its output.", self)
+                return self._skip()
+        try:
+            result = self._execute()
+        except BaseException:
+            if claim is not None:
+                io.release(claim)
+            raise
+        self._record_provenance()
+        if claim is not None:
+            if self._save_acknowledgement is None:
+                io.release(claim)
+            else:
+                self._save_acknowledgement.add_done_callback(
+                    lambda _: io.release(claim)
+                )
+        return result
+
+    def _record_provenance(self) -> None:
+        from flow.provenance import provenance_store  # deferred, imports JobSpec
+
+        store = provenance_store()
+        if store is None:
+            return
+        try:
+            store.record(self)
+        except Exception:
+            logging.exception("Recording provenance of %s failed.", self)
+
+    @property
+    def skipped(self) -> bool:
+        """Whether the last `execute` skipped the job instead of running it."""
+        return self._skipped
+
+    @property
+    def reads(self) -> ReadSet:
+        """Files the last `execute` read, with their generations."""
+        return self._reads
+
+    @property
+    def save_acknowledgement(self) -> Optional[Future]:
+        """Resolves once the last `execute`'s result is durable, if pending."""
+        return self._save_acknowledgement
+
+    def _skip(self) -> None:
+        self._skipped = True
+        self.result = None
+        self.execution_duration = 0.0
+        return None
+
+    def _execute(self) -> Any:
+        self._skipped = False
         start = timer()
         # load module
         task_path = self.task_path
         if not exists(task_path):
             task_path = io.download(task_path)
-        module = import_module_from_local_source(task_path)
-        # set bindings
-        for name, input in self.bindings.items():
-            value = self.value_for_input(input)
-            logging.debug("Setting '%s' to '%s' in module '%s'", name, value, module)
-            setattr(module, name, value)
-        # set output; e.g. in case the task saves its own results
-        output_value = self.value_for_output(self.output)
-        logging.debug("Setting 'output' to '%s' in module '%s'", output_value, module)
-        setattr(module, "output", output_value)
-        # execute and save result
-        self.result = module.main()  # type: ignore
+        with tracking_reads() as reads:
+            module = import_module_from_local_source(task_path)
+            # set bindings
+            for name, input in self.bindings.items():
+                value = self.value_for_input(input)
+                logging.debug(
+                    "Setting '%s' to '%s' in module '%s'", name, value, module
+                )
+                setattr(module, name, value)
+            # set output; e.g. in case the task saves its own results
+            output_value = self.value_for_output(self.output)
+            logging.debug(
+                "Setting 'output' to '%s' in module '%s'", output_value, module
+            )
+            setattr(module, "output", output_value)
+            # execute and save result
+            self.result = module.main()  # type: ignore
         end = timer()
+        self._reads = self._with_generations(reads)
         self.execution_duration = end - start
         self.save_result_for_output(self.result, self.output)
+        # resolves once the result is durable if uploads happen write-behind
+        self._save_acknowledgement = io.pending_write(self.output)
         # unload module
         # TODO: test if that actually allows us to call this method multiple times!
         del module
         return self.result
 
+    def _with_generations(self, reads: ReadSet) -> ReadSet:
+        """Looks up the generations of reads the adapter didn't know, in bulk."""
+        reads = {
+            path: generation
+            for path, generation in reads.items()
+            if path not in (self.task_path, self.output)
+        }
+        unknown = [path for path, generation in reads.items() if generation is None]
+        for path, result in zip(unknown, io.stat_many(unknown)):
+            if result.ok and result.value is not None:
+                reads[path] = result.value.generation
+        return reads
+
     # Serialization
 
     @classmethod
@@ -140,6 +307,10 @@ class JobSpec(object):
 
     def to_json(self, pretty: bool = False) -> str:
         if pretty:
-            return JSON.dumps(self.__dict__, indent=2, sort_keys=True)
+            return JSON.dumps(self._public_dict(), indent=2, sort_keys=True)
         else:
-            return JSON.dumps(self.__dict__)
+            return JSON.dumps(self._public_dict())
+
+    def _public_dict(self) -> Dict[str, Any]:
+        # what `execute` sets (results, reads, ...) is neither serialized nor compared
+        return {field: getattr(self, field) for field in self._fields}
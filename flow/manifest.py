@@ -0,0 +1,272 @@
+"""Manifests list the output bindings of every job a task can create.
+
+A manifest is a small JSON index at `TaskSpec.manifest_path` pointing to
+JSON Lines shards next to it, one line per job with the values of the output
+template's placeholders. Shards are written while the bindings are still being
+enumerated, so a manifest never needs all bindings in memory. Jobs added
+later by new inputs go into delta shards; only the index is rewritten. Jobs
+the manifest lists already, e.g. enqueued again for a re-uploaded input, are
+not added again, and once there are more than `DEFAULT_MAX_DELTAS` delta
+shards they are compacted into new shards.
+
+```
+{"version": 2, "source_hash": "...", "output": {"template": "/out/{a}.txt"},
+ "keys": ["a"], "count": 3, "shards": ["/tasks/t.manifest/00000.jsonl", ...]}
+```
+
+`ManifestWriter` writes manifests on a background thread, in submission order,
+so event handling does not wait for them.
+"""
+
+import json
+import logging
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from flow.io_adapter import io
+from flow.metrics import Metrics
+from flow.task_spec import TaskSpec, PathTemplateOutputSpec
+from flow.typing import Bindings
+from flow.util import batch
+
+MANIFEST_VERSION = 2
+DEFAULT_SHARD_SIZE = 100000
+DEFAULT_MAX_DELTAS = 16
+
+# rows listed in a manifest, by manifest path, with the index they were read at
+ListedRows = Dict[str, Tuple[tuple, Set[str]]]
+
+
+def shard_directory(task_spec: TaskSpec) -> str:
+    return task_spec.manifest_path[: -len(".json")] + ".manifest"
+
+
+def read_index(manifest_path: str) -> Optional[Dict[str, Any]]:
+    """Returns a manifest's index, or None if there is no current manifest."""
+    if not io.exists(manifest_path):
+        return None
+    with io.reading(manifest_path) as open_file:
+        index = json.load(open_file)
+    if index.get("version") != MANIFEST_VERSION:
+        return None
+    return index
+
+
+def read_manifest(manifest_path: str) -> Iterator[List[Any]]:
+    """Yields each job's output placeholder values, shard by shard."""
+    index = read_index(manifest_path)
+    if index is None:
+        return
+    for row in _read_rows(index["shards"]):
+        yield json.loads(row)
+
+
+def _read_rows(shards: List[str]) -> Iterator[str]:
+    for shard in shards:
+        with io.reading(shard) as open_file:
+            for line in open_file:
+                yield line.decode("utf-8").rstrip("\n")
+
+
+def _keys(task_spec: TaskSpec) -> List[str]:
+    if not isinstance(task_spec.output_spec, PathTemplateOutputSpec):
+        raise NotImplementedError
+    return list(task_spec.output_spec.placeholders)
+
+
+def _rows(task_spec: TaskSpec, all_bindings: Iterable[Bindings]) -> Iterator[str]:
+    keys = _keys(task_spec)
+    for bindings in all_bindings:
+        yield json.dumps([bindings[key] for key in keys], default=str)
+
+
+def _write_shards(
+    task_spec: TaskSpec, rows: Iterable[str], shard_size: int, prefix: str
+) -> Iterator[Tuple[str, int]]:
+    """Writes shards of `shard_size` rows, yielding each one's path and size."""
+    directory = shard_directory(task_spec)
+    for number, shard in enumerate(batch(rows, shard_size)):
+        rows = sorted(shard)
+        path = f"{directory}/{prefix}{number:05d}.jsonl"
+        with io.writing(path, mode="w") as open_file:
+            for row in rows:
+                open_file.write(row + "\n")
+        yield path, len(rows)
+
+
+def _delete_shards(shards: Iterable[str]) -> None:
+    for shard in shards:
+        try:
+            io.delete(shard)
+        except Exception:
+            logging.exception("Deleting obsolete manifest shard %s failed.", shard)
+
+
+def _write_index(
+    task_spec: TaskSpec, shards: List[str], count: int
+) -> Dict[str, Any]:
+    index = {
+        "version": MANIFEST_VERSION,
+        "source_hash": task_spec.source_hash,
+        "output": {"template": task_spec.output_spec.path_template.template},
+        "keys": _keys(task_spec),
+        "count": count,
+        "shards": shards,
+    }
+    with io.writing(task_spec.manifest_path, mode="w") as open_file:
+        json.dump(index, open_file)
+    return index
+
+
+def write_manifest(
+    task_spec: TaskSpec,
+    all_bindings: Optional[Iterable[Bindings]] = None,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+) -> int:
+    """Writes a task's full manifest; returns the number of jobs in it."""
+    if all_bindings is None:
+        all_bindings = task_spec.iter_bindings()
+    previous = read_index(task_spec.manifest_path)
+    shards, count = [], 0
+    rows = _rows(task_spec, all_bindings)
+    for path, size in _write_shards(task_spec, rows, shard_size, ""):
+        shards.append(path)
+        count += size
+    # the index goes last, so readers never see a partial manifest
+    _write_index(task_spec, shards, count)
+    if previous is not None:
+        _delete_shards(set(previous["shards"]) - set(shards))
+    return count
+
+
+def _index_version(index: Dict[str, Any]) -> tuple:
+    return (index["source_hash"], index["count"], tuple(index["shards"]))
+
+
+def append_to_manifest(
+    task_spec: TaskSpec,
+    all_bindings: Iterable[Bindings],
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    max_deltas: int = DEFAULT_MAX_DELTAS,
+    listed: Optional[ListedRows] = None,
+) -> int:
+    """Adds jobs to a task's manifest in delta shards; returns how many.
+
+  Only adds jobs the manifest doesn't list yet. Their rows are read from the
+  shards, unless `listed` has them for the current index already; it is
+  updated for the next call. With more than `max_deltas` delta shards, all
+  rows are compacted into new shards. Writes the full manifest instead if the
+  task has none, or only one for an older version of its source.
+  """
+    manifest_path = task_spec.manifest_path
+    index = read_index(manifest_path)
+    if index is None or index["source_hash"] != task_spec.source_hash:
+        return write_manifest(task_spec, shard_size=shard_size)
+    if listed is None:
+        listed = {}
+    version, rows = listed.get(manifest_path, ((), set()))
+    if version != _index_version(index):
+        rows = set(_read_rows(index["shards"]))
+    new = [
+        row
+        for row in OrderedDict.fromkeys(_rows(task_spec, all_bindings))
+        if row not in rows
+    ]
+    if new:
+        rows.update(new)
+        index = _append_rows(task_spec, index, new, rows, shard_size, max_deltas)
+    listed[manifest_path] = (_index_version(index), rows)
+    return len(new)
+
+
+def _append_rows(
+    task_spec: TaskSpec,
+    index: Dict[str, Any],
+    new: List[str],
+    rows: Set[str],
+    shard_size: int,
+    max_deltas: int,
+) -> Dict[str, Any]:
+    # unique, as two writers may append to the same manifest
+    unique = uuid.uuid4().hex[:8]
+    shards = list(index["shards"])
+    for path, _ in _write_shards(task_spec, new, shard_size, f"delta-{unique}-"):
+        shards.append(path)
+    obsolete: List[str] = []
+    if sum("/delta-" in shard for shard in shards) > max_deltas:
+        obsolete = shards
+        shards = [
+            path
+            for path, _ in _write_shards(task_spec, rows, shard_size, f"{unique}-")
+        ]
+    index = _write_index(task_spec, shards, len(rows))
+    _delete_shards(obsolete)
+    return index
+
+
+class ManifestWriter(object):
+    """Writes and appends to manifests on a background thread, in order.
+
+  Keeps the rows of manifests it appended to in memory, so repeated appends
+  don't read the manifest again.
+  """
+
+    def __init__(
+        self,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        max_deltas: int = DEFAULT_MAX_DELTAS,
+    ) -> None:
+        self.shard_size = shard_size
+        self.max_deltas = max_deltas
+        self.metrics = Metrics("manifests")
+        self._listed: ListedRows = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="flow-manifest"
+        )
+
+    def write_if_needed(self, task_spec: TaskSpec) -> Future:
+        """Writes the task's manifest unless it is current already."""
+        return self._executor.submit(self._write_if_needed, task_spec)
+
+    def append(self, task_spec: TaskSpec, all_bindings: List[Bindings]) -> Future:
+        """Adds the bindings of newly enqueued jobs to the task's manifest."""
+        return self._executor.submit(self._append, task_spec, all_bindings)
+
+    def flush(self) -> None:
+        """Waits until everything submitted so far is written."""
+        self._executor.submit(lambda: None).result()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _write_if_needed(self, task_spec: TaskSpec) -> None:
+        try:
+            index = read_index(task_spec.manifest_path)
+            if index is not None and index["source_hash"] == task_spec.source_hash:
+                return
+            with self.metrics.timer("write"):
+                count = write_manifest(task_spec, shard_size=self.shard_size)
+        except Exception:
+            logging.exception("Writing manifest of %s failed.", task_spec.name)
+            self.metrics.increment("errors")
+            return
+        self.metrics.increment("written_rows", count)
+        logging.info("Wrote manifest of %s with %d jobs.", task_spec.name, count)
+
+    def _append(self, task_spec: TaskSpec, all_bindings: List[Bindings]) -> None:
+        try:
+            with self.metrics.timer("append"):
+                count = append_to_manifest(
+                    task_spec,
+                    all_bindings,
+                    self.shard_size,
+                    self.max_deltas,
+                    self._listed,
+                )
+        except Exception:
+            logging.exception("Appending to manifest of %s failed.", task_spec.name)
+            self.metrics.increment("errors")
+            return
+        self.metrics.increment("appended_rows", count)
@@ -0,0 +1,224 @@
+"""An in-memory object store behind the IOAdapter interface.
+
+Keeps objects in a dict, indexes them in a FileList and stamps every write
+with a new generation number, like GCS does. Per-request latency, transfer
+bandwidth and a failure rate can be injected, which makes it a stand-in for
+GCS when benchmarking the planner, `JobSpec.execute` or the enqueuers on a
+single machine:
+
+```python
+io.configure(MemoryIOAdapter(latency=0.05, bandwidth=50e6, failure_rate=0.01))
+```
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from os import makedirs
+from os.path import dirname, normpath
+from tempfile import mkdtemp
+from threading import Lock
+from typing import Dict, IO, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+
+from flow.file_list import FileList, FileStat
+from flow.io_adapter import IOAdapter
+from flow.path import AbsolutePath, RelativePath, ROOT
+from flow.read_set import record_read
+
+
+class SimulatedIOError(IOError):
+    """Raised by MemoryIOAdapter for injected failures."""
+
+    pass
+
+
+class StoredObject(NamedTuple):
+    data: bytes
+    generation: int
+    updated: float
+
+
+class MemoryIOAdapter(IOAdapter):
+    """IOAdapter over a dict, with configurable simulated network behavior.
+
+  latency: seconds added to every request that would hit the network
+  bandwidth: bytes per second for transferring object contents; None is
+      unlimited
+  failure_rate: probability that a request raises SimulatedIOError
+  """
+
+    objects: Dict[AbsolutePath, StoredObject]
+
+    def __init__(
+        self,
+        objects: Optional[Mapping[str, bytes]] = None,
+        latency: float = 0.0,
+        bandwidth: Optional[float] = None,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.objects = {}
+        self.requests = 0
+        self.tempdir = AbsolutePath(mkdtemp())
+        self._file_list = FileList(paths=[])
+        self._generation = 0
+        self._lock = Lock()
+        self._random = random.Random(seed)
+        for path, data in (objects or {}).items():
+            self.put(path, data)
+
+    @property
+    def file_list(self) -> FileList:
+        return self._file_list
+
+    def put(self, path: str, data: bytes) -> StoredObject:
+        """Stores `data` at `path` without simulating any request."""
+        normalized = self.normpath(path)
+        with self._lock:
+            return self._put_locked(normalized, data)
+
+    def _put_locked(self, path: AbsolutePath, data: bytes) -> StoredObject:
+        self._generation += 1
+        stored = StoredObject(data, self._generation, time.time())
+        self.objects[path] = stored
+        stat = FileStat(path, len(data), stored.updated, stored.generation)
+        self._file_list.add(path, stat)
+        return stored
+
+    def normpath(self, path: str) -> AbsolutePath:
+        path = normpath(path)
+        if not path.startswith("/"):
+            path = "/" + path
+        return AbsolutePath(path)
+
+    def _request(self, num_bytes: int = 0) -> None:
+        """Simulates one request transferring `num_bytes`."""
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.failure_rate
+        delay = self.latency
+        if self.bandwidth:
+            delay += num_bytes / self.bandwidth
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            raise SimulatedIOError("Simulated failure.")
+
+    def _get(self, path: AbsolutePath) -> StoredObject:
+        try:
+            return self.objects[path]
+        except KeyError:
+            raise FileNotFoundError(path)
+
+    @contextmanager
+    def _reading(self, path: AbsolutePath, mode: str = "rb") -> Iterator[IO]:
+        stored = self._get(path)
+        self._request(len(stored.data))
+        record_read(path, stored.generation)
+        if "b" in mode:
+            yield BytesIO(stored.data)
+        else:
+            yield StringIO(stored.data.decode())
+
+    @contextmanager
+    def _writing(self, path: AbsolutePath, mode: str = "w+b") -> Iterator[IO]:
+        buffer = BytesIO() if "b" in mode else StringIO()
+        yield buffer
+        data = buffer.getvalue()
+        if isinstance(data, str):
+            data = data.encode()
+        self._request(len(data))
+        self.put(path, data)
+
+    def _makedirs(self, path: AbsolutePath) -> None:
+        pass
+
+    def _glob(self, glob_path: AbsolutePath) -> List[AbsolutePath]:
+        with self._lock:
+            return self._file_list.glob(glob_path)
+
+    def _exist(self, paths: List[AbsolutePath]) -> List[bool]:
+        return [path in self.objects for path in paths]
+
+    def _download(self, path: AbsolutePath) -> AbsolutePath:
+        stored = self._get(path)
+        self._request(len(stored.data))
+        record_read(path, stored.generation)
+        local_path = self.tempdir.append(path.as_relative_path())
+        makedirs(dirname(local_path), exist_ok=True)
+        with open(local_path, "wb") as local_file:
+            local_file.write(stored.data)
+        return local_path
+
+    def _upload(self, local_path: str, remote_path: RelativePath) -> None:
+        with open(local_path, "rb") as local_file:
+            data = local_file.read()
+        self._request(len(data))
+        self.put(remote_path.prepend(ROOT), data)
+
+    def _delete(self, path: AbsolutePath) -> bool:
+        self._request()
+        with self._lock:
+            self._file_list.remove(path)
+            return self.objects.pop(path, None) is not None
+
+    def _stat(self, path: AbsolutePath) -> Optional[FileStat]:
+        self._request()
+        stored = self.objects.get(path)
+        if stored is None:
+            return None
+        return FileStat(path, len(stored.data), stored.updated, stored.generation)
+
+    def _read_range(
+        self,
+        path: AbsolutePath,
+        offset: int,
+        length: int,
+        generation: Optional[int] = None,
+    ) -> bytes:
+        stored = self._get(path)
+        if generation is not None and stored.generation != generation:
+            raise FileNotFoundError(f"{path}#{generation}")
+        data = stored.data[offset : offset + length]
+        self._request(len(data))
+        return data
+
+    # Versions are generations, as with GCS.
+
+    def _create_if_absent(self, path: AbsolutePath, data: bytes) -> Optional[int]:
+        self._request(len(data))
+        with self._lock:
+            if path in self.objects:
+                return None
+            return self._put_locked(path, data).generation
+
+    def _read_versioned(self, path: AbsolutePath) -> Optional[Tuple[bytes, int]]:
+        stored = self.objects.get(path)
+        self._request(len(stored.data) if stored else 0)
+        if stored is None:
+            return None
+        return stored.data, stored.generation
+
+    def _replace_if_unchanged(
+        self, path: AbsolutePath, data: bytes, version: int
+    ) -> Optional[int]:
+        self._request(len(data))
+        with self._lock:
+            stored = self.objects.get(path)
+            if stored is None or stored.generation != version:
+                return None
+            return self._put_locked(path, data).generation
+
+    def _delete_if_unchanged(self, path: AbsolutePath, version: int) -> bool:
+        self._request()
+        with self._lock:
+            stored = self.objects.get(path)
+            if stored is None or stored.generation != version:
+                return False
+            del self.objects[path]
+            self._file_list.remove(path)
+            return True
@@ -0,0 +1,67 @@
+"""Lightweight in-process metrics: counters, timings and throughput.
+
+There is no metrics backend; `Metrics.log` writes a one-line summary that can
+be grepped out of the service logs.
+"""
+
+import logging
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from threading import Lock
+from timeit import default_timer as timer
+from typing import Any, DefaultDict, Dict, Iterator, List
+
+
+class Metrics(object):
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.counters: Counter = Counter()
+        self.timings: DefaultDict[str, List[float]] = defaultdict(list)
+        self.start = timer()
+        self._lock = Lock()
+
+    def increment(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[key] += amount
+
+    def observe(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self.timings[key].append(seconds)
+
+    @contextmanager
+    def timer(self, key: str) -> Iterator[None]:
+        start = timer()
+        try:
+            yield
+        finally:
+            self.observe(key, timer() - start)
+
+    @property
+    def elapsed(self) -> float:
+        return timer() - self.start
+
+    def rate(self, key: str) -> float:
+        """Returns `key`'s count per second since these metrics were created."""
+        elapsed = self.elapsed
+        return self.counters[key] / elapsed if elapsed > 0 else 0.0
+
+    def ratio(self, numerator: str, denominator: str) -> float:
+        count = self.counters[denominator]
+        return self.counters[numerator] / count if count else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            summary: Dict[str, Any] = dict(self.counters)
+            for key, samples in self.timings.items():
+                summary[f"{key}_count"] = len(samples)
+                summary[f"{key}_mean_s"] = sum(samples) / len(samples)
+                summary[f"{key}_max_s"] = max(samples)
+        summary["elapsed_s"] = self.elapsed
+        return summary
+
+    def log(self) -> None:
+        items = ", ".join(
+            f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in sorted(self.summary().items())
+        )
+        logging.info("Metrics %s: %s", self.name, items)
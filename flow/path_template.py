@@ -44,6 +44,11 @@ class PathTemplate(Template):
         )
         return re_compile(regex)
 
+    @property
+    def literal_prefix(self) -> str:
+        """The part of the template before its first placeholder."""
+        return self.template.split(self.delimiter, 1)[0]
+
     @property
     def glob(self) -> str:
         substitution: Mapping[str, str] = defaultdict(lambda: "*")
@@ -0,0 +1,241 @@
+"""A process pool with per-item timeouts, memory limits and isolated failures.
+
+Unlike `concurrent.futures.ProcessPoolExecutor`, a worker that runs over its
+timeout, uses more memory than allowed or crashes only fails the item it was
+working on: the worker process is killed and replaced, and all other items
+carry on. Memory is the resident set size, polled every `RSS_POLL_INTERVAL`
+seconds; limiting address space instead would fail libraries such as
+TensorFlow, which reserve far more of it than they use.
+Functions and items must be picklable; results come back as `Completion`s in
+the order they finish.
+"""
+
+import logging
+import multiprocessing
+import os
+import traceback
+from collections import deque
+from multiprocessing.connection import wait
+from timeit import default_timer as timer
+from typing import Any, Callable, Deque, Iterable, Iterator, List, NamedTuple
+from typing import Optional, Tuple
+
+
+class Completion(NamedTuple):
+    item: Any
+    result: Any = None
+    error: Optional[str] = None
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+RSS_POLL_INTERVAL = 0.1
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """Returns the resident set size of process `pid`, or None if unknown."""
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil  # optional, where there is no /proc
+    except ImportError:
+        return None
+    try:
+        return psutil.Process(pid).memory_info().rss
+    except psutil.Error:
+        return None
+
+
+def _work(
+    connection: Any,
+    initializer: Optional[Callable[[], None]],
+) -> None:
+    if initializer:
+        initializer()
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        function, item = message
+        start = timer()
+        try:
+            result = function(item)
+            connection.send((result, None, timer() - start))
+        except BaseException as error:
+            message = "".join(traceback.format_exception_only(type(error), error))
+            connection.send((None, message.strip(), timer() - start))
+
+
+class _Worker(object):
+    def __init__(
+        self, context: Any, initializer: Optional[Callable[[], None]]
+    ) -> None:
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_work, args=(child_connection, initializer)
+        )
+        self.process.daemon = True
+        self.process.start()
+        child_connection.close()
+        self.item: Any = None
+        self.busy = False
+        self.started = 0.0
+
+    def start(self, function: Callable[[Any], Any], item: Any) -> None:
+        self.item = item
+        self.busy = True
+        self.started = timer()
+        self.connection.send((function, item))
+
+    def finish(self) -> Any:
+        item, self.item, self.busy = self.item, None, False
+        return item
+
+    def kill(self) -> None:
+        self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+
+class IsolatedProcessPool(object):
+    def __init__(
+        self,
+        num_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_rss_bytes: Optional[int] = None,
+        initializer: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self.timeout = timeout
+        self.max_rss_bytes = max_rss_bytes
+        self.initializer = initializer
+        self._context = multiprocessing.get_context()
+        self._workers: List[_Worker] = [
+            self._spawn() for _ in range(self.num_workers)
+        ]
+        self._pending: Deque[Tuple[Callable[[Any], Any], Any]] = deque()
+
+    def __enter__(self) -> "IsolatedProcessPool":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._context, self.initializer)
+
+    @property
+    def idle(self) -> int:
+        """Number of items that could start right away."""
+        busy = sum(worker.busy for worker in self._workers)
+        return self.num_workers - busy - len(self._pending)
+
+    @property
+    def outstanding(self) -> int:
+        busy = sum(worker.busy for worker in self._workers)
+        return busy + len(self._pending)
+
+    def submit(self, function: Callable[[Any], Any], item: Any) -> None:
+        self._pending.append((function, item))
+        self._dispatch()
+
+    def poll(self, timeout: Optional[float] = None) -> List[Completion]:
+        """Waits up to `timeout` seconds and returns items finished so far."""
+        self._dispatch()
+        busy = [worker for worker in self._workers if worker.busy]
+        if not busy:
+            return []
+        wait_timeout = timeout
+        if self.timeout is not None:
+            now = timer()
+            deadline = min(worker.started + self.timeout for worker in busy)
+            remaining = max(deadline - now, 0.0)
+            wait_timeout = remaining if timeout is None else min(timeout, remaining)
+        if self.max_rss_bytes:
+            if wait_timeout is None or wait_timeout > RSS_POLL_INTERVAL:
+                wait_timeout = RSS_POLL_INTERVAL
+        ready = wait([worker.connection for worker in busy], timeout=wait_timeout)
+        completions = []
+        for index, worker in enumerate(self._workers):
+            if not worker.busy:
+                continue
+            if worker.connection in ready:
+                try:
+                    result, error, duration = worker.connection.recv()
+                except (EOFError, OSError):
+                    completions.append(self._replace(index, "Worker process died."))
+                    continue
+                completions.append(Completion(worker.finish(), result, error, duration))
+            elif self.timeout is not None and timer() - worker.started > self.timeout:
+                message = f"Timed out after {self.timeout}s."
+                completions.append(self._replace(index, message))
+            elif self._over_memory_limit(worker):
+                megabytes = self.max_rss_bytes // 1024 ** 2
+                message = f"Used more than {megabytes} MB of memory."
+                completions.append(self._replace(index, message))
+        self._dispatch()
+        return completions
+
+    def imap_unordered(
+        self, function: Callable[[Any], Any], items: Iterable[Any]
+    ) -> Iterator[Completion]:
+        """Runs `function` on all items, yielding completions as they finish."""
+        iterator = iter(items)
+        exhausted = False
+        while True:
+            while not exhausted and self.idle > 0:
+                try:
+                    self.submit(function, next(iterator))
+                except StopIteration:
+                    exhausted = True
+            if exhausted and self.outstanding == 0:
+                return
+            yield from self.poll()
+
+    def run(self, function: Callable[[Any], Any], item: Any) -> Completion:
+        """Runs a single item and waits for it."""
+        return next(self.imap_unordered(function, [item]))
+
+    def close(self) -> None:
+        for worker in self._workers:
+            try:
+                worker.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout=1)
+            if worker.process.is_alive():
+                worker.kill()
+        self._workers = []
+
+    def _over_memory_limit(self, worker: _Worker) -> bool:
+        if not self.max_rss_bytes:
+            return False
+        rss = _rss_bytes(worker.process.pid)
+        return rss is not None and rss > self.max_rss_bytes
+
+    def _dispatch(self) -> None:
+        for worker in self._workers:
+            if not self._pending:
+                return
+            if not worker.busy:
+                worker.start(*self._pending.popleft())
+
+    def _replace(self, index: int, error: str) -> Completion:
+        worker = self._workers[index]
+        duration = timer() - worker.started
+        item = worker.finish()
+        logging.warning("Killing worker %d (%s): %s", worker.process.pid, item, error)
+        worker.kill()
+        self._workers[index] = self._spawn()
+        return Completion(item, error=error, duration=duration)
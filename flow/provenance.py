@@ -0,0 +1,272 @@
+"""Records which job produced each output, and from which task and inputs.
+
+Every executed job is one row in a SQLite database: its output, the path and
+source hash of its task, and its bindings. Each input path its bindings
+resolved to is one more row in an index from inputs to outputs. That answers
+"which outputs depend on `/data/names/name3.txt`?" without enumerating any
+task, which targeted invalidation, cleaning up orphaned outputs and
+re-enqueueing only the affected jobs all need. Files the job read at runtime,
+e.g. through `flow.task_io.load`, are indexed too, together with the
+generation it read; see `flow.read_set`.
+
+Set FLOW_PROVENANCE_PATH to record every job `JobSpec.execute` runs in the
+database at that path. Like the SQLite queue, it is a local file, shared by the
+processes of one machine.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from os import getenv
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from flow.io_adapter import io
+from flow.job_spec import JobSpec
+from flow.read_set import ReadSet
+from flow.typing import Bindings
+from flow.util import batch
+
+# stays below SQLite's limit on the number of parameters of a query
+MAX_PARAMETERS = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    output TEXT PRIMARY KEY,
+    task_path TEXT NOT NULL,
+    task_hash TEXT,
+    bindings TEXT NOT NULL,
+    recorded REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS jobs_task_path ON jobs (task_path);
+CREATE TABLE IF NOT EXISTS inputs (
+    path TEXT NOT NULL,
+    output TEXT NOT NULL,
+    generation INTEGER,
+    PRIMARY KEY (path, output)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS inputs_output ON inputs (output);
+CREATE TABLE IF NOT EXISTS orphaned (
+    output TEXT PRIMARY KEY,
+    since REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class ProvenanceRecord(NamedTuple):
+    """How an output was made: by which task, with which bindings."""
+
+    output: str
+    task_path: str
+    task_hash: Optional[str]
+    bindings: Bindings
+    recorded: float
+
+    def to_job_spec(self) -> JobSpec:
+        """Returns the job that makes this output again."""
+        return JobSpec(self.bindings, self.output, self.task_path, self.task_hash)
+
+
+class ProvenanceStore(object):
+    """Provenance of outputs in the SQLite database at `path`.
+
+  An output has at most one record, from the job that last produced it.
+  """
+
+    def __init__(
+        self, path: str = "flow-provenance.sqlite", timeout: float = 30.0
+    ) -> None:
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def __getstate__(self) -> dict:
+        # connections are per process and thread; reconnect lazily
+        state = dict(self.__dict__)
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def __len__(self) -> int:
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM jobs").fetchone()
+        return count
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _migrate(self) -> None:
+        table_info = self.connection.execute("PRAGMA table_info(inputs)")
+        columns = [row[1] for row in table_info]
+        if "generation" not in columns:
+            self.connection.execute("ALTER TABLE inputs ADD COLUMN generation INTEGER")
+
+    def record(
+        self,
+        job_spec: JobSpec,
+        inputs: Optional[Iterable[str]] = None,
+        reads: Optional[ReadSet] = None,
+    ) -> None:
+        """Records that `job_spec` produced its output from `inputs` and `reads`.
+
+    `inputs` default to the input paths the job's bindings resolve to, `reads`
+    to the read set of its execution. Replaces any earlier record of the
+    output.
+    """
+        if inputs is None:
+            inputs = job_spec.input_paths()
+        if reads is None:
+            reads = getattr(job_spec, "reads", {})
+        row = (
+            job_spec.output,
+            job_spec.task_path,
+            job_spec.task_hash,
+            json.dumps(job_spec.bindings, sort_keys=True, default=str),
+            time.time(),
+        )
+        with self.connection as connection:
+            connection.execute("DELETE FROM inputs WHERE output = ?", (row[0],))
+            connection.execute("DELETE FROM orphaned WHERE output = ?", (row[0],))
+            connection.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)", row
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO inputs (path, output) VALUES (?, ?)",
+                ((path, job_spec.output) for path in inputs),
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO inputs VALUES (?, ?, ?)",
+                ((path, job_spec.output, gen) for path, gen in reads.items()),
+            )
+
+    def get(self, output: str) -> Optional[ProvenanceRecord]:
+        rows = self.connection.execute("SELECT * FROM jobs WHERE output = ?", (output,))
+        records = [self._record(row) for row in rows]
+        return records[0] if records else None
+
+    def inputs(self, output: str) -> List[str]:
+        """Returns the recorded input paths of `output`."""
+        rows = self.connection.execute(
+            "SELECT path FROM inputs WHERE output = ? ORDER BY path", (output,)
+        )
+        return [path for (path,) in rows]
+
+    def reads(self, outputs: Iterable[str]) -> Dict[str, ReadSet]:
+        """Returns the recorded read sets of `outputs`, by output.
+
+    Only reads whose generation is known; outputs without any are left out.
+    """
+        read_sets: Dict[str, ReadSet] = {}
+        for chunk in batch(outputs, MAX_PARAMETERS):
+            marks = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                "SELECT output, path, generation FROM inputs WHERE output IN "
+                f"({marks}) AND generation IS NOT NULL",
+                chunk,
+            )
+            for output, path, generation in rows:
+                read_sets.setdefault(output, {})[path] = generation
+        return read_sets
+
+    def dependents(self, paths: Iterable[str]) -> List[ProvenanceRecord]:
+        """Returns the records of outputs made from or by any of `paths`.
+
+    Outputs depend on their inputs and on their task's source.
+    """
+        outputs: Dict[str, ProvenanceRecord] = {}
+        for chunk in batch(paths, MAX_PARAMETERS):
+            marks = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                "SELECT * FROM jobs WHERE task_path IN ({0}) OR output IN "
+                "(SELECT output FROM inputs WHERE path IN ({0}))".format(marks),
+                chunk + chunk,
+            )
+            for row in rows:
+                outputs.setdefault(row[0], self._record(row))
+        return sorted(outputs.values())
+
+    def forget(self, outputs: Iterable[str]) -> int:
+        """Removes the records of `outputs`; returns how many there were."""
+        forgotten = 0
+        with self.connection as connection:
+            for chunk in batch(outputs, MAX_PARAMETERS):
+                marks = ",".join("?" * len(chunk))
+                for table in ("inputs", "orphaned"):
+                    connection.execute(
+                        f"DELETE FROM {table} WHERE output IN ({marks})", chunk
+                    )
+                cursor = connection.execute(
+                    f"DELETE FROM jobs WHERE output IN ({marks})", chunk
+                )
+                forgotten += cursor.rowcount
+        return forgotten
+
+    def mark_orphaned(self, outputs: Iterable[str]) -> None:
+        """Marks outputs whose task or an input was deleted, see `orphaned`."""
+        now = time.time()
+        with self.connection as connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO orphaned VALUES (?, ?)",
+                ((output, now) for output in outputs),
+            )
+
+    def orphaned(self) -> List[str]:
+        """Returns the outputs marked as orphaned and not produced again since."""
+        rows = self.connection.execute("SELECT output FROM orphaned ORDER BY output")
+        return [output for (output,) in rows]
+
+    def orphans(self) -> List[ProvenanceRecord]:
+        """Returns the records of outputs whose task or an input is gone.
+
+    Checks each distinct task and input path once, in bulk.
+    """
+        rows = self.connection.execute(
+            "SELECT DISTINCT task_path FROM jobs UNION SELECT DISTINCT path FROM inputs"
+        )
+        missing = []
+        for chunk in batch((path for (path,) in rows), MAX_PARAMETERS):
+            exist = io.exist(chunk)
+            missing += [path for path, exists in zip(chunk, exist) if not exists]
+        return self.dependents(missing)
+
+    def remove_orphans(self, delete_outputs: bool = False) -> List[ProvenanceRecord]:
+        """Forgets orphaned outputs, and deletes them if `delete_outputs`."""
+        orphans = self.orphans()
+        if delete_outputs:
+            for orphan in orphans:
+                io.delete(orphan.output)
+        self.forget(orphan.output for orphan in orphans)
+        return orphans
+
+    def _record(self, row: tuple) -> ProvenanceRecord:
+        output, task_path, task_hash, bindings, recorded = row
+        return ProvenanceRecord(
+            output, task_path, task_hash, json.loads(bindings), recorded
+        )
+
+
+_store: Optional[ProvenanceStore] = None
+
+
+def provenance_store() -> Optional[ProvenanceStore]:
+    """Returns the store at FLOW_PROVENANCE_PATH, or None if that is not set."""
+    global _store
+    path = getenv("FLOW_PROVENANCE_PATH")
+    if not path:
+        return None
+    if _store is None or _store.path != path:
+        _store = ProvenanceStore(path)
+    return _store
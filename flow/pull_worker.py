@@ -0,0 +1,154 @@
+"""A worker that leases jobs from a pull queue and runs them on a process pool.
+
+Leases are sized to the pool's free capacity, so no task sits leased but idle
+while its lease runs out. Leases of running jobs are renewed in time, finished
+jobs are acked, and failed or timed out jobs are nacked for the queue to retry.
+When the queue is empty, the worker backs off exponentially.
+"""
+
+import logging
+import random
+import time
+from timeit import default_timer as timer
+from typing import Dict, Optional
+
+from flow.job_spec import JobSpec
+from flow.metrics import Metrics
+from flow.process_pool import Completion, IsolatedProcessPool
+from flow.queue.pull_client import LeasedTask, PullQueueClient
+
+
+def execute_task(task: LeasedTask) -> float:
+    """Executes a leased job in a worker process; returns its duration."""
+    job_spec = JobSpec.from_json(task.payload)
+    job_spec.execute()
+    return job_spec.execution_duration
+
+
+class PullWorker(object):
+    def __init__(
+        self,
+        client: PullQueueClient,
+        pool: IsolatedProcessPool,
+        lease_seconds: float = 60.0,
+        renew_margin: Optional[float] = None,
+        min_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ) -> None:
+        self.client = client
+        self.pool = pool
+        self.lease_seconds = lease_seconds
+        # renew once less than this much of a lease is left
+        self.renew_margin = lease_seconds / 2 if renew_margin is None else renew_margin
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.metrics = Metrics("pull_worker")
+        self._leased: Dict[object, LeasedTask] = {}
+        self._backoff = 0.0
+        self._next_lease = 0.0
+        self._stopped = False
+
+    def stop(self) -> None:
+        """Stops leasing; `run` returns once running jobs have finished."""
+        self._stopped = True
+
+    def run(self, max_empty_polls: Optional[int] = None) -> None:
+        """Leases and runs jobs until stopped.
+
+    With `max_empty_polls`, also returns once the queue was found empty that
+    many times in a row and all leased jobs have finished.
+    """
+        empty_polls = 0
+        while not (self._stopped and not self.pool.outstanding):
+            idle = self.pool.idle > 0 and time.time() >= self._next_lease
+            if idle and not self._stopped:
+                if self._lease():
+                    empty_polls = 0
+                else:
+                    empty_polls += 1
+                    limit = max_empty_polls
+                    if limit is not None and empty_polls >= limit:
+                        if not self.pool.outstanding:
+                            break
+                    self._back_off()
+            if not self.pool.outstanding:
+                time.sleep(max(self._next_lease - time.time(), 0.0))
+                continue
+            for completion in self.pool.poll(timeout=self._poll_timeout()):
+                self._finish(completion)
+            self._renew()
+        self.metrics.log()
+
+    def _lease(self) -> int:
+        try:
+            tasks = self.client.lease(self.pool.idle, self.lease_seconds)
+        except Exception as error:
+            logging.error("Leasing tasks failed: %s", error)
+            self.metrics.increment("lease_errors")
+            return 0
+        self.metrics.increment("leased", len(tasks))
+        for task in tasks:
+            self._leased[task.id] = task
+            self.pool.submit(execute_task, task)
+        if tasks:
+            self._backoff = 0.0
+            self._next_lease = 0.0
+        return len(tasks)
+
+    def _back_off(self) -> None:
+        self._backoff = min(max(self._backoff * 2, self.min_backoff), self.max_backoff)
+        delay = self._backoff * (0.5 + random.random() / 2)
+        logging.debug("Queue is empty, leasing again in %.1fs.", delay)
+        self._next_lease = time.time() + delay
+
+    def _poll_timeout(self) -> float:
+        if not self._leased:
+            return 1.0
+        next_renewal = min(task.lease_expires for task in self._leased.values())
+        next_renewal -= self.renew_margin
+        # poll at least once a second to keep the pool busy
+        return min(max(next_renewal - time.time(), 0.0), 1.0)
+
+    def _renew(self) -> None:
+        deadline = time.time() + self.renew_margin
+        due = [task for task in self._leased.values() if task.lease_expires < deadline]
+        if not due:
+            return
+        try:
+            renewed = self.client.renew(due, self.lease_seconds)
+        except Exception as error:
+            logging.error("Renewing %d leases failed: %s", len(due), error)
+            self.metrics.increment("renew_errors")
+            return
+        renewed_ids = set()
+        for task in renewed:
+            self._leased[task.id] = task
+            renewed_ids.add(task.id)
+        self.metrics.increment("renewed", len(renewed))
+        for task in due:
+            if task.id not in renewed_ids:
+                # someone else may be running it by now; drop its result
+                logging.warning("Lost the lease on task %s.", task.id)
+                self.metrics.increment("lost_leases")
+                del self._leased[task.id]
+
+    def _finish(self, completion: Completion) -> None:
+        self.metrics.observe("job", completion.duration)
+        task = self._leased.pop(completion.item.id, None)
+        if task is None:
+            logging.warning("Dropping result of task %s.", completion.item.id)
+            return
+        start = timer()
+        try:
+            if completion.ok:
+                acknowledged = self.client.ack(task)
+                self.metrics.increment("acked" if acknowledged else "lost_leases")
+            else:
+                logging.error("Job %s failed: %s", task.id, completion.error)
+                self.client.nack(task, error=completion.error)
+                self.metrics.increment("nacked")
+        except Exception as error:
+            # the lease runs out and the queue hands the task out again
+            logging.error("Acknowledging task %s failed: %s", task.id, error)
+            self.metrics.increment("ack_errors")
+        self.metrics.observe("ack", timer() - start)
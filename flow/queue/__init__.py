@@ -2,6 +2,7 @@ from flow.queue.enqueuer import Enqueuer
 from flow.queue.local import LocalEnqueuer
 from flow.queue.gctasks import GCTasksEnqueuer
 from flow.queue.gcpulltasks import GCPullTasksEnqueuer
+from flow.backends import create_enqueuer
 
 # from flow.queue.gcpubsub import GCPubSubEnqueuer
 
@@ -16,7 +17,5 @@ flags.DEFINE_boolean(
 
 
 def get_enqueuer() -> Enqueuer:
-    # if FLAGS.use_local_queue:
-    # return LocalEnqueuer()
-    # else:
-    return GCPullTasksEnqueuer()
+    """Creates the Enqueuer configured in `flow.backends`."""
+    return create_enqueuer()
@@ -0,0 +1,242 @@
+"""Concurrent, adaptively sized batch HTTP requests to Google APIs.
+
+`BatchSubmitter` turns items into API requests, sends them in batch HTTP
+requests (one round trip for up to `MAX_BATCH_SIZE` requests) on a few
+threads, and retries only the items whose sub-request failed with a retryable
+error. Items are consumed lazily, so producing them (e.g. serializing payloads)
+overlaps with the batches in flight. `AdaptiveBatchSize` grows batches
+additively while they succeed quickly and halves them when sub-requests fail,
+e.g. when the API starts rate limiting, or when a batch takes too long.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from timeit import default_timer as timer
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple
+from typing import Optional, Set
+
+from flow.metrics import Metrics
+from flow.util import io_executor
+
+# Google's batch endpoint accepts at most 1000 requests per batch
+MAX_BATCH_SIZE = 1000
+# stays well below the request size limits of the batch endpoint
+MAX_BATCH_BYTES = 8 * 1024 ** 2
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class AdaptiveBatchSize(object):
+    """Additive-increase, multiplicative-decrease control of the batch size."""
+
+    def __init__(
+        self,
+        initial: int = 100,
+        minimum: int = 1,
+        maximum: int = MAX_BATCH_SIZE,
+        increase: int = 50,
+        target_latency: Optional[float] = None,
+    ) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.target_latency = target_latency
+        self._size = min(max(initial, minimum), maximum)
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def record(
+        self, num_requests: int, num_failed: int, latency: Optional[float] = None
+    ) -> None:
+        slow = (
+            self.target_latency is not None
+            and latency is not None
+            and latency > self.target_latency
+        )
+        with self._lock:
+            if num_failed or slow:
+                self._size = max(self._size // 2, self.minimum)
+            elif num_requests >= self._size:
+                self._size = min(self._size + self.increase, self.maximum)
+
+
+class Failure(NamedTuple):
+    item: Any
+    error: Exception
+
+
+def is_retryable(error: Exception) -> bool:
+    status = getattr(getattr(error, "resp", None), "status", None)
+    if status is None:
+        # not an HttpError, e.g. a dropped connection
+        return True
+    return int(status) in RETRYABLE_STATUSES
+
+
+def default_http() -> Any:
+    """Creates an authorized transport; httplib2 is not thread-safe."""
+    import google.auth  # deferred, slow to import
+    import google_auth_httplib2
+    from googleapiclient.http import build_http
+
+    credentials, _ = google.auth.default(
+        scopes=["https://www.googleapis.com/auth/cloud-platform"]
+    )
+    return google_auth_httplib2.AuthorizedHttp(credentials, http=build_http())
+
+
+class BatchSubmitter(object):
+    """Sends one API request per item in concurrent batch HTTP requests.
+
+  client: a discovery client providing `new_batch_http_request(callback)`
+  build_request: creates the API request for an item
+  item_size: bytes an item adds to a batch request, for `max_batch_bytes`
+  ignored_statuses: HTTP statuses that count as success, e.g. 409 when
+      creating a named task that already exists
+  new_http: creates the transport for a submitting thread; None uses the
+      client's own, which is only safe with max_concurrent_batches=1
+  """
+
+    def __init__(
+        self,
+        client: Any,
+        build_request: Callable[[Any], Any],
+        batch_size: Optional[AdaptiveBatchSize] = None,
+        max_concurrent_batches: int = 4,
+        max_attempts: int = 5,
+        initial_backoff: float = 0.5,
+        max_batch_bytes: int = MAX_BATCH_BYTES,
+        item_size: Callable[[Any], int] = len,
+        ignored_statuses: Iterable[int] = (),
+        new_http: Optional[Callable[[], Any]] = default_http,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        self.client = client
+        self.build_request = build_request
+        self.batch_size = batch_size or AdaptiveBatchSize()
+        self.max_concurrent_batches = max_concurrent_batches
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.max_batch_bytes = max_batch_bytes
+        self.item_size = item_size
+        self.ignored_statuses = set(ignored_statuses)
+        self.new_http = new_http
+        self.metrics = metrics or Metrics("batch_submitter")
+        self._local = threading.local()
+
+    def submit(self, items: Iterable[Any]) -> List[Failure]:
+        """Submits all items; returns those that failed for good."""
+        pending = items
+        failures: List[Failure] = []
+        backoff = self.initial_backoff
+        for attempt in range(1, self.max_attempts + 1):
+            final = attempt == self.max_attempts
+            retry = self._submit_once(iter(pending), failures, final)
+            if not retry:
+                break
+            logging.warning(
+                "Retrying %d failed requests (attempt %d/%d).",
+                len(retry),
+                attempt,
+                self.max_attempts,
+            )
+            self.metrics.increment("retried", len(retry))
+            time.sleep(backoff * (1 + random.random()))
+            backoff *= 2
+            pending = retry
+        self.metrics.increment("failed", len(failures))
+        return failures
+
+    def _submit_once(
+        self, items: Iterator[Any], failures: List[Failure], final: bool
+    ) -> List[Any]:
+        retry: List[Any] = []
+        in_flight: Set[Future] = set()
+        carry: List[Any] = []
+        exhausted = False
+        while not exhausted or in_flight:
+            while not exhausted and len(in_flight) < self.max_concurrent_batches:
+                batch = self._next_batch(items, carry)
+                if not batch:
+                    exhausted = True
+                    break
+                in_flight.add(io_executor().submit(self._execute_batch, batch))
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                for failure in future.result():
+                    if final or not is_retryable(failure.error):
+                        failures.append(failure)
+                    else:
+                        retry.append(failure.item)
+        return retry
+
+    def _next_batch(self, items: Iterator[Any], carry: List[Any]) -> List[Any]:
+        """Takes items up to the batch size and byte limit from `items`.
+
+    An item that would overflow the byte limit is carried over to the next
+    batch; a single oversized item still makes up a batch of its own.
+    """
+        batch: List[Any] = []
+        num_bytes = 0
+        size = self.batch_size.size
+        while len(batch) < size:
+            if carry:
+                item = carry.pop()
+            else:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+            item_bytes = self.item_size(item)
+            if batch and num_bytes + item_bytes > self.max_batch_bytes:
+                carry.append(item)
+                break
+            batch.append(item)
+            num_bytes += item_bytes
+        return batch
+
+    def _http(self) -> Any:
+        if self.new_http is None:
+            return None
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = self.new_http()
+        return http
+
+    def _execute_batch(self, items: List[Any]) -> List[Failure]:
+        errors: Dict[str, Exception] = {}
+
+        ignored = []
+
+        def callback(request_id: str, response: Any, exception: Exception) -> None:
+            if exception is None:
+                return
+            status = getattr(getattr(exception, "resp", None), "status", None)
+            if status is not None and int(status) in self.ignored_statuses:
+                ignored.append(request_id)
+            else:
+                errors[request_id] = exception
+
+        batch_request = self.client.new_batch_http_request(callback=callback)
+        for i, item in enumerate(items):
+            batch_request.add(self.build_request(item), request_id=str(i))
+        start = timer()
+        try:
+            batch_request.execute(http=self._http())
+        except Exception as error:
+            logging.warning("Batch of %d requests failed: %s", len(items), error)
+            self.batch_size.record(len(items), len(items))
+            return [Failure(item, error) for item in items]
+        latency = timer() - start
+        self.metrics.observe("batch", latency)
+        self.batch_size.record(len(items), len(errors), latency)
+        self.metrics.increment("ignored", len(ignored))
+        self.metrics.increment("succeeded", len(items) - len(errors) - len(ignored))
+        return [Failure(items[int(i)], error) for i, error in errors.items()]
@@ -1,10 +1,149 @@
-from typing import cast, List, Any
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+from collections import defaultdict
+from typing import cast, List, Any, Dict, Iterable, Iterator, Sequence, Set, Tuple
 from abc import ABC, abstractmethod
 
 from flow.job_spec import JobSpec
+from flow.staleness import StalenessPlanner
+
+from absl import flags
+FLAGS = flags.FLAGS
+flags.DEFINE_float('enqueuer_in_flight_ttl', 3600.0, 'Seconds during which a job enqueued before is skipped as a duplicate.')
+
+
+class InFlightSet(object):
+  """Identities of recently enqueued jobs, each forgotten after `ttl` seconds.
+
+  Identities are also indexed by the paths their jobs depend on, so the jobs
+  that depend on a deleted file can be found without enumerating any task.
+  """
+
+  def __init__(self, ttl: float = 3600.0, max_size: int = 1000000) -> None:
+    self.ttl = ttl
+    self.max_size = max_size
+    # ordered by expiry, as every identity gets the same ttl
+    self._expiries: "OrderedDict[str, Tuple[float, Sequence[str]]]" = OrderedDict()
+    self._by_path: Dict[str, Set[str]] = defaultdict(set)
+    self._lock = Lock()
+
+  def __len__(self) -> int:
+    with self._lock:
+      self._expire(time.time())
+      return len(self._expiries)
+
+  def __contains__(self, identity: object) -> bool:
+    with self._lock:
+      self._expire(time.time())
+      return identity in self._expiries
+
+  def add(self, identity: str, paths: Sequence[str] = ()) -> bool:
+    """Adds `identity`; returns False if it was already in flight."""
+    now = time.time()
+    with self._lock:
+      self._expire(now)
+      if identity in self._expiries:
+        return False
+      self._expiries[identity] = (now + self.ttl, paths)
+      for path in paths:
+        self._by_path[path].add(identity)
+      while len(self._expiries) > self.max_size:
+        self._forget(next(iter(self._expiries)))
+      return True
+
+  def discard(self, identity: str) -> None:
+    with self._lock:
+      self._forget(identity)
+
+  def dependents(self, paths: Iterable[str]) -> Set[str]:
+    """Returns the identities in flight whose jobs depend on any of `paths`."""
+    with self._lock:
+      self._expire(time.time())
+      identities: Set[str] = set()
+      for path in paths:
+        identities |= self._by_path.get(path, set())
+      return identities
+
+  def _forget(self, identity: str) -> None:
+    _, paths = self._expiries.pop(identity, (None, ()))
+    for path in paths:
+      identities = self._by_path.get(path)
+      if identities is not None:
+        identities.discard(identity)
+        if not identities:
+          del self._by_path[path]
+
+  def _expire(self, now: float) -> None:
+    while self._expiries:
+      identity, (expiry, _) = next(iter(self._expiries.items()))
+      if expiry > now:
+        return
+      self._forget(identity)
+
+
+def _dependency_paths(job_spec: JobSpec) -> List[str]:
+  # only paths bound directly; aggregated inputs would need globbing
+  paths = [job_spec.task_path]
+  for value in job_spec.bindings.values():
+    if isinstance(value, str) and value.startswith('/'):
+      paths.append(value)
+  return paths
+
 
 class Enqueuer(ABC):
 
   @abstractmethod
   def add(self, job_specs: List[JobSpec]) -> None:
     pass
+
+  @property
+  def in_flight(self) -> InFlightSet:
+    # subclasses don't call our __init__, so create this lazily
+    if '_in_flight' not in self.__dict__:
+      self._in_flight = InFlightSet(ttl=FLAGS.enqueuer_in_flight_ttl)
+    return self._in_flight
+
+  @property
+  def planner(self) -> StalenessPlanner:
+    if '_planner' not in self.__dict__:
+      self._planner = StalenessPlanner()
+    return self._planner
+
+  def filter_stale(self, job_specs: Iterable[JobSpec]) -> Iterator[JobSpec]:
+    """Skips jobs whose output is newer than their task source and inputs.
+
+    Filter with this before `filter_new`, as it sets `inputs_updated`, which
+    is part of a job's identity.
+    """
+    return self.planner.stale(job_specs)
+
+  def filter_new(self, job_specs: Iterable[JobSpec]) -> Iterator[JobSpec]:
+    """Skips jobs with the same identity as one enqueued within the TTL."""
+    for job_spec in job_specs:
+      if self.in_flight.add(job_spec.identity, _dependency_paths(job_spec)):
+        yield job_spec
+      else:
+        logging.info("Skipping %s, it was enqueued recently.", job_spec)
+
+  def cancel_dependents(self, paths: Iterable[str]) -> int:
+    """Cancels queued jobs that depend on any of `paths`, e.g. deleted files.
+
+    Only finds jobs this enqueuer added within the in-flight TTL; returns how
+    many were cancelled.
+    """
+    identities = self.in_flight.dependents(paths)
+    for identity in identities:
+      self.in_flight.discard(identity)
+    if not identities:
+      return 0
+    return self.cancel(sorted(identities))
+
+  def cancel(self, identities: Sequence[str]) -> int:
+    """Removes queued jobs by identity; returns how many were removed.
+
+    Backends that can't remove jobs once queued keep them.
+    """
+    logging.info("%s can't cancel %d queued jobs.", type(self).__name__, len(identities))
+    return 0
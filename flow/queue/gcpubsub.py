@@ -1,6 +1,5 @@
 import logging
 
-from google.cloud import pubsub
 from typing import List, Any
 
 from flow.queue.enqueuer import Enqueuer
@@ -12,10 +11,12 @@ class GCPubSubEnqueuer(Enqueuer):
                      topic: str = 'flow-jobs') -> None:
     self.project = project
     self.topic = topic
+    from google.cloud import pubsub  # deferred, slow to import
     self.client = pubsub.PublisherClient()
 
   def add(self, job_specs: List[Any]) -> None:
     topic = f'projects/{self.project}/topics/{self.topic}'
-    for job_spec in job_specs:
+    for job_spec in self.filter_new(self.filter_stale(job_specs)):
       message = job_spec.to_json().encode()
-      self.client.publish(topic, message)
+      # lets subscribers drop redelivered or duplicate messages
+      self.client.publish(topic, message, identity=job_spec.identity)
@@ -1,28 +1,167 @@
 import logging
-from typing import cast, List, Any
+from typing import cast, List, Any, Callable, Iterable, Iterator, Optional, Sequence
+from typing import Tuple
 from abc import ABC, abstractmethod
 import base64
 import datetime
 import json
-
-import googleapiclient.discovery
+from timeit import default_timer as timer
 
 from flow.queue.enqueuer import Enqueuer
+from flow.queue.batching import AdaptiveBatchSize, BatchSubmitter, default_http
+from flow.queue.pull_client import LeasedTask, PullQueueClient
 from flow.job_spec import JobSpec
-from flow.io_adapter import io
-from flow.util import batch
+from flow.metrics import Metrics
 
 
 class GCPullTasksEnqueuer(Enqueuer):
+    """Adds jobs to a Cloud Tasks pull queue in pipelined batch requests.
+
+  Payloads are serialized while earlier batches are in flight. The batch size
+  adapts to failures and to `target_latency`, batches stay under the batch
+  endpoint's size limit, and only failed sub-requests get retried. Tasks are
+  named after their job's identity, so Cloud Tasks drops duplicates.
+  """
+
     def __init__(
         self,
         project: str = "brain-deepviz",
         location: str = "us-central1",
         queue: str = "flow-jobs-pull",
+        client: Any = None,
+        max_concurrent_batches: int = 4,
+        target_latency: float = 10.0,
+        new_http: Optional[Callable[[], Any]] = default_http,
     ) -> None:
         self.project = project
         self.location = location
         self.queue = queue
+        if client is None:
+            import googleapiclient.discovery  # deferred, slow to import
+
+            client = googleapiclient.discovery.build(
+                "cloudtasks", "v2beta2", cache_discovery=False
+            )
+        self.client = client
+        self.metrics = Metrics("gcpulltasks_enqueuer")
+        self.submitter = BatchSubmitter(
+            client,
+            self._create_request,
+            batch_size=AdaptiveBatchSize(target_latency=target_latency),
+            max_concurrent_batches=max_concurrent_batches,
+            item_size=lambda item: len(item[1]),
+            ignored_statuses=[409],
+            new_http=new_http,
+            metrics=self.metrics,
+        )
+
+    @property
+    def queue_name(self) -> str:
+        return f"projects/{self.project}/locations/{self.location}/queues/{self.queue}"
+
+    def task_name(self, identity: str) -> str:
+        return f"{self.queue_name}/tasks/{identity}"
+
+    def _create_request(self, item: Tuple[str, str]) -> Any:
+        identity, encoded_payload = item
+        body = {
+            "task": {
+                "name": self.task_name(identity),
+                "pullMessage": {"payload": encoded_payload},
+            }
+        }
+        return (
+            self.client.projects()
+            .locations()
+            .queues()
+            .tasks()
+            .create(parent=self.queue_name, body=body)
+        )
+
+    def _delete_request(self, identity: str) -> Any:
+        return (
+            self.client.projects()
+            .locations()
+            .queues()
+            .tasks()
+            .delete(name=self.task_name(identity))
+        )
+
+    def cancel(self, identities: Sequence[str]) -> int:
+        """Deletes tasks by identity; returns how many are gone now."""
+        # 404: leased and acked, or cancelled before
+        deleter = BatchSubmitter(
+            self.client,
+            self._delete_request,
+            ignored_statuses=[404],
+            new_http=self.submitter.new_http,
+            metrics=Metrics("gcpulltasks_cancel"),
+        )
+        failures = deleter.submit(identities)
+        for failure in failures:
+            logging.error("Failed to delete task %s: %s", failure.item, failure.error)
+        return len(identities) - len(failures)
+
+    def _encoded_payloads(
+        self, job_specs: Iterable[JobSpec]
+    ) -> Iterator[Tuple[str, str]]:
+        for job_spec in self.filter_new(self.filter_stale(job_specs)):
+            payload = job_spec.to_json()
+            yield job_spec.identity, base64.b64encode(payload.encode()).decode()
+
+    def add(self, job_specs: List[JobSpec]) -> None:
+        start = timer()
+        succeeded = self.metrics.counters["succeeded"]
+        failures = self.submitter.submit(self._encoded_payloads(job_specs))
+        duration = timer() - start
+        created = self.metrics.counters["succeeded"] - succeeded
+        logging.info(
+            "Created %d pull tasks in %.2fs (%.1f tasks/s)",
+            created,
+            duration,
+            created / max(duration, 1e-9),
+        )
+        self.metrics.log()
+        if failures:
+            for failure in failures:
+                identity, encoded_payload = failure.item
+                self.in_flight.discard(identity)
+                payload = base64.b64decode(encoded_payload).decode()
+                logging.error("Failed to create task %s: %s", payload, failure.error)
+            raise IOError(f"Failed to create {len(failures)} pull tasks.")
+
+
+def _duration(seconds: float) -> str:
+    return f"{seconds:.3f}s"
+
+
+def _parse_timestamp(timestamp: str) -> float:
+    """Converts an RFC 3339 timestamp as used by Cloud Tasks to epoch seconds."""
+    seconds, _, fraction = timestamp.rstrip("Z").partition(".")
+    parsed = datetime.datetime.strptime(seconds, "%Y-%m-%dT%H:%M:%S")
+    parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp() + float("0." + (fraction or "0"))
+
+
+class GCPullQueueClient(PullQueueClient):
+    """Leases tasks from a Cloud Tasks pull queue.
+
+  A lease is identified by the task's `scheduleTime`, which Cloud Tasks
+  changes whenever the task is leased or its lease renewed. Retry limits are
+  part of the queue's configuration, so `nack` ignores `error` and `delay`.
+  """
+
+    def __init__(
+        self,
+        project: str = "brain-deepviz",
+        location: str = "us-central1",
+        queue: str = "flow-jobs-pull",
+    ) -> None:
+        self.project = project
+        self.location = location
+        self.queue = queue
+        import googleapiclient.discovery  # deferred, slow to import
+
         self.client = googleapiclient.discovery.build(
             "cloudtasks", "v2beta2", cache_discovery=False
         )
@@ -31,24 +170,66 @@ class GCPullTasksEnqueuer(Enqueuer):
     def queue_name(self) -> str:
         return f"projects/{self.project}/locations/{self.location}/queues/{self.queue}"
 
-    def add(self, job_specs: List[JobSpec]) -> None:
-        for job_spec_batch in batch(job_specs, 1000):
-            batch_request = self.client.new_batch_http_request()
-            # TODO: re-run iff output timestamp is older than task's?
-            for job_spec in job_spec_batch:
-                # uses fast in-memory file list lookup
-                if io.exists(job_spec.output):
-                    continue
-                payload = job_spec.to_json()
-                base64_encoded_payload = base64.b64encode(payload.encode())
-                converted_payload = base64_encoded_payload.decode()
-                body = {"task": {"pullMessage": {"payload": converted_payload}}}
-                request = (
-                    self.client.projects()
-                    .locations()
-                    .queues()
-                    .tasks()
-                    .create(parent=self.queue_name, body=body)
-                )
-                batch_request.add(request)
-            batch_request.execute()
+    def _tasks(self) -> Any:
+        return self.client.projects().locations().queues().tasks()
+
+    def _leased_task(self, task: dict) -> LeasedTask:
+        payload = base64.b64decode(task["pullMessage"]["payload"]).decode()
+        attempts = task.get("status", {}).get("attemptDispatchCount", 1)
+        schedule_time = task["scheduleTime"]
+        return LeasedTask(
+            task["name"],
+            payload,
+            int(attempts),
+            schedule_time,
+            _parse_timestamp(schedule_time),
+        )
+
+    def lease(self, max_tasks: int, lease_seconds: float) -> List[LeasedTask]:
+        body = {
+            "maxTasks": max_tasks,
+            "leaseDuration": _duration(lease_seconds),
+            "responseView": "FULL",
+        }
+        response = self._tasks().lease(parent=self.queue_name, body=body).execute()
+        return [self._leased_task(task) for task in response.get("tasks", [])]
+
+    def renew(
+        self, tasks: Sequence[LeasedTask], lease_seconds: float
+    ) -> List[LeasedTask]:
+        renewed = []
+        for task in tasks:
+            body = {
+                "scheduleTime": task.lease_id,
+                "leaseDuration": _duration(lease_seconds),
+                "responseView": "FULL",
+            }
+            request = self._tasks().renewLease(name=task.id, body=body)
+            response = self._execute_unless_lease_lost(request)
+            if response is not None:
+                renewed.append(self._leased_task(response))
+        return renewed
+
+    def ack(self, task: LeasedTask) -> bool:
+        body = {"scheduleTime": task.lease_id}
+        request = self._tasks().acknowledge(name=task.id, body=body)
+        return self._execute_unless_lease_lost(request) is not None
+
+    def nack(
+        self, task: LeasedTask, error: Optional[str] = None, delay: float = 0.0
+    ) -> bool:
+        body = {"scheduleTime": task.lease_id}
+        request = self._tasks().cancelLease(name=task.id, body=body)
+        return self._execute_unless_lease_lost(request) is not None
+
+    def _execute_unless_lease_lost(self, request: Any) -> Optional[dict]:
+        from googleapiclient.errors import HttpError  # deferred, slow to import
+
+        try:
+            return request.execute()
+        except HttpError as error:
+            # the task was leased again or deleted by someone else
+            if error.resp.status in (400, 404, 409):
+                logging.warning("Lost the lease on a task: %s", error)
+                return None
+            raise
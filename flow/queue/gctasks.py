@@ -1,51 +1,89 @@
 import logging
-from typing import cast, List, Any
+from typing import cast, List, Any, Callable, Optional, Sequence, Tuple
 from abc import ABC, abstractmethod
 import base64
 import datetime
 import json
-
-import googleapiclient.discovery
+from timeit import default_timer as timer
 
 from flow.queue.enqueuer import Enqueuer
+from flow.queue.batching import BatchSubmitter, default_http
 from flow.job_spec import JobSpec
-from flow.io_adapter import io
+from flow.metrics import Metrics
 
 class GCTasksEnqueuer(Enqueuer):
 
   def __init__(self, project: str = 'brain-deepviz',
                      location: str = 'us-central1',
                      queue: str = 'flow-jobs',
-                     service_url: str = '/handle_job') -> None:
+                     service_url: str = '/handle_job',
+                     client: Any = None,
+                     max_concurrent_batches: int = 4,
+                     new_http: Optional[Callable[[], Any]] = default_http) -> None:
     self.project = project
     self.location = location
     self.queue = queue
     self.service_url = service_url
-    self.client = googleapiclient.discovery.build('cloudtasks', 'v2beta2', cache_discovery=False)
+    if client is None:
+      import googleapiclient.discovery  # deferred, slow to import
+      client = googleapiclient.discovery.build('cloudtasks', 'v2beta2', cache_discovery=False)
+    self.client = client
+    self.metrics = Metrics('gctasks_enqueuer')
+    # task names are job identities; Cloud Tasks rejects duplicates with 409
+    self.submitter = BatchSubmitter(client, self._create_request,
+                                    max_concurrent_batches=max_concurrent_batches,
+                                    item_size=lambda item: len(item[1]),
+                                    ignored_statuses=[409],
+                                    new_http=new_http, metrics=self.metrics)
 
   @property
   def queue_name(self) -> str:
     return 'projects/{}/locations/{}/queues/{}'.format(self.project, self.location, self.queue)
 
-  def _create_task(self, payload: str) -> Any:
+  def task_name(self, identity: str) -> str:
+    return '{}/tasks/{}'.format(self.queue_name, identity)
+
+  def _create_request(self, item: Tuple[str, str]) -> Any:
+    identity, payload = item
     base64_encoded_payload = base64.b64encode(payload.encode())
     converted_payload = base64_encoded_payload.decode()
-    body = {'task': {'appEngineHttpRequest': {
+    body = {'task': {'name': self.task_name(identity),
+            'appEngineHttpRequest': {
                 'httpMethod': 'POST',
                 'relativeUrl': self.service_url,
                 'payload': converted_payload
             }}}
-    response = self.client.projects().locations().queues().tasks().create(
-        parent=self.queue_name, body=body).execute()
-    return response
+    return self.client.projects().locations().queues().tasks().create(
+        parent=self.queue_name, body=body)
+
+  def _delete_request(self, identity: str) -> Any:
+    return self.client.projects().locations().queues().tasks().delete(
+        name=self.task_name(identity))
+
+  def cancel(self, identities: Sequence[str]) -> int:
+    """Deletes tasks by identity; returns how many are gone now."""
+    # 404: already dispatched or cancelled before
+    deleter = BatchSubmitter(self.client, self._delete_request,
+                             ignored_statuses=[404],
+                             new_http=self.submitter.new_http,
+                             metrics=Metrics('gctasks_cancel'))
+    failures = deleter.submit(identities)
+    for failure in failures:
+      logging.error('Failed to delete task %s: %s', failure.item, failure.error)
+    return len(identities) - len(failures)
 
   def add(self, job_specs: List[JobSpec]) -> None:
-    paths = [job_spec.output for job_spec in job_specs]
-    exist = io.exist(paths)
-    for job_spec, exists in zip(job_specs, exist):
-      if exists:
-        logging.info("Skipping enqueueing %s because its output file already exists!", job_spec)
-      else:
-        json_payload = job_spec.to_json()
-        response = self._create_task(json_payload)
-        logging.info('Created task %s', response['name'])
+    job_specs = self.filter_new(self.filter_stale(job_specs))
+    payloads = [(job_spec.identity, job_spec.to_json()) for job_spec in job_specs]
+    start = timer()
+    failures = self.submitter.submit(payloads)
+    duration = timer() - start
+    created = len(payloads) - len(failures)
+    logging.info('Created %d tasks in %.2fs (%.1f tasks/s)', created, duration, created / max(duration, 1e-9))
+    self.metrics.log()
+    for failure in failures:
+      identity, payload = failure.item
+      self.in_flight.discard(identity)
+      logging.error('Failed to create task for %s: %s', payload, failure.error)
+    if failures:
+      raise IOError(f'Failed to create {len(failures)} of {len(payloads)} tasks.')
@@ -1,35 +1,100 @@
 import logging
-from typing import cast, List, Any
+from typing import cast, List, Any, Iterable, Iterator, Optional, Tuple
 from abc import ABC, abstractmethod
 from os import path, makedirs
+from timeit import default_timer as timer
 
 from flow.queue.enqueuer import Enqueuer
 from flow.job_spec import JobSpec
 from flow.io_adapter import io
+from flow.metrics import Metrics
+from flow.process_pool import IsolatedProcessPool, Completion
 
 from absl import flags
 FLAGS = flags.FLAGS
 flags.DEFINE_string('local_queue_export_path', None, 'If supplied, save JobSpecs to this folder rather than executing them immediately.')
-flags.DEFINE_boolean('local_queue_skip_exists_check', False, 'Whether to skip looking for already existing job outputs before deciding whether to run or export the jobspec.')
+flags.DEFINE_boolean('local_queue_skip_exists_check', False, 'Whether to run or export every jobspec instead of only those whose output is missing or older than its task source and inputs.')
+flags.DEFINE_integer('local_queue_workers', 0, 'Number of worker processes that execute jobs in parallel. 0 executes them one at a time in the calling process.')
+flags.DEFINE_float('local_queue_job_timeout', None, 'Seconds after which a job running in a worker process is killed and reported as failed.')
+
+
+def _execute_serialized(serialized: str) -> float:
+  """Executes a job in a worker process; returns its execution duration."""
+  job_spec = JobSpec.from_json(serialized)
+  job_spec.execute()
+  return job_spec.execution_duration
+
 
 class LocalEnqueuer(Enqueuer):
 
+  def __init__(self, num_workers: Optional[int] = None, job_timeout: Optional[float] = None) -> None:
+    self._num_workers = num_workers
+    self._job_timeout = job_timeout
+
+  @property
+  def num_workers(self) -> int:
+    if self._num_workers is None:
+      return FLAGS.local_queue_workers
+    return self._num_workers
+
+  @property
+  def job_timeout(self) -> Optional[float]:
+    if self._job_timeout is None:
+      return FLAGS.local_queue_job_timeout
+    return self._job_timeout
+
   def add(self, job_specs: List[JobSpec]) -> None:
     if FLAGS.local_queue_export_path:
       makedirs(FLAGS.local_queue_export_path, exist_ok=True)
-
-    for i, job_spec in enumerate(job_specs):
-      if not FLAGS.local_queue_skip_exists_check and io.exists(job_spec.output):
-        # TODO: we may need to do more than check for a single file
-        # TODO: we may want to check for timestamps here?
-        # TODO: we may want to support deleting files in events as a mechanism to triogger re-running? or not?
-        logging.info("Skipping enqueueing %s because its output file already exists!", job_spec)
-        continue
-      else:
+      for i, job_spec in self._jobs_to_run(job_specs):
         serialized = job_spec.to_json(pretty=True)
-        if FLAGS.local_queue_export_path:
-          with open(path.join(FLAGS.local_queue_export_path, "job_spec_{i:05}.json".format(i=i)), 'w') as handle:
-            handle.write(serialized)
-        else:
-          deserialized = JobSpec.from_json(serialized)
-          deserialized.execute()
+        with open(path.join(FLAGS.local_queue_export_path, "job_spec_{i:05}.json".format(i=i)), 'w') as handle:
+          handle.write(serialized)
+    else:
+      for _ in self.execute(job_specs):
+        pass
+
+  def execute(self, job_specs: Iterable[JobSpec]) -> Iterator[Completion]:
+    """Executes jobs, yielding a Completion per job as soon as it finishes.
+
+    Failing or timed out jobs are logged and reported, but do not stop the
+    remaining jobs.
+    """
+    metrics = Metrics("local_queue")
+    serialized = (job_spec.to_json(pretty=True) for _, job_spec in self._jobs_to_run(job_specs))
+    if self.num_workers > 0:
+      completions = self._execute_in_pool(serialized)
+    else:
+      completions = self._execute_in_process(serialized)
+    for completion in completions:
+      metrics.increment('completed' if completion.ok else 'failed')
+      metrics.observe('job', completion.duration)
+      if not completion.ok:
+        logging.error("Job failed: %s\n%s", completion.error, completion.item)
+      yield completion
+    finished = metrics.counters['completed'] + metrics.counters['failed']
+    logging.info("Executed %d jobs at %.2f jobs/s.", finished, finished / max(metrics.elapsed, 1e-9))
+    metrics.log()
+
+  def _jobs_to_run(self, job_specs: Iterable[JobSpec]) -> Iterator[Tuple[int, JobSpec]]:
+    if not FLAGS.local_queue_skip_exists_check:
+      job_specs = self.filter_stale(job_specs)
+    yield from enumerate(job_specs)
+
+  def _execute_in_pool(self, serialized: Iterable[str]) -> Iterator[Completion]:
+    with IsolatedProcessPool(self.num_workers, timeout=self.job_timeout) as pool:
+      yield from pool.imap_unordered(_execute_serialized, serialized)
+
+  def _execute_in_process(self, serialized: Iterable[str]) -> Iterator[Completion]:
+    # let the next job start while earlier results are still uploading
+    io.enable_write_behind()
+    try:
+      for job in serialized:
+        start = timer()
+        try:
+          duration = _execute_serialized(job)
+          yield Completion(job, duration, duration=duration)
+        except Exception as error:
+          yield Completion(job, error=f"{type(error).__name__}: {error}", duration=timer() - start)
+    finally:
+      io.disable_write_behind()
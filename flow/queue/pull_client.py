@@ -0,0 +1,43 @@
+"""Client interface of pull queues, which workers lease tasks from.
+
+`flow.pull_worker.PullWorker` only talks to this interface, so it runs against
+Cloud Tasks (`GCPullQueueClient`) and the local `SQLiteQueue` alike.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, List, NamedTuple, Optional, Sequence
+
+
+class LeasedTask(NamedTuple):
+    id: Any
+    payload: str
+    attempts: int
+    # identifies this lease; changes when the task is leased again
+    lease_id: str
+    lease_expires: float
+
+
+class PullQueueClient(ABC):
+    @abstractmethod
+    def lease(self, max_tasks: int, lease_seconds: float) -> List[LeasedTask]:
+        """Leases up to `max_tasks` available tasks for `lease_seconds`."""
+        pass
+
+    @abstractmethod
+    def renew(
+        self, tasks: Sequence[LeasedTask], lease_seconds: float
+    ) -> List[LeasedTask]:
+        """Extends leases still held; returns the renewed tasks."""
+        pass
+
+    @abstractmethod
+    def ack(self, task: LeasedTask) -> bool:
+        """Deletes a finished task; False if the lease was lost meanwhile."""
+        pass
+
+    @abstractmethod
+    def nack(
+        self, task: LeasedTask, error: Optional[str] = None, delay: float = 0.0
+    ) -> bool:
+        """Returns a failed task to the queue; False if the lease was lost."""
+        pass
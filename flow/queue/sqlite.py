@@ -0,0 +1,310 @@
+"""A durable pull queue in a SQLite file, as a local stand-in for Cloud Tasks.
+
+Jobs are added like with any other Enqueuer. Workers, possibly in many
+processes, then `lease` batches of tasks for a limited time, `renew` leases of
+tasks that are still running, and `ack` or `nack` them when done. A task whose
+lease runs out becomes available again. A task that has failed `max_attempts`
+times moves to the `dead_letter` table instead of being leased again.
+
+Every lease gets a fresh lease id, so a worker whose lease has run out and been
+taken over by another worker can no longer ack, nack or renew the task.
+"""
+
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Iterable, List, NamedTuple, Optional, Sequence
+
+from flow.queue.enqueuer import Enqueuer
+from flow.queue.pull_client import LeasedTask, PullQueueClient
+from flow.job_spec import JobSpec
+from flow.util import batch
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_LEASE_SECONDS = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_id TEXT,
+    last_error TEXT,
+    created REAL NOT NULL,
+    identity TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_available_at ON tasks (available_at, id);
+CREATE TABLE IF NOT EXISTS dead_letter (
+    id INTEGER PRIMARY KEY,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    created REAL NOT NULL,
+    died REAL NOT NULL
+);
+"""
+
+
+class DeadTask(NamedTuple):
+    id: int
+    payload: str
+    attempts: int
+    last_error: Optional[str]
+
+
+class SQLiteQueue(Enqueuer, PullQueueClient):
+    """Pull queue backed by the SQLite database at `path`."""
+
+    def __init__(
+        self,
+        path: str = "flow-queue.sqlite",
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        skip_existing: bool = True,
+        timeout: float = 30.0,
+    ) -> None:
+        self.path = path
+        self.max_attempts = max_attempts
+        self.skip_existing = skip_existing
+        self.timeout = timeout
+        self._local = threading.local()
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def __getstate__(self) -> dict:
+        # connections are per process and thread; workers reconnect lazily
+        state = dict(self.__dict__)
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            # readers don't block the writer and vice versa
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _migrate(self) -> None:
+        table_info = self.connection.execute("PRAGMA table_info(tasks)")
+        columns = [row[1] for row in table_info]
+        if "identity" not in columns:
+            self.connection.execute("ALTER TABLE tasks ADD COLUMN identity TEXT")
+        # a job is queued at most once until it's acked or dead; NULLs are distinct
+        self.connection.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS tasks_identity ON tasks (identity)"
+        )
+
+    def _transaction(self) -> "_Transaction":
+        return _Transaction(self.connection)
+
+    def add(self, job_specs: List[JobSpec]) -> None:
+        if self.skip_existing:
+            job_specs = self.filter_stale(job_specs)
+        payloads, identities = [], []
+        for job_spec in self.filter_new(job_specs):
+            payloads.append(job_spec.to_json())
+            identities.append(job_spec.identity)
+        inserted = self.insert(payloads, identities=identities)
+        logging.info(
+            "Added %d tasks to `%s`, skipped %d already queued.",
+            inserted,
+            self.path,
+            len(payloads) - inserted,
+        )
+
+    def insert(
+        self,
+        payloads: Iterable[str],
+        delay: float = 0.0,
+        identities: Optional[Iterable[Optional[str]]] = None,
+    ) -> int:
+        """Adds tasks in a single transaction; returns how many were added.
+
+    A task whose identity is already queued or leased is skipped.
+    """
+        now = time.time()
+        if identities is None:
+            identities = itertools.repeat(None)
+        rows = [
+            (payload, now + delay, now, identity)
+            for payload, identity in zip(payloads, identities)
+        ]
+        with self._transaction() as connection:
+            changes = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO tasks "
+                "(payload, available_at, created, identity) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            return connection.total_changes - changes
+
+    def cancel(self, identities: Sequence[str]) -> int:
+        """Deletes queued tasks by identity, unless they are leased right now."""
+        now = time.time()
+        cancelled = 0
+        with self._transaction() as connection:
+            for chunk in batch(identities, 500):
+                marks = ",".join("?" * len(chunk))
+                cursor = connection.execute(
+                    f"DELETE FROM tasks WHERE identity IN ({marks}) "
+                    "AND (lease_id IS NULL OR available_at <= ?)",
+                    list(chunk) + [now],
+                )
+                cancelled += cursor.rowcount
+        logging.info("Cancelled %d tasks in `%s`.", cancelled, self.path)
+        return cancelled
+
+    def lease(
+        self, max_tasks: int, lease_seconds: float = DEFAULT_LEASE_SECONDS
+    ) -> List[LeasedTask]:
+        """Leases up to `max_tasks` available tasks for `lease_seconds`."""
+        now = time.time()
+        expires = now + lease_seconds
+        with self._transaction() as connection:
+            self._bury_exhausted(connection, now)
+            rows = connection.execute(
+                "SELECT id, payload, attempts FROM tasks WHERE available_at <= ? "
+                "ORDER BY available_at, id LIMIT ?",
+                (now, max_tasks),
+            ).fetchall()
+            leased = []
+            for task_id, payload, attempts in rows:
+                lease_id = uuid.uuid4().hex
+                connection.execute(
+                    "UPDATE tasks SET lease_id = ?, available_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (lease_id, expires, task_id),
+                )
+                leased.append(
+                    LeasedTask(task_id, payload, attempts + 1, lease_id, expires)
+                )
+        return leased
+
+    def renew(
+        self, tasks: Sequence[LeasedTask], lease_seconds: float = DEFAULT_LEASE_SECONDS
+    ) -> List[LeasedTask]:
+        """Extends leases still held; returns the renewed tasks."""
+        expires = time.time() + lease_seconds
+        renewed = []
+        with self._transaction() as connection:
+            for task in tasks:
+                cursor = connection.execute(
+                    "UPDATE tasks SET available_at = ? WHERE id = ? AND lease_id = ?",
+                    (expires, task.id, task.lease_id),
+                )
+                if cursor.rowcount:
+                    renewed.append(task._replace(lease_expires=expires))
+        return renewed
+
+    def ack(self, task: LeasedTask) -> bool:
+        """Deletes a finished task; False if the lease was lost meanwhile."""
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "DELETE FROM tasks WHERE id = ? AND lease_id = ?",
+                (task.id, task.lease_id),
+            )
+        return cursor.rowcount > 0
+
+    def nack(
+        self, task: LeasedTask, error: Optional[str] = None, delay: float = 0.0
+    ) -> bool:
+        """Returns a failed task to the queue after `delay` seconds.
+
+    Tasks that have used up `max_attempts` move to the dead letter table.
+    False if the lease was lost meanwhile.
+    """
+        with self._transaction() as connection:
+            if task.attempts >= self.max_attempts:
+                return self._bury(connection, task.id, task.lease_id, error)
+            cursor = connection.execute(
+                "UPDATE tasks SET lease_id = NULL, available_at = ?, last_error = ? "
+                "WHERE id = ? AND lease_id = ?",
+                (time.time() + delay, error, task.id, task.lease_id),
+            )
+        return cursor.rowcount > 0
+
+    def dead_letters(self) -> List[DeadTask]:
+        rows = self.connection.execute(
+            "SELECT id, payload, attempts, last_error FROM dead_letter ORDER BY id"
+        ).fetchall()
+        return [DeadTask(*row) for row in rows]
+
+    def counts(self) -> dict:
+        """Returns the number of available, leased and dead tasks."""
+        now = time.time()
+        connection = self.connection
+        available, leased = connection.execute(
+            "SELECT COALESCE(SUM(available_at <= ?), 0), "
+            "COALESCE(SUM(available_at > ? AND lease_id IS NOT NULL), 0) FROM tasks",
+            (now, now),
+        ).fetchone()
+        (dead,) = connection.execute("SELECT COUNT(*) FROM dead_letter").fetchone()
+        return dict(available=available, leased=leased, dead=dead)
+
+    def _bury_exhausted(self, connection: sqlite3.Connection, now: float) -> None:
+        # tasks whose last allowed lease ran out without an ack or nack
+        rows = connection.execute(
+            "SELECT id, lease_id FROM tasks WHERE available_at <= ? "
+            "AND lease_id IS NOT NULL AND attempts >= ?",
+            (now, self.max_attempts),
+        ).fetchall()
+        for task_id, lease_id in rows:
+            self._bury(connection, task_id, lease_id, "Lease expired.")
+
+    def _bury(
+        self,
+        connection: sqlite3.Connection,
+        task_id: int,
+        lease_id: str,
+        error: Optional[str],
+    ) -> bool:
+        cursor = connection.execute(
+            "INSERT INTO dead_letter "
+            "(id, payload, attempts, last_error, created, died) "
+            "SELECT id, payload, attempts, ?, created, ? FROM tasks "
+            "WHERE id = ? AND lease_id = ?",
+            (error, time.time(), task_id, lease_id),
+        )
+        if not cursor.rowcount:
+            return False
+        connection.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        logging.warning(
+            "Task %d failed too often, moved to dead letters: %s", task_id, error
+        )
+        return True
+
+
+class _Transaction(object):
+    """Write transaction that takes the database lock up front.
+
+  BEGIN IMMEDIATE makes concurrent leasers queue up on SQLite's busy timeout
+  instead of failing with a deadlock when upgrading a read lock.
+  """
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        if exc_type is None:
+            self.connection.execute("COMMIT")
+        else:
+            self.connection.execute("ROLLBACK")
@@ -0,0 +1,116 @@
+"""A seekable, read-only file object that fetches byte ranges on demand.
+
+Returned by `IOAdapter.open_ranged`. Only the blocks that are actually read
+get fetched from the backend; recently used blocks are kept in a small LRU
+cache, and sequential reads prefetch the following blocks in the background.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from io import RawIOBase, SEEK_SET, SEEK_CUR, SEEK_END
+from typing import Callable, Optional
+
+from flow.util import io_executor
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+DEFAULT_READ_AHEAD = 2
+DEFAULT_MAX_CACHED_BLOCKS = 16
+
+
+class RangedReader(RawIOBase):
+    """File object over `size` bytes, read via `fetch(offset, length)`."""
+
+    def __init__(
+        self,
+        fetch: Callable[[int, int], bytes],
+        size: int,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        read_ahead: int = DEFAULT_READ_AHEAD,
+        max_cached_blocks: int = DEFAULT_MAX_CACHED_BLOCKS,
+    ) -> None:
+        super().__init__()
+        if block_size <= 0:
+            raise ValueError("block_size must be positive.")
+        self.fetch = fetch
+        self.size = size
+        self.block_size = block_size
+        self.read_ahead = read_ahead
+        self.max_cached_blocks = max(max_cached_blocks, read_ahead + 1)
+        self.fetches = 0
+        self._position = 0
+        self._last_block: Optional[int] = None
+        self._blocks: "OrderedDict[int, Future]" = OrderedDict()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = SEEK_SET) -> int:
+        if whence == SEEK_SET:
+            position = offset
+        elif whence == SEEK_CUR:
+            position = self._position + offset
+        elif whence == SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence}).")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}.")
+        self._position = position
+        return position
+
+    def readinto(self, buffer: bytearray) -> int:
+        view = memoryview(buffer).cast("B")
+        remaining = min(len(view), self.size - self._position)
+        written = 0
+        while remaining > 0:
+            index, block_offset = divmod(self._position, self.block_size)
+            block = self._block(index)
+            chunk = block[block_offset : block_offset + remaining]
+            view[written : written + len(chunk)] = chunk
+            written += len(chunk)
+            remaining -= len(chunk)
+            self._position += len(chunk)
+        return written
+
+    def _block(self, index: int) -> bytes:
+        sequential = self._last_block is not None and index == self._last_block + 1
+        self._last_block = index
+        future = self._schedule(index)
+        if sequential:
+            for ahead in range(index + 1, index + 1 + self.read_ahead):
+                self._schedule(ahead)
+        block = future.result()
+        expected = min(self.block_size, self.size - index * self.block_size)
+        if len(block) < expected:
+            # e.g. the object was replaced by a shorter one since it was stat'ed
+            raise IOError(
+                f"Fetched {len(block)} bytes of block {index}, expected {expected}."
+            )
+        return block
+
+    def _schedule(self, index: int) -> Future:
+        if index in self._blocks:
+            self._blocks.move_to_end(index)
+            return self._blocks[index]
+        offset = index * self.block_size
+        length = min(self.block_size, self.size - offset)
+        if length <= 0:
+            future: Future = Future()
+            future.set_result(b"")
+        else:
+            future = io_executor().submit(self.fetch, offset, length)
+            self.fetches += 1
+        self._blocks[index] = future
+        while len(self._blocks) > self.max_cached_blocks:
+            self._blocks.popitem(last=False)
+        return future
+
+    def close(self) -> None:
+        self._blocks.clear()
+        super().close()
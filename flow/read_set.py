@@ -0,0 +1,48 @@
+"""Tracks which files a job or a task's lambda reads while it runs.
+
+`IOAdapter.reading` and `IOAdapter.download`, and so `flow.task_io.load`, call
+`record_read` for every file they read. Outside of `tracking_reads` that is a
+single thread-local lookup, so untracked reads don't get slower. Inside, reads
+are collected as a read set mapping each path to the generation that was read,
+if the adapter knew it without an extra request, or None.
+
+Read sets nest: a read is recorded in every read set open on the thread.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Mapping, Optional
+
+ReadSet = Dict[str, Optional[int]]
+
+_local = threading.local()
+
+
+@contextmanager
+def tracking_reads() -> Iterator[ReadSet]:
+    """Collects the reads of this thread within the block into a read set."""
+    read_set: ReadSet = {}
+    stack: Optional[List[ReadSet]] = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(read_set)
+    try:
+        yield read_set
+    finally:
+        stack.pop()
+
+
+def record_read(path: str, generation: Optional[int] = None) -> None:
+    """Adds `path` to all open read sets; a known generation is kept."""
+    stack = getattr(_local, "stack", None)
+    if not stack:
+        return
+    for read_set in stack:
+        if generation is not None or read_set.get(path) is None:
+            read_set[path] = generation
+
+
+def record_reads(reads: Mapping[str, Optional[int]]) -> None:
+    """Adds a read set collected elsewhere, e.g. in a worker process."""
+    for path, generation in reads.items():
+        record_read(path, generation)
@@ -0,0 +1,129 @@
+"""Finds the jobs whose outputs are out of date, like make does.
+
+A job is stale if its output is missing, or older than its task's source or
+any of the input files its bindings resolve to. Planning stats all of those
+for a batch of jobs at once: inputs from the IO adapter's file list where it
+knows a path's stat already, e.g. from a bucket listing, and outputs and the
+rest with one concurrent `stat_many`. File events refresh the listing's stats
+of the files they are about.
+
+With a provenance store, a job is also stale if a file it read at runtime
+changed, i.e. no longer has the generation recorded in its read set. Those
+files are not visible in the job's bindings, see `flow.read_set`.
+
+Planned jobs remember when their inputs last changed in
+`JobSpec.inputs_updated`, so a job re-planned after an input changed gets a
+new identity, and workers can tell an outdated output from a current one.
+"""
+
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from flow.file_list import FileStat
+from flow.io_adapter import io
+from flow.job_spec import JobSpec
+from flow.metrics import Metrics
+from flow.path import AbsolutePath
+from flow.provenance import ProvenanceStore, provenance_store
+from flow.read_set import ReadSet
+from flow.util import batch
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def dependency_paths(job_spec: JobSpec) -> List[str]:
+    """Returns the task source and all input paths of a job."""
+    return [job_spec.task_path] + job_spec.input_paths()
+
+
+def _changed(read_set: ReadSet, stats: Dict[str, Optional[FileStat]]) -> bool:
+    """Whether a file in `read_set` is gone or at another generation now."""
+    for path, generation in read_set.items():
+        stat = stats.get(path)
+        if stat is None or stat.generation != generation:
+            return True
+    return False
+
+
+class StalenessPlanner(object):
+    """Filters jobs down to the stale ones, `batch_size` jobs at a time.
+
+  provenance: where to look up read sets; defaults to the configured store.
+  """
+
+    def __init__(
+        self,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        provenance: Optional[ProvenanceStore] = None,
+    ) -> None:
+        self.batch_size = batch_size
+        if provenance is None:
+            provenance = provenance_store()
+        self.provenance = provenance
+        self.metrics = Metrics("staleness")
+
+    def stale(self, job_specs: Iterable[JobSpec]) -> Iterator[JobSpec]:
+        """Yields the jobs that need to run, setting their `inputs_updated`."""
+        for job_batch in batch(job_specs, self.batch_size):
+            with self.metrics.timer("plan"):
+                outputs = [job_spec.output for job_spec in job_batch]
+                read_sets = self.read_sets(outputs)
+                dependencies = [
+                    dependency_paths(job_spec) + list(read_sets.get(output, {}))
+                    for job_spec, output in zip(job_batch, outputs)
+                ]
+                stats = self.stats(set(outputs).union(*dependencies), outputs)
+            for job_spec, job_dependencies in zip(job_batch, dependencies):
+                updated = [
+                    stats[path].updated
+                    for path in job_dependencies
+                    if stats.get(path) and stats[path].updated is not None
+                ]
+                # a later time set by the caller, e.g. of a deletion, is kept
+                if job_spec.inputs_updated is not None:
+                    updated.append(job_spec.inputs_updated)
+                job_spec.inputs_updated = max(updated, default=None)
+                output_stat = stats.get(job_spec.output)
+                if output_stat is None:
+                    self.metrics.increment("missing")
+                elif not job_spec.output_is_current(output_stat):
+                    self.metrics.increment("stale")
+                elif _changed(read_sets.get(job_spec.output, {}), stats):
+                    self.metrics.increment("reads_changed")
+                else:
+                    self.metrics.increment("current")
+                    logging.info("Skipping %s, its output is up to date.", job_spec)
+                    continue
+                yield job_spec
+
+    def read_sets(self, outputs: List[str]) -> Dict[str, ReadSet]:
+        if self.provenance is None:
+            return {}
+        return self.provenance.reads(outputs)
+
+    def stats(
+        self, paths: Iterable[str], requested: Iterable[str] = ()
+    ) -> Dict[str, Optional[FileStat]]:
+        """Stats `paths`, by the given paths; None for missing ones.
+
+    `requested` paths are always stat'ed in storage, e.g. outputs, which
+    workers rewrite behind the listing's back. Paths that fail to stat are
+    left out.
+    """
+        requested = set(requested)
+        stats: Dict[str, Optional[FileStat]] = {}
+        unknown = []
+        for path in paths:
+            stat = None
+            if path not in requested:
+                stat = io.file_list.stat(AbsolutePath(io.normpath(path)))
+            if stat is None:
+                unknown.append(path)
+            else:
+                stats[path] = stat
+        self.metrics.increment("listed", len(stats))
+        self.metrics.increment("requested", len(unknown))
+        for path, result in zip(unknown, io.stat_many(unknown)):
+            if result.ok:
+                stats[path] = result.value
+        return stats
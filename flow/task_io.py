@@ -1,10 +1,9 @@
-from typing import Sequence
+from typing import Any, Sequence
 import logging
 
 from flow.io_adapter import io
 from flow.path_template import PathTemplate
 from flow.path import AbsolutePath
-from lucid.misc.io import load as lucid_io_load
 
 
 from absl import flags
@@ -14,9 +13,25 @@ FLAGS = flags.FLAGS
 
 def load(path: str, transform: str = "None") -> Sequence:
     assert path.startswith("/")
+    if path.endswith(".npy") and transform == "None":
+        return load_mapped_array(path)
     # path = PathTemplate.path_template_prefix + raw_path # TODO: rethink
+    from lucid.misc.io import load as lucid_io_load  # deferred, imports TensorFlow
+
     with io.reading(AbsolutePath(path)) as handle:
         result = lucid_io_load(handle)
     if transform == "lines":
         result = result.split("\n")
     return result
+
+
+def load_mapped_array(path: str) -> Any:
+    """Loads a `.npy` file as a read-only, memory-mapped NumPy array.
+
+  The array's pages are read lazily from the local copy of the file, so large
+  activations or weights are never copied into Python memory as a whole.
+  """
+    import numpy as np
+
+    local_path = io.download(AbsolutePath(path))
+    return np.load(local_path, mmap_mode="r")
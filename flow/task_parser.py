@@ -1,7 +1,12 @@
+import ast
 import uuid
 import logging
-from os.path import basename, exists
-from typing import Dict, Tuple, Any
+from hashlib import sha256
+from operator import itemgetter
+from os import replace
+from os.path import basename, exists, join
+from threading import Lock
+from typing import Dict, Tuple, Any, Optional
 
 # from collections import OrderedDict
 
@@ -11,8 +16,11 @@ from flow.io_adapter import io
 from flow.task_spec import TaskSpec, InputSpec, OutputSpec
 from flow.dynamic_import import import_module_from_local_source
 from flow.path import AbsolutePath, RelativePath
+from flow.util import cache_dir
 
 RESERVED_NAMES = ["main", "output", "load", "save", "read", "write", "show"]
+# bump to invalidate parse caches on disk when static parsing changes
+STATIC_PARSER_VERSION = 1
 
 
 class TaskParseError(Exception):
@@ -22,20 +30,28 @@ class TaskParseError(Exception):
 class TaskParser(object):
     """Given a file path, parses a task into a TaskSpec."""
 
-    def __init__(self, task_path: AbsolutePath) -> None:
+    def __init__(
+        self,
+        task_path: AbsolutePath,
+        source: Optional[Tuple[str, str]] = None,
+        members: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """`source` may pass in the result of `read_source(task_path)`, and
+    `members` the task's top-level names if they were parsed elsewhere."""
         if task_path is None:
             raise TaskParseError("task_path can not be None.")
         # TODO: think of better verification strategy?
 
         self.task_path = task_path
 
-        if not exists(task_path):
-            task_path = io.download(task_path)
-        task_module = import_module_from_local_source(task_path)
+        task_path, self.source_hash = source or self.read_source(task_path)
+        if members is None:
+            members = parsed_members(task_path, self.source_hash)
 
         try:
-            self.main_function = task_module.main  # type: ignore
-        except AttributeError:
+            # None if parsed statically; main is only called by JobSpec.execute
+            self.main_function = members["main"]
+        except KeyError:
             raise TaskParseError(
                 "Specified task ('{}') does not contain required method 'main'.".format(
                     task_path
@@ -43,16 +59,16 @@ class TaskParser(object):
             )
 
         try:
-            self.output_object = task_module.output  # type: ignore
-        except AttributeError:
+            self.output_object = members["output"]
+        except KeyError:
             raise TaskParseError(
                 "Specified task ('{}') does not contain required attribute 'output'.".format(
                     task_path
                 )
             )
 
-        members = inspect.getmembers(task_module)
-        inputs = list(filter(isinput, members))
+        # sorted by name, like inspect.getmembers
+        inputs = sorted(filter(isinput, members.items()), key=itemgetter(0))
         if not inputs:
             raise TaskParseError(
                 "Specified task ('{}') does not contain any inputs.".format(task_path)
@@ -62,11 +78,24 @@ class TaskParser(object):
 
         logging.debug("Successfully parsed task '{}'".format(task_path))
 
+    @staticmethod
+    def read_source(task_path: str) -> Tuple[str, str]:
+        """Returns a local copy of the task's source and the source's hash."""
+        if not exists(task_path):
+            task_path = io.download(task_path)
+        with open(task_path, "rb") as source_file:
+            source_hash = sha256(source_file.read()).hexdigest()
+        return task_path, source_hash
+
     def to_spec(self) -> TaskSpec:
         input_specs = [InputSpec.build(input) for input in self.input_objects]
         output_spec = OutputSpec.build(self.output_object)
         return TaskSpec(
-            input_specs, output_spec, self.task_path, basename(self.task_path)
+            input_specs,
+            output_spec,
+            self.task_path,
+            basename(self.task_path),
+            self.source_hash,
         )
 
 
@@ -75,3 +104,118 @@ def isinput(tuple: Tuple[str, object]) -> bool:
     is_builtin = name.startswith("__")
     is_reserved = name in RESERVED_NAMES
     return not (is_builtin or is_reserved)
+
+
+# Parsing
+
+
+class _NotStatic(Exception):
+    """The task needs to be executed to know its members."""
+
+
+_parse_cache: Dict[str, Dict[str, Any]] = {}
+_parse_cache_lock = Lock()
+
+
+def parsed_members(task_path: str, source_hash: str) -> Dict[str, Any]:
+    """Returns the top-level names a task module defines.
+
+  Tasks that only assign literals and define `main` are parsed from their
+  syntax tree without running them; their members are cached by source hash
+  in memory and on disk. Any other task, e.g. one declaring an input with a
+  lambda, is imported instead.
+  """
+    members = statically_parsed_members(task_path, source_hash)
+    if members is None:
+        task_module = import_module_from_local_source(task_path)
+        members = dict(inspect.getmembers(task_module))
+    return members
+
+
+def statically_parsed_members(
+    task_path: str, source_hash: str
+) -> Optional[Dict[str, Any]]:
+    """Like `parsed_members`, but None for tasks that would need importing."""
+    with _parse_cache_lock:
+        members = _parse_cache.get(source_hash)
+    if members is None:
+        members = _read_cached_members(source_hash)
+    if members is None:
+        with open(task_path, "rb") as source_file:
+            source = source_file.read()
+        try:
+            members = static_members(source)
+        except _NotStatic as reason:
+            logging.debug("Task '%s' can't be parsed statically: %s", task_path, reason)
+            return None
+        _write_cached_members(source_hash, members)
+    with _parse_cache_lock:
+        _parse_cache[source_hash] = members
+    return dict(members)
+
+
+def static_members(source: bytes) -> Dict[str, Any]:
+    """Evaluates a task's top-level literal assignments without running it.
+
+  Functions map to None. Raises _NotStatic for anything else that would only
+  be known by executing the module.
+  """
+    try:
+        module = ast.parse(source)
+    except SyntaxError:
+        raise _NotStatic("syntax error")  # importing reports it properly
+    members: Dict[str, Any] = {}
+    for node in module.body:
+        if isinstance(node, ast.Expr) and _is_string(node.value):
+            continue  # docstring
+        elif isinstance(node, ast.FunctionDef) and node.name == "main":
+            members[node.name] = None
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                name = (alias.asname or alias.name).split(".")[0]
+                if isinput((name, None)):
+                    raise _NotStatic(f"imports '{name}'")
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value:
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if not all(isinstance(target, ast.Name) for target in targets):
+                raise _NotStatic(f"assigns to an expression on line {node.lineno}")
+            try:
+                value = ast.literal_eval(node.value)
+            except (ValueError, TypeError):
+                raise _NotStatic(f"assigns a non-literal on line {node.lineno}")
+            for target in targets:
+                members[target.id] = value
+        else:
+            raise _NotStatic(f"runs code on line {node.lineno}")
+    return members
+
+
+def _is_string(node: ast.AST) -> bool:
+    try:
+        return isinstance(ast.literal_eval(node), str)
+    except (ValueError, TypeError):
+        return False
+
+
+def _cache_path(source_hash: str) -> str:
+    return join(cache_dir("task_parser"), f"{source_hash}.v{STATIC_PARSER_VERSION}")
+
+
+def _read_cached_members(source_hash: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_cache_path(source_hash), "r") as cache_file:
+            return ast.literal_eval(cache_file.read())
+    except (OSError, ValueError, SyntaxError):
+        return None
+
+
+def _write_cached_members(source_hash: str, members: Dict[str, Any]) -> None:
+    try:
+        path = _cache_path(source_hash)
+        temporary_path = f"{path}.{uuid.uuid4().hex}"
+        with open(temporary_path, "w") as cache_file:
+            # literals round-trip through repr, unlike e.g. tuples through JSON
+            cache_file.write(repr(members))
+        replace(temporary_path, path)
+    except OSError as error:
+        logging.debug("Could not cache parsed task: %s", error)
@@ -0,0 +1,159 @@
+"""Parsed TaskSpecs, kept up to date one task at a time.
+
+Parsing a task downloads and imports its source, so the registry keeps every
+parsed spec together with its source hash and only parses a task again once
+its source changed. A routing index maps the directories that tasks read
+inputs from to those tasks, so finding the tasks a new file is relevant to
+only looks at the file's ancestor directories instead of at every task.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from typing import Callable, DefaultDict, Dict, List, Optional, Set, Tuple
+
+from flow.io_adapter import io
+from flow.metrics import Metrics
+from flow.task_parser import TaskParser, TaskParseError
+from flow.task_spec import TaskSpec
+
+
+def _ancestors(src_path: str) -> List[str]:
+    """Returns "/", "/a/", "/a/b/" for "/a/b/c.txt"."""
+    ancestors = []
+    index = src_path.find("/")
+    while index != -1:
+        ancestors.append(src_path[: index + 1])
+        index = src_path.find("/", index + 1)
+    return ancestors
+
+
+def _parse(task_path: str, source: Tuple[str, str]) -> TaskSpec:
+    return TaskParser(task_path, source).to_spec()
+
+
+class TaskRegistry(object):
+    """TaskSpecs by task path, parsed once per version of their source.
+
+  on_change: called with each newly parsed TaskSpec, e.g. to write manifests
+  parse: parses a task, given its path and `TaskParser.read_source` result;
+      e.g. `TaskSandbox.parse`. Defaults to parsing with `TaskParser`.
+  """
+
+    def __init__(
+        self,
+        on_change: Optional[Callable[[TaskSpec], None]] = None,
+        parse: Optional[Callable[[str, Tuple[str, str]], TaskSpec]] = None,
+    ) -> None:
+        self.on_change = on_change
+        self.parse = parse or _parse
+        self.metrics = Metrics("task_registry")
+        self._specs: Dict[str, TaskSpec] = {}
+        self._routes: DefaultDict[str, Set[str]] = defaultdict(set)
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._specs)
+
+    def __contains__(self, task_path: object) -> bool:
+        with self._lock:
+            return task_path in self._specs
+
+    def get(self, task_path: str) -> Optional[TaskSpec]:
+        with self._lock:
+            return self._specs.get(task_path)
+
+    @property
+    def task_specs(self) -> List[TaskSpec]:
+        """All tasks; finds and parses them on first use."""
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            return list(self._specs.values())
+
+    def load(self) -> None:
+        """Registers all tasks in storage; unchanged ones are not parsed again.
+
+    Tasks that fail to parse are logged and left out.
+    """
+        with self._lock:
+            paths = io.file_list.glob(TaskSpec.task_specification_glob)
+            for path in paths:
+                try:
+                    self.update(path)
+                except TaskParseError as error:
+                    logging.error("Parsing task at '%s' failed: %s", path, error)
+            for path in set(self._specs) - set(paths):
+                self.remove(path)
+            self._loaded = True
+            logging.info("Registry loaded task specs: %s", list(self._specs.values()))
+
+    def update(self, task_path: str) -> TaskSpec:
+        """Adds or replaces the task at `task_path` if its source changed.
+
+    Raises TaskParseError if it can't be parsed; the previous version of the
+    task, if any, stays registered then.
+    """
+        local_path, source_hash = TaskParser.read_source(task_path)
+        with self._lock:
+            task_spec = self._specs.get(task_path)
+            if task_spec is not None and task_spec.source_hash == source_hash:
+                self.metrics.increment("unchanged")
+                return task_spec
+        with self.metrics.timer("parse"):
+            task_spec = self.parse(task_path, (local_path, source_hash))
+        with self._lock:
+            replaced = self._specs.get(task_path)
+            if replaced is not None:
+                self._unroute(replaced)
+            self._specs[task_path] = task_spec
+            self._route(task_spec)
+        self.metrics.increment("replaced" if replaced else "added")
+        logging.info("%s task %s.", "Replaced" if replaced else "Added", task_spec.name)
+        if self.on_change:
+            self.on_change(task_spec)
+        return task_spec
+
+    def remove(self, task_path: str) -> Optional[TaskSpec]:
+        with self._lock:
+            task_spec = self._specs.pop(task_path, None)
+            if task_spec is None:
+                return None
+            self._unroute(task_spec)
+        self.metrics.increment("removed")
+        logging.info("Removed task %s.", task_spec.name)
+        return task_spec
+
+    def relevant(self, src_path: str) -> List[TaskSpec]:
+        """Returns the tasks that have an input matching `src_path`."""
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            candidates: Set[str] = set()
+            for directory in _ancestors(src_path):
+                candidates |= self._routes.get(directory, set())
+            specs = [self._specs[task_path] for task_path in sorted(candidates)]
+        return [spec for spec in specs if spec.should_handle_file(src_path)]
+
+    def readers(self, src_path: str) -> List[TaskSpec]:
+        """Returns the tasks whose lambdas read `src_path` while enumerating."""
+        with self._lock:
+            specs = list(self._specs.values())
+        return [spec for spec in specs if src_path in spec.reads]
+
+    def _directories(self, task_spec: TaskSpec) -> Set[str]:
+        directories = (input_spec.directory for input_spec in task_spec.input_specs)
+        return {directory for directory in directories if directory is not None}
+
+    def _route(self, task_spec: TaskSpec) -> None:
+        for directory in self._directories(task_spec):
+            self._routes[directory].add(task_spec.src_path)
+
+    def _unroute(self, task_spec: TaskSpec) -> None:
+        for directory in self._directories(task_spec):
+            routes = self._routes[directory]
+            routes.discard(task_spec.src_path)
+            if not routes:
+                del self._routes[directory]
@@ -0,0 +1,185 @@
+"""Parses tasks that need to be imported in worker processes.
+
+Importing a task runs its top-level code, which may import heavy libraries or
+load data. `TaskSandbox` does that in an `IsolatedProcessPool`, so a slow or
+memory hungry task is killed after a timeout or once it exceeds its memory
+limit, and whatever it imported stays out of the calling process. Only the
+task's members come back: literals as they are, functions (e.g. the lambdas
+of dependent inputs) as `SandboxedFunction`s that call them in the sandbox.
+
+Tasks that can be parsed statically are never imported in the first place.
+"""
+
+import logging
+from collections import OrderedDict
+from inspect import Parameter, Signature, getmembers
+from threading import Lock
+from types import ModuleType
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from flow.dynamic_import import import_module_from_local_source
+from flow.metrics import Metrics
+from flow.process_pool import IsolatedProcessPool
+from flow.read_set import record_reads, tracking_reads
+from flow.task_parser import TaskParser, TaskParseError, isinput
+from flow.task_parser import statically_parsed_members
+from flow.task_spec import TaskSpec
+
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_RSS_BYTES = 4 * 1024 ** 3
+MAX_CACHED_MODULES = 16
+
+
+class TaskFunction(NamedTuple):
+    """Stands in for a function a task defines; pickled back from workers."""
+
+    args: List[str]
+
+
+# Worker side
+
+_modules: "OrderedDict[str, ModuleType]" = OrderedDict()
+
+
+def _module(task_path: str, source_hash: str) -> ModuleType:
+    module = _modules.pop(source_hash, None)
+    if module is None:
+        module = import_module_from_local_source(task_path)
+    _modules[source_hash] = module
+    while len(_modules) > MAX_CACHED_MODULES:
+        _modules.popitem(last=False)
+    return module
+
+
+def _arguments(function: Any) -> List[str]:
+    kinds = (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD)
+    parameters = Signature.from_callable(function).parameters.values()
+    return [parameter.name for parameter in parameters if parameter.kind in kinds]
+
+
+def describe_task(item: Tuple[str, str]) -> Dict[str, Any]:
+    """Imports a task and returns its members, with functions as stand-ins."""
+    task_path, source_hash = item
+    members = {}
+    for name, value in getmembers(_module(task_path, source_hash)):
+        if not isinput((name, value)) and name not in ("main", "output"):
+            continue
+        members[name] = TaskFunction(_arguments(value)) if callable(value) else value
+    return members
+
+
+def call_task_function(item: Tuple[str, str, str, Tuple[Any, ...]]) -> Any:
+    """Calls a function a task defines, e.g. a dependent input's lambda.
+
+  Returns its values and its read set.
+  """
+    task_path, source_hash, name, args = item
+    function = getattr(_module(task_path, source_hash), name)
+    with tracking_reads() as reads:
+        values = function(*args)
+        if isinstance(values, Iterator):
+            values = list(values)  # generators can't be pickled
+    return values, reads
+
+
+# Calling side
+
+
+class SandboxedFunction(object):
+    """Calls one of a task's functions in the sandbox it was parsed in."""
+
+    def __init__(
+        self,
+        sandbox: "TaskSandbox",
+        task_path: str,
+        source_hash: str,
+        name: str,
+        args: List[str],
+    ) -> None:
+        self.sandbox = sandbox
+        self.task_path = task_path
+        self.source_hash = source_hash
+        self.name = name
+        # lets `inspect.signature` find the arguments, e.g. for DependentInputSpec
+        self.__signature__ = Signature(
+            [Parameter(arg, Parameter.POSITIONAL_OR_KEYWORD) for arg in args]
+        )
+
+    def __repr__(self) -> str:
+        return f"<SandboxedFunction {self.name}{self.__signature__}>"
+
+    def __call__(self, *args: Any) -> Any:
+        item = (self.task_path, self.source_hash, self.name, args)
+        values, reads = self.sandbox.run(call_task_function, item, "call")
+        # as if the function had read them in this process
+        record_reads(reads)
+        return values
+
+
+class TaskSandbox(object):
+    """Parses tasks in worker processes with a timeout and memory limit."""
+
+    def __init__(
+        self,
+        num_workers: int = 1,
+        timeout: Optional[float] = DEFAULT_TIMEOUT,
+        max_rss_bytes: Optional[int] = DEFAULT_MAX_RSS_BYTES,
+    ) -> None:
+        self.num_workers = num_workers
+        self.timeout = timeout
+        self.max_rss_bytes = max_rss_bytes
+        self.metrics = Metrics("task_sandbox")
+        self._pool: Optional[IsolatedProcessPool] = None
+        # the pool hands out results to whoever polls it
+        self._lock = Lock()
+
+    def __enter__(self) -> "TaskSandbox":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+        self.metrics.log()
+
+    def parse(
+        self, task_path: str, source: Optional[Tuple[str, str]] = None
+    ) -> TaskSpec:
+        """Parses a task like `TaskParser`, importing it only in the sandbox."""
+        local_path, source_hash = source or TaskParser.read_source(task_path)
+        members = statically_parsed_members(local_path, source_hash)
+        if members is None:
+            item = (local_path, source_hash)
+            try:
+                members = self.run(describe_task, item, "parse")
+            except RuntimeError as error:
+                raise TaskParseError(f"Parsing task ('{task_path}') failed: {error}")
+            for name, value in members.items():
+                if isinstance(value, TaskFunction):
+                    members[name] = SandboxedFunction(
+                        self, local_path, source_hash, name, value.args
+                    )
+        else:
+            self.metrics.increment("static")
+        parser = TaskParser(task_path, (local_path, source_hash), members)
+        return parser.to_spec()
+
+    def run(self, function: Any, item: Any, kind: str) -> Any:
+        """Runs `function(item)` in a worker; raises RuntimeError if it fails."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = IsolatedProcessPool(
+                    self.num_workers, self.timeout, self.max_rss_bytes
+                )
+            completion = self._pool.run(function, item)
+        self.metrics.observe(kind, completion.duration)
+        if not completion.ok:
+            self.metrics.increment(f"{kind}_failures")
+            logging.error("Sandboxed %s failed: %s", kind, completion.error)
+            raise RuntimeError(completion.error)
+        self.metrics.increment(f"{kind}s")
+        return completion.result
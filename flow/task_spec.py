@@ -2,7 +2,7 @@ import logging
 
 from datetime import timedelta
 from operator import itemgetter
-from inspect import getargspec
+from inspect import Parameter, signature
 from random import sample
 from collections import defaultdict
 from typing import (
@@ -15,6 +15,7 @@ from typing import (
     Optional,
     Union,
     Iterable,
+    Iterator,
     Callable,
     Set,
     cast,
@@ -27,7 +28,6 @@ import fnmatch
 from functools import reduce
 from toposort import toposort, toposort_flatten
 from json import dumps
-from numpy import mean, std
 from utilspie.collectionsutils import frozendict
 
 from flow.typing import Bindings, Variable, Value
@@ -36,6 +36,7 @@ from flow.job_spec import JobSpec
 from flow.util import format_timedelta, stringify_bindings
 from flow.path_template import PathTemplate, PathTemplateError
 from flow.path import AbsolutePath
+from flow.read_set import ReadSet, tracking_reads
 
 
 # Input & Output Spec
@@ -98,6 +99,15 @@ class InputSpec(Spec):
     def values(self, variable: Variable, bindings: Bindings) -> Set[Value]:
         pass
 
+    def bindings_for(self, src_path: str) -> Bindings:
+        """Returns the variables a matching file at `src_path` fixes."""
+        return {}
+
+    @property
+    def directory(self) -> Optional[str]:
+        """Deepest directory containing all files this input matches, if any."""
+        return None
+
 
 class IterableInputSpec(InputSpec):
     """An input specified by an iterable object such as a list."""
@@ -121,11 +131,7 @@ class IterableInputSpec(InputSpec):
     def values(self, variable: Variable, bindings: Bindings) -> Set[Value]:
         assert variable == self.name
         if self.name in bindings:
-            bound_value = bindings[self.name]
-            if bound_value in self.iterable:
-                return {bound_value}
-            else:
-                return set()
+            return _bound_values(bindings[self.name], self.iterable)
         else:
             return set(self.iterable)
 
@@ -153,6 +159,14 @@ class PathTemplateInputSpec(InputSpec):
     def matches(self, src_path: str) -> bool:
         return self.path_template.match(src_path) is not None
 
+    def bindings_for(self, src_path: str) -> Bindings:
+        match = self.path_template.match(src_path) or {}
+        return {Variable(variable): value for variable, value in match.items()}
+
+    @property
+    def directory(self) -> Optional[str]:
+        return _directory(self.path_template)
+
     def implicitly_declared_variables(self) -> Set[Variable]:
         return set(self.path_template.placeholders)
 
@@ -223,6 +237,20 @@ class AggregatingInputSpec(InputSpec):
     def matches(self, src_path: str) -> bool:
         return bool(self.path_template.match(src_path))
 
+    def bindings_for(self, src_path: str) -> Bindings:
+        # locally bound variables are aggregated over, so they stay unbound
+        match = self.path_template.match(src_path) or {}
+        declared = self.implicitly_declared_variables()
+        return {
+            Variable(variable): value
+            for variable, value in match.items()
+            if variable in declared
+        }
+
+    @property
+    def directory(self) -> Optional[str]:
+        return _directory(self.path_template)
+
     def depends_on(self) -> Set[Variable]:
         variables = set(self.path_template.placeholders)
         return variables - set(self.locally_bound_variables)
@@ -251,12 +279,22 @@ class AggregatingInputSpec(InputSpec):
 
 
 class DependentInputSpec(InputSpec):
-    """An input specification whose values depend on other values. Uses lambdas"""
+    """An input specification whose values depend on other values. Uses lambdas
+
+  `reads` is the read set of all calls of the function so far, e.g. of model
+  manifests it loads, see `flow.read_set`.
+  """
 
     def __init__(self, name: str, function: Callable) -> None:
         self.name = Variable(name)
         self.function = function
-        self.inputs = [Variable(arg) for arg in getargspec(function).args]
+        self.reads: ReadSet = {}
+        self.inputs = [
+            Variable(parameter.name)
+            for parameter in signature(function).parameters.values()
+            if parameter.kind
+            in (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD)
+        ]
         if name in self.inputs:
             raise InputSpecError(
                 "DependentInputSpec can not depend on variable {} which it is declaring itself.".format(
@@ -280,13 +318,11 @@ class DependentInputSpec(InputSpec):
         assert variable == self.name
         assert all(arg in bindings for arg in self.inputs)
         arguments = [bindings[arg] for arg in self.inputs]
-        values = self.function(*arguments)
+        with tracking_reads() as reads:
+            values = self.function(*arguments)
+        self.reads.update(reads)
         if self.name in bindings:
-            bound_value = bindings[self.name]
-            if bound_value in values:
-                return set([bound_value])
-            else:
-                return set()
+            return _bound_values(bindings[self.name], values)
         else:
             return values
 
@@ -344,12 +380,18 @@ class TaskSpec(object):
     variable_to_input_spec: Mapping[Variable, List[InputSpec]]
 
     def __init__(
-        self, inputs: List[InputSpec], output: OutputSpec, src_path: str, name: str
+        self,
+        inputs: List[InputSpec],
+        output: OutputSpec,
+        src_path: str,
+        name: str,
+        source_hash: Optional[str] = None,
     ) -> None:
         self.input_specs = inputs
         self.output_spec = output
         self.src_path = src_path
         self.name = name
+        self.source_hash = source_hash
         self._verify_placeholders()
         self.variable_to_input_spec = defaultdict(list)
         for input_spec in inputs:
@@ -383,6 +425,8 @@ class TaskSpec(object):
     def estimate_cost(num_jobs: int, example_runs: List[JobSpec]) -> None:
         """Print naive CPU time and cost estimates based on supplied sample runs."""
 
+        from numpy import mean, std
+
         print(
             "Estimates are 95% conf. intervals based on std of supplied runs. Only reasonable if colab instance has similar specs as requested AE instances!"
         )
@@ -409,6 +453,14 @@ class TaskSpec(object):
     def manifest_path(self) -> str:
         return self.src_path.replace(".py", ".json")
 
+    @property
+    def reads(self) -> ReadSet:
+        """Files the task's lambdas read while enumerating its jobs so far."""
+        reads: ReadSet = {}
+        for input_spec in self.input_specs:
+            reads.update(getattr(input_spec, "reads", {}))
+        return reads
+
     @property
     def input_names(self) -> List[str]:
         return [input_spec.name for input_spec in self.input_specs]
@@ -420,54 +472,97 @@ class TaskSpec(object):
     def to_job_spec(self, bindings: Bindings) -> "JobSpec":
         str_bindings = stringify_bindings(bindings)
         output_path = self.output_spec.with_replacements(str_bindings)
-        return JobSpec(bindings, output_path, self.src_path)
+        return JobSpec(bindings, output_path, self.src_path, self.source_hash)
 
     def to_job_specs(self, initial_bindings: Bindings = {}) -> Iterable[JobSpec]:
         return map(self.to_job_spec, self.all_bindings(initial_bindings))
 
     def all_bindings(self, initial_bindings: Bindings = {}) -> Sequence[Bindings]:
+        return self.sliced_bindings([initial_bindings])
+
+    def sliced_bindings(self, slices: Sequence[Bindings]) -> Sequence[Bindings]:
+        """Enumerates the bindings that extend any of `slices`.
+
+    All slices are resolved in one pass, so values looked up for one slice are
+    memoized for all others. Overlapping slices yield each binding only once.
+    """
+        return list(self.iter_bindings(slices))
+
+    def iter_bindings(self, slices: Sequence[Bindings] = ({},)) -> Iterator[Bindings]:
+        """Like `sliced_bindings`, but yields bindings as they are resolved.
+
+    Resolves depth-first, so only one partial binding per variable is held in
+    memory at a time, plus memoized values and, for several slices, the
+    bindings seen so far.
+    """
         # TODO: return empty list if self.dependencies is empty???
-        all_bindings = [initial_bindings]
         sorted_dependencies = toposort_flatten(self.dependencies)
         logging.debug("Sorted sorted_dependencies: %s", sorted_dependencies)
+        steps = []
         for variable_name in sorted_dependencies:
             variable = Variable(variable_name)
-            input_specs = self.variable_to_input_spec[variable]
-            for input_spec in input_specs:
+            for input_spec in self.variable_to_input_spec[variable]:
                 relevant_vars = input_spec.depends_on() | set([input_spec.name])
+                steps.append((variable, input_spec, relevant_vars))
+        memoized_values: List[Dict[FrozenSet[Tuple[str, str]], Set[Value]]] = [
+            {} for _ in steps
+        ]
+
+        def resolve(bindings: Bindings, step: int) -> Iterator[Bindings]:
+            if step == len(steps):
+                yield bindings
+                return
+            variable, input_spec, relevant_vars = steps[step]
+            relevant_bs = frozenset(
+                (var, str(value))
+                for var, value in bindings.items()
+                if var in relevant_vars
+            )
+            memoized = memoized_values[step]
+            if relevant_bs in memoized:
+                values = memoized[relevant_bs]
+            else:
                 logging.debug(
                     f"Resolving '{variable}' via {input_spec} on relevant vars {relevant_vars}."
                 )
-                new_bindings: List[Bindings] = []
-                memoized_values: Dict[FrozenSet[Tuple[str, str]], Set[Value]] = {}
-                for bindings in all_bindings:
-                    relevant_bs = frozenset(
-                        (var, str(value))
-                        for var, value in bindings.items()
-                        if var in relevant_vars
-                    )
-                    if relevant_bs in memoized_values:
-                        values = memoized_values[relevant_bs]
-                        logging.debug(
-                            "Found cached values %s for bindings %s",
-                            list(values),
-                            bindings,
-                        )
-                    else:
-                        values = input_spec.values(variable, bindings)
-                        memoized_values[relevant_bs] = values
-                        logging.debug(
-                            "Memoized values %s for bindings %s", list(values), bindings
-                        )
-                    for value in values:
-                        value_binding = {variable: value}
-                        value_binding.update(bindings)
-                        new_bindings.append(value_binding)
-                # logging.debug("New bindings: %s", new_bindings)
-                all_bindings = new_bindings
-            logging.debug("Done resolving: %s", variable)
-        # TODO: what if new_bindings empty because values empty?
-        return all_bindings
+                values = input_spec.values(variable, bindings)
+                memoized[relevant_bs] = values
+                logging.debug(
+                    "Memoized values %s for bindings %s", list(values), bindings
+                )
+            for value in values:
+                value_binding = {variable: value}
+                value_binding.update(bindings)
+                if isinstance(bindings.get(variable), str):
+                    # a value matched from a path gives way to the typed one
+                    value_binding[variable] = value
+                yield from resolve(value_binding, step + 1)
+
+        # TODO: what if values are empty?
+        unique = _unique_bindings(slices)
+        if len(unique) == 1:
+            yield from resolve(unique[0], 0)
+            return
+        seen: Set[FrozenSet[Tuple[str, str]]] = set()
+        for initial_bindings in unique:
+            for bindings in resolve(initial_bindings, 0):
+                key = _bindings_key(bindings)
+                if key not in seen:
+                    seen.add(key)
+                    yield bindings
+
+    def slices_for(self, src_path: str) -> List[Bindings]:
+        """Returns the bindings of jobs that may read a new file at `src_path`.
+
+    One slice per input of this task that matches the file, e.g. both an
+    aggregating and a per-file input over one directory; none if no input
+    matches.
+    """
+        return [
+            input_spec.bindings_for(src_path)
+            for input_spec in self.input_specs
+            if input_spec.matches(src_path)
+        ]
 
     def matching_input_spec(self, src_path: str) -> Optional[InputSpec]:
         for input_spec in self.input_specs:
@@ -501,3 +596,33 @@ class TaskSpec(object):
             self.preflight()
         remote_path = f"tasks/{self.name}"
         io.upload(self.src_path, remote_path)
+
+
+def _bound_values(bound_value: Value, values: Iterable[Value]) -> Set[Value]:
+    """Returns the values equal to `bound_value`, compared as strings.
+
+  Values matched from a path are strings, e.g. '1' for an input `range(512)`.
+  """
+    if bound_value in values:
+        return {bound_value}
+    return {value for value in values if str(value) == str(bound_value)}
+
+
+def _directory(path_template: PathTemplate) -> str:
+    prefix = path_template.literal_prefix
+    return prefix[: prefix.rfind("/") + 1]
+
+
+def _bindings_key(bindings: Bindings) -> FrozenSet[Tuple[str, str]]:
+    return frozenset((var, str(value)) for var, value in bindings.items())
+
+
+def _unique_bindings(all_bindings: Iterable[Bindings]) -> List[Bindings]:
+    unique: List[Bindings] = []
+    seen: Set[FrozenSet[Tuple[str, str]]] = set()
+    for bindings in all_bindings:
+        key = _bindings_key(bindings)
+        if key not in seen:
+            seen.add(key)
+            unique.append(bindings)
+    return unique
@@ -14,6 +14,48 @@ def batch(iterable: Iterable[Any], n: int = 1) -> Iterable[Any]:
         yield current_batch
 
 
+# Shared I/O thread pool
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+MAX_IO_WORKERS = 16
+_io_executor = None
+_io_executor_lock = Lock()
+
+
+def io_executor() -> ThreadPoolExecutor:
+    """Returns the process-wide, bounded thread pool used for blocking I/O.
+
+  Sharing one pool keeps the number of concurrent connections bounded no matter
+  how many bulk calls are in flight at the same time.
+  """
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(
+                max_workers=MAX_IO_WORKERS, thread_name_prefix="flow-io"
+            )
+        return _io_executor
+
+
+# Local cache directory
+
+from os import getenv, makedirs
+from os.path import expanduser, join
+
+
+def cache_dir(*subdirectories: str) -> str:
+    """Returns (and creates) a directory for local caches.
+
+  Rooted at FLOW_CACHE_DIR, by default `~/.cache/flow`.
+  """
+    root = getenv("FLOW_CACHE_DIR") or join(expanduser("~"), ".cache", "flow")
+    directory = join(root, *subdirectories)
+    makedirs(directory, exist_ok=True)
+    return directory
+
+
 # Format_timedelta
 
 from datetime import timedelta
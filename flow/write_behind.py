@@ -0,0 +1,172 @@
+"""Write-behind uploads, so a worker can start its next job while earlier
+results are still being uploaded.
+
+`WriteBehindUploader.submit` hands a finished local file to a background
+worker and returns a `Future` that resolves once the upload is durable.
+Uploads to the same remote path always go to the same worker and are therefore
+applied in submission order. Failed uploads are retried with exponential
+backoff; `flush` waits for everything submitted so far and `close` (also run at
+interpreter exit) flushes and stops the workers.
+"""
+
+import atexit
+import logging
+import random
+import time
+from concurrent.futures import Future, wait
+from os import remove
+from os.path import getsize
+from queue import Queue
+from threading import Condition, Thread
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flow.path import AbsolutePath
+
+DEFAULT_NUM_WORKERS = 4
+DEFAULT_MAX_PENDING = 64
+DEFAULT_MAX_PENDING_BYTES = 1024 ** 3
+
+Upload = Tuple[str, AbsolutePath, int, Future]
+
+
+class WriteBehindUploader(object):
+    """Uploads local files in the background with a bounded backlog."""
+
+    def __init__(
+        self,
+        upload: Callable[[str, AbsolutePath], None],
+        num_workers: int = DEFAULT_NUM_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        max_pending_bytes: int = DEFAULT_MAX_PENDING_BYTES,
+        max_attempts: int = 5,
+        initial_backoff: float = 0.5,
+        delete_after_upload: bool = True,
+    ) -> None:
+        self.upload = upload
+        self.max_pending = max_pending
+        self.max_pending_bytes = max_pending_bytes
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.delete_after_upload = delete_after_upload
+        self._pending: Dict[Future, int] = {}
+        self._latest: Dict[AbsolutePath, Future] = {}
+        self._pending_bytes = 0
+        self._condition = Condition()
+        self._closed = False
+        self._queues: List["Queue[Optional[Upload]]"] = []
+        self._workers: List[Thread] = []
+        for i in range(num_workers):
+            queue: "Queue[Optional[Upload]]" = Queue()
+            worker = Thread(
+                target=self._work, args=(queue,), name=f"flow-write-behind-{i}"
+            )
+            worker.daemon = True
+            worker.start()
+            self._queues.append(queue)
+            self._workers.append(worker)
+        atexit.register(self.close)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def submit(self, local_path: str, remote_path: AbsolutePath) -> Future:
+        """Schedules an upload; blocks while the backlog is over budget.
+
+    The local file must not be modified afterwards. It is deleted after a
+    successful upload unless `delete_after_upload` is False.
+    """
+        size = getsize(local_path)
+        future: Future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("WriteBehindUploader has already been closed.")
+            # a single oversized file is still accepted once the backlog is empty
+            while self._pending and self._over_budget(size):
+                self._condition.wait()
+            self._pending[future] = size
+            self._pending_bytes += size
+            self._latest[remote_path] = future
+        shard = hash(remote_path) % len(self._queues)
+        self._queues[shard].put((local_path, remote_path, size, future))
+        return future
+
+    def acknowledgement(self, remote_path: AbsolutePath) -> Optional[Future]:
+        """Returns the future of the latest upload to `remote_path`, if any."""
+        with self._condition:
+            return self._latest.get(remote_path)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Waits for all uploads submitted so far; raises the first failure."""
+        with self._condition:
+            futures = list(self._pending)
+        done, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            raise TimeoutError(f"{len(not_done)} uploads still pending.")
+        for future in done:
+            future.result()
+
+    def close(self) -> None:
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+        atexit.unregister(self.close)
+        try:
+            self.flush()
+        finally:
+            for queue in self._queues:
+                queue.put(None)
+            for worker in self._workers:
+                worker.join()
+
+    def _over_budget(self, size: int) -> bool:
+        return (
+            len(self._pending) >= self.max_pending
+            or self._pending_bytes + size > self.max_pending_bytes
+        )
+
+    def _work(self, queue: "Queue[Optional[Upload]]") -> None:
+        while True:
+            item = queue.get()
+            if item is None:
+                return
+            local_path, remote_path, size, future = item
+            try:
+                self._upload_with_retries(local_path, remote_path)
+            except Exception as error:
+                logging.error("Giving up uploading `%s`: %s", remote_path, error)
+                future.set_exception(error)
+            else:
+                if self.delete_after_upload:
+                    remove(local_path)
+                future.set_result(remote_path)
+            finally:
+                with self._condition:
+                    del self._pending[future]
+                    self._pending_bytes -= size
+                    if self._latest.get(remote_path) is future:
+                        del self._latest[remote_path]
+                    self._condition.notify_all()
+
+    def _upload_with_retries(self, local_path: str, remote_path: AbsolutePath) -> None:
+        backoff = self.initial_backoff
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self.upload(local_path, remote_path)
+                logging.debug("Uploaded `%s` to `%s`.", local_path, remote_path)
+                return
+            except Exception as error:
+                if attempt == self.max_attempts:
+                    raise
+                delay = backoff * (1 + random.random())
+                logging.warning(
+                    "Upload of `%s` failed (attempt %d/%d), retrying in %.1fs: %s",
+                    remote_path,
+                    attempt,
+                    self.max_attempts,
+                    delay,
+                    error,
+                )
+                time.sleep(delay)
+                backoff *= 2
@@ -0,0 +1,81 @@
+"""Leases jobs from the pull queue and runs them on local worker processes.
+
+```bash
+PYTHONPATH='.' python services/pull_worker/main.py --pull_worker_processes 8
+FLOW_QUEUE_BACKEND=sqlite PYTHONPATH='.' python services/pull_worker/main.py
+```
+
+Stops leasing on SIGTERM or SIGINT and exits once running jobs have finished.
+"""
+
+import logging
+import signal
+
+from absl import app
+from absl import flags
+
+from flow.backends import create_pull_client
+from flow.job_spec import JobSpec
+from flow.process_pool import IsolatedProcessPool
+from flow.pull_worker import PullWorker
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer(
+    "pull_worker_processes", None, "Number of worker processes; defaults to #CPUs."
+)
+flags.DEFINE_float("pull_worker_lease_seconds", 60.0, "Lease duration in seconds.")
+flags.DEFINE_float(
+    "pull_worker_job_timeout", None, "Seconds after which a job is killed and nacked."
+)
+flags.DEFINE_float(
+    "pull_worker_max_backoff", 60.0, "Longest wait between leases of an empty queue."
+)
+flags.DEFINE_float(
+    "pull_worker_claim_ttl",
+    None,
+    "Seconds to claim a job's output for while running it; defaults to "
+    "FLOW_CLAIM_TTL. Should exceed the job timeout.",
+)
+flags.DEFINE_integer(
+    "pull_worker_max_empty_polls",
+    None,
+    "Exit after finding the queue empty this many times in a row.",
+)
+
+
+def ignore_interrupts():
+    # Ctrl-C stops the parent, which lets running jobs finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def main(argv):
+    del argv  # Unused.
+    if FLAGS.pull_worker_claim_ttl is not None:
+        # set before forking, so that worker processes inherit it
+        JobSpec.claim_ttl = FLAGS.pull_worker_claim_ttl
+    client = create_pull_client()
+    with IsolatedProcessPool(
+        FLAGS.pull_worker_processes,
+        timeout=FLAGS.pull_worker_job_timeout,
+        initializer=ignore_interrupts,
+    ) as pool:
+        worker = PullWorker(
+            client,
+            pool,
+            lease_seconds=FLAGS.pull_worker_lease_seconds,
+            max_backoff=FLAGS.pull_worker_max_backoff,
+        )
+
+        def stop(signum, frame):
+            logging.info("Received signal %d, finishing running jobs.", signum)
+            worker.stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        logging.info("Pulling jobs with %d processes.", pool.num_workers)
+        worker.run(max_empty_polls=FLAGS.pull_worker_max_empty_polls)
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -19,15 +19,36 @@ import platform
 import json
 
 from flask import Flask, request
-from flow.event_handler import FileEventHandler
+from flow.event_handler import FileEventHandler, CoalescingFileEventHandler
+from flow.task_sandbox import TaskSandbox
 
 # explcitly parse FLAGS as we're not using absl.app
 from absl import flags
 FLAGS = flags.FLAGS
+flags.DEFINE_float('file_event_window', 0.0, 'Seconds to buffer file events for, so that bursts enumerate each task once. 0 handles every event right away.')
+flags.DEFINE_float('file_event_max_latency', 10.0, 'Seconds after which buffered file events are handled even during a burst.')
+flags.DEFINE_integer('file_event_max_buffer', 10000, 'Number of buffered file events that triggers handling them right away.')
+flags.DEFINE_boolean('parse_in_sandbox', False, 'Import tasks that can not be parsed statically in a worker process instead of the handler.')
+flags.DEFINE_float('parse_timeout', 60.0, 'Seconds after which importing a task in the sandbox is aborted.')
+flags.DEFINE_integer('parse_max_memory_mb', 4096, 'Memory limit of the sandbox process that imports tasks.')
+flags.DEFINE_enum('deleted_outputs', 'keep', ['keep', 'mark', 'remove'], 'What to do with recorded outputs whose task or a bound input was deleted.')
 FLAGS(["gunicorn"])  # TODO: obviously a terrible hack. Defaults make this work, but it isn't pretty.
 
 app = Flask(__name__)
-event_handler = FileEventHandler()
+sandbox = None
+if FLAGS.parse_in_sandbox:
+  sandbox = TaskSandbox(timeout=FLAGS.parse_timeout,
+                        max_rss_bytes=FLAGS.parse_max_memory_mb * 1024 ** 2)
+file_event_handler = FileEventHandler(sandbox=sandbox,
+                                      deleted_outputs=FLAGS.deleted_outputs)
+if FLAGS.file_event_window > 0:
+  event_handler = CoalescingFileEventHandler(
+      file_event_handler,
+      window=FLAGS.file_event_window,
+      max_latency=FLAGS.file_event_max_latency,
+      max_events=FLAGS.file_event_max_buffer)
+else:
+  event_handler = file_event_handler
 
 gunicorn_error_logger = logging.getLogger('gunicorn.error')
 app.logger.handlers.extend(gunicorn_error_logger.handlers)
@@ -41,8 +62,17 @@ def handle_file():
   src_path = event['src_path']
   if not src_path.startswith('/'):
     src_path = '/' + src_path
-  event_handler.handle_file_event(src_path)
-  app.logger.info("src_path: %s", src_path)
+  # watchdog-style event types, or the type of a GCS notification
+  event_type = event.get('event_type') or event.get('eventType')
+  deleted = event_type in ('deleted', 'OBJECT_DELETE')
+  if deleted and event.get('overwrittenByGeneration'):
+    # the old generation of an overwritten object; the new one has its own event
+    return '', 200
+  if deleted:
+    event_handler.handle_file_deletion(src_path)
+  else:
+    event_handler.handle_file_event(src_path)
+  app.logger.info("%s src_path: %s", event_type or 'created', src_path)
   return '', 200
 
 
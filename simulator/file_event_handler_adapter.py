@@ -8,8 +8,8 @@ the "watchdog" library asks for to the flow interface "file_event_handler".
 import logging
 from os import path
 from watchdog.events import FileSystemEventHandler
-from flow.event_handler import FileEventHandler
-from flow.io_adapter import io
+from flow.event_handler import FileEventHandler, CoalescingFileEventHandler
+from flow.io_adapter import io, LocalFSAdapter, IndexUpdatingEventHandler
 
 from pathlib import PurePath
 
@@ -17,21 +17,36 @@ from pathlib import PurePath
 class FileEventHandlerAdapterEventHandler(FileSystemEventHandler):
   """Redirects events to the task_handler API."""
 
-  def __init__(self, root_dir: str) -> None:
+  def __init__(self, root_dir: str, coalesce_window: float = 0.0) -> None:
     self.root_path = PurePath(root_dir)
     io.root_dir = root_dir
-    self.handler = FileEventHandler()
+    if coalesce_window > 0:
+      self.handler = CoalescingFileEventHandler(window=coalesce_window)
+    else:
+      self.handler = FileEventHandler()
+
+  def dispatch(self, event):
+    # keep a LocalFSAdapter's glob index current before flow sees the event
+    if isinstance(io.adapter, LocalFSAdapter):
+      IndexUpdatingEventHandler(io.adapter).dispatch(event)
+    super().dispatch(event)
 
   def on_moved(self, event):
     if not event.is_directory:
       logging.debug("TaskHandlerAdapterEventHandler : on_moved(), %s", event)
-      pure_path = PurePath(event.src_path)
-      relative = pure_path.relative_to(self.root_path)
-      self.handler.handle_file_event('/' + str(relative))
+      self.handler.handle_file_deletion(self._flow_path(event.src_path))
+      self.handler.handle_file_event(self._flow_path(event.dest_path))
 
   def on_created(self, event):
     if not event.is_directory:
       logging.debug("TaskHandlerAdapterEventHandler : on_created(), %s", event)
-      pure_path = PurePath(event.src_path)
-      relative = pure_path.relative_to(self.root_path)
-      self.handler.handle_file_event('/' + str(relative))
+      self.handler.handle_file_event(self._flow_path(event.src_path))
+
+  def on_deleted(self, event):
+    if not event.is_directory:
+      logging.debug("TaskHandlerAdapterEventHandler : on_deleted(), %s", event)
+      self.handler.handle_file_deletion(self._flow_path(event.src_path))
+
+  def _flow_path(self, local_path: str) -> str:
+    relative = PurePath(local_path).relative_to(self.root_path)
+    return '/' + str(relative)
@@ -20,6 +20,7 @@ FLAGS = flags.FLAGS
 
 flags.DEFINE_boolean('watch', False, 'Watch a directory.')
 flags.DEFINE_string('watch_path', 'simulator/playground', 'Relative path to directory that should be watched for file system events.')
+flags.DEFINE_float('coalesce_window', 0.0, 'Seconds to buffer file events for before handling them together. 0 handles every event right away.')
 flags.DEFINE_string('preflight_task', None, 'List & export JobSpecs that a task could enqueue.')
 flags.DEFINE_string('execute_job', None, 'Read & execute a JobSpec from a json file.')
 
@@ -60,7 +61,7 @@ def main(argv):
     job_spec.execute()
 
   elif FLAGS.watch:
-    event_handler = FileEventHandlerAdapterEventHandler(root_dir=FLAGS.watch_path)
+    event_handler = FileEventHandlerAdapterEventHandler(root_dir=FLAGS.watch_path, coalesce_window=FLAGS.coalesce_window)
     observer = Observer()
     observer.schedule(event_handler, FLAGS.watch_path, recursive=True)
     observer.start()
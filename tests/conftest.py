@@ -130,3 +130,120 @@ def full_task_spec(
     a_path = "/tasks/full_task_spec.py"
     name = "full_task_spec.py"
     return TaskSpec(inputs, output, a_path, name)
+
+
+# Tasks executed against a LocalFSAdapter
+from flow.io_adapter import io, LocalFSAdapter
+
+
+@pytest.fixture
+def local_tasks(tmpdir):
+    tmpdir.join("tasks", "hello.py").write(
+        "def main() -> str:\n  return 'Hello!'\n", ensure=True
+    )
+    tmpdir.join("tasks", "broken.py").write(
+        "def main() -> str:\n  raise ValueError('broken')\n", ensure=True
+    )
+    tmpdir.join("tasks", "slow.py").write(
+        "import time\n\ndef main() -> str:\n  time.sleep(1)\n  return 'Done!'\n",
+        ensure=True,
+    )
+    previous = io.adapter
+    io.configure(LocalFSAdapter(root_dir=str(tmpdir)))
+    yield tmpdir
+    io.configure(previous)
+
+
+# A fake Cloud Tasks discovery client
+import threading
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+class FakeRequest(object):
+    def __init__(self, client, method, **kwargs):
+        self.client = client
+        self.method = method
+        self.kwargs = kwargs
+
+    def execute(self, http=None):
+        return self.client.handle(self)
+
+
+class FakeBatchRequest(object):
+    def __init__(self, client, callback):
+        self.client = client
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self, http=None):
+        with self.client.lock:
+            self.client.batches.append(len(self.requests))
+        for request_id, request in self.requests:
+            try:
+                response, exception = request.execute(), None
+            except HttpError as error:
+                response, exception = None, error
+            self.callback(request_id, response, exception)
+
+
+class FakeTasksClient(object):
+    """Records created tasks; `fail(request)` may return an HTTP status to fail with."""
+
+    def __init__(self, fail=None):
+        self.fail = fail or (lambda request: None)
+        self.created = []
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def projects(self):
+        return self
+
+    def locations(self):
+        return self
+
+    def queues(self):
+        return self
+
+    def create(self, **kwargs):
+        return FakeRequest(self, "create", **kwargs)
+
+    def delete(self, **kwargs):
+        return FakeRequest(self, "delete", **kwargs)
+
+    def tasks(self):
+        return self
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatchRequest(self, callback)
+
+    def handle(self, request):
+        status = self.fail(request)
+        if status:
+            raise HttpError(httplib2.Response({"status": status}), b"Fake error.")
+        with self.lock:
+            if request.method == "delete":
+                return self._delete(request.kwargs["name"])
+            task = dict(request.kwargs["body"]["task"])
+            if "name" not in task:
+                task["name"] = f"{request.kwargs['parent']}/tasks/{len(self.created)}"
+            elif any(task["name"] == created["name"] for created in self.created):
+                raise HttpError(httplib2.Response({"status": 409}), b"Exists.")
+            self.created.append(task)
+        return task
+
+    def _delete(self, name):
+        remaining = [task for task in self.created if task["name"] != name]
+        if len(remaining) == len(self.created):
+            raise HttpError(httplib2.Response({"status": 404}), b"Not found.")
+        self.created = remaining
+        return {}
+
+
+@pytest.fixture
+def fake_tasks_client():
+    return FakeTasksClient()
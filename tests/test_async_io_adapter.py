@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from flow.async_io_adapter import MemoryAsyncIOAdapter, ExecutorAsyncIOAdapter
+from flow.io_adapter import LocalFSAdapter
+from flow.memory_io_adapter import MemoryIOAdapter
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+@pytest.fixture
+def memory_io():
+    return MemoryAsyncIOAdapter({"/data/names/name1.txt": b"Katherine"})
+
+
+@pytest.fixture
+def local_io(tmpdir):
+    tmpdir.join("data", "names", "name1.txt").write("Katherine", ensure=True)
+    return ExecutorAsyncIOAdapter(LocalFSAdapter(root_dir=str(tmpdir)))
+
+
+@pytest.fixture(params=["memory_io", "local_io"])
+def async_io(request):
+    return request.getfixturevalue(request.param)
+
+
+def test_reading(async_io):
+    async def read():
+        async with async_io.reading("/data/names/name1.txt") as handle:
+            return handle.read()
+
+    assert run(read()) == b"Katherine"
+
+
+def test_writing_then_glob(async_io):
+    async def write_and_glob():
+        async with async_io.writing("/data/greetings/hello.txt", mode="w") as handle:
+            handle.write("Hello")
+        return await async_io.glob("/data/greetings/*.txt")
+
+    assert run(write_and_glob()) == ["/data/greetings/hello.txt"]
+
+
+def test_exist(async_io):
+    paths = ["/data/names/name1.txt", "/data/missing.txt"] * 50
+    assert run(async_io.exist(paths)) == [True, False] * 50
+
+
+def test_exist_overlaps_lookups():
+    latency = 0.05
+    async_io = MemoryAsyncIOAdapter({"/data/a.txt": b"a"}, latency=latency)
+    paths = ["/data/a.txt", "/data/missing.txt"] * 10
+    start = time.perf_counter()
+    assert run(async_io.exist(paths)) == [True, False] * 10
+    assert time.perf_counter() - start < len(paths) * latency / 4
+
+
+def test_executor_overlaps_lookups():
+    latency = 0.05
+    memory = MemoryIOAdapter({"/data/a.txt": b"a"}, latency=latency)
+    async_io = ExecutorAsyncIOAdapter(memory)
+    paths = ["/data/a.txt", "/data/missing.txt"] * 10
+    start = time.perf_counter()
+    stats = run(async_io.stat_many(paths))
+    assert [stat is not None for stat in stats] == [True, False] * 10
+    assert time.perf_counter() - start < len(paths) * latency / 4
+
+
+def test_stat_many(async_io):
+    stats = run(async_io.stat_many(["/data/names/name1.txt", "/data/missing.txt"]))
+    assert stats[0].size == 9 and stats[1] is None
+
+
+def test_download_and_upload_many(async_io):
+    async def round_trip():
+        downloads = await async_io.download_many(
+            ["/data/names/name1.txt", "/data/missing.txt"]
+        )
+        uploads = await async_io.upload_many([(downloads[0].value, "/copy.txt")])
+        return downloads, uploads, await async_io.exists("/copy.txt")
+
+    downloads, uploads, copied = run(round_trip())
+    assert downloads[0].ok and not downloads[1].ok
+    assert uploads[0].ok and uploads[0].path == "/copy.txt"
+    assert copied
@@ -0,0 +1,62 @@
+import subprocess
+import sys
+
+import pytest
+
+from flow import backends
+from flow.io_adapter import LocalFSAdapter
+from flow.memory_io_adapter import MemoryIOAdapter
+from flow.queue import LocalEnqueuer
+
+HEAVY_MODULES = [
+    "google.cloud.storage",
+    "googleapiclient.discovery",
+    "lucid.misc.io",
+    "numpy",
+    "tensorflow",
+]
+
+
+def test_create_io_adapter_by_name():
+    assert isinstance(backends.create_io_adapter("memory"), MemoryIOAdapter)
+
+
+def test_create_io_adapter_from_environment(monkeypatch, tmpdir):
+    monkeypatch.setenv("FLOW_IO_BACKEND", "local")
+    monkeypatch.setenv("FLOW_LOCAL_FS_ROOT", str(tmpdir))
+    adapter = backends.create_io_adapter()
+    assert isinstance(adapter, LocalFSAdapter)
+    assert adapter.root_dir == str(tmpdir)
+
+
+def test_create_enqueuer_from_legacy_environment(monkeypatch):
+    monkeypatch.delenv("FLOW_QUEUE_BACKEND", raising=False)
+    monkeypatch.setenv("USE_LOCAL_QUEUE", "TRUE")
+    assert isinstance(backends.create_enqueuer(), LocalEnqueuer)
+
+
+def test_create_sqlite_enqueuer_from_environment(monkeypatch, tmpdir):
+    path = str(tmpdir.join("queue.sqlite"))
+    monkeypatch.setenv("FLOW_QUEUE_BACKEND", "sqlite")
+    monkeypatch.setenv("FLOW_SQLITE_QUEUE_PATH", path)
+    assert backends.create_enqueuer().path == path
+
+
+def test_register_backend(monkeypatch):
+    monkeypatch.setitem(backends.IO_BACKENDS, "custom", lambda: "custom adapter")
+    assert backends.create_io_adapter("custom") == "custom adapter"
+
+
+def test_unknown_backend_fails_loudly():
+    with pytest.raises(ValueError):
+        backends.create_enqueuer("carrier-pigeon")
+
+
+@pytest.mark.parametrize("module", ["flow.task_spec", "flow.event_handler"])
+def test_importing_flow_defers_heavy_modules(module):
+    check = (
+        f"import sys, {module}; "
+        f"print([name for name in {HEAVY_MODULES!r} if name in sys.modules])"
+    )
+    output = subprocess.check_output([sys.executable, "-c", check])
+    assert output.decode().strip().splitlines()[-1] == "[]"
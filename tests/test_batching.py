@@ -0,0 +1,114 @@
+import threading
+from collections import Counter
+
+import pytest
+
+from flow.queue.batching import AdaptiveBatchSize, BatchSubmitter
+
+
+def build_request(client):
+    def build(item):
+        return client.create(parent="queue", body={"task": {"item": item}})
+
+    return build
+
+
+def submitter(client, **kwargs):
+    kwargs.setdefault("initial_backoff", 0)
+    kwargs.setdefault("item_size", lambda item: 8)
+    return BatchSubmitter(client, build_request(client), new_http=None, **kwargs)
+
+
+def test_adaptive_batch_size():
+    batch_size = AdaptiveBatchSize(initial=10, increase=5, maximum=20)
+    batch_size.record(10, 0)
+    assert batch_size.size == 15
+    batch_size.record(3, 0)  # a partial batch says nothing about capacity
+    assert batch_size.size == 15
+    batch_size.record(15, 1)
+    assert batch_size.size == 7
+    for _ in range(10):
+        batch_size.record(batch_size.size, 0)
+    assert batch_size.size == 20
+
+
+def test_adaptive_batch_size_shrinks_slow_batches():
+    batch_size = AdaptiveBatchSize(initial=10, increase=5, target_latency=1.0)
+    batch_size.record(10, 0, latency=0.5)
+    assert batch_size.size == 15
+    batch_size.record(15, 0, latency=2.0)
+    assert batch_size.size == 7
+
+
+def test_batch_submitter_batches_requests(fake_tasks_client):
+    batch_size = AdaptiveBatchSize(initial=10, increase=10)
+    failures = submitter(fake_tasks_client, batch_size=batch_size).submit(range(100))
+    assert failures == []
+    created = sorted(task["item"] for task in fake_tasks_client.created)
+    assert created == list(range(100))
+    assert len(fake_tasks_client.batches) < 10
+
+
+def test_batch_submitter_retries_only_failed_items(fake_tasks_client):
+    attempts = Counter()
+
+    def fail(request):
+        item = request.kwargs["body"]["task"]["item"]
+        attempts[item] += 1
+        if item % 10 == 0 and attempts[item] < 3:
+            return 503
+
+    fake_tasks_client.fail = fail
+    batch = submitter(fake_tasks_client)
+    assert batch.submit(range(50)) == []
+    assert len(fake_tasks_client.created) == 50
+    assert {item: count for item, count in attempts.items() if count > 1} == {
+        0: 3,
+        10: 3,
+        20: 3,
+        30: 3,
+        40: 3,
+    }
+    assert batch.metrics.counters["retried"] == 10
+    assert batch.batch_size.size < 100
+
+
+def test_batch_submitter_gives_up_on_permanent_errors(fake_tasks_client):
+    fake_tasks_client.fail = lambda request: 400
+    failures = submitter(fake_tasks_client).submit(["a", "b"])
+    assert sorted(failure.item for failure in failures) == ["a", "b"]
+    assert failures[0].error.resp.status == 400
+
+
+def test_batch_submitter_limits_batch_bytes(fake_tasks_client):
+    batch = submitter(fake_tasks_client, max_batch_bytes=20, item_size=len)
+    assert batch.submit(["a" * 8, "b" * 8, "c" * 8, "d" * 30, "e"]) == []
+    assert sorted(fake_tasks_client.batches) == [1, 1, 1, 2]
+
+
+def test_batch_submitter_consumes_items_while_batches_are_in_flight(
+    fake_tasks_client,
+):
+    events = []
+    serialized_later_batch = threading.Event()
+
+    def items():
+        for i in range(6):
+            events.append(f"serialize {i}")
+            if i == 3:
+                serialized_later_batch.set()
+            yield i
+
+    def fail(request):
+        item = request.kwargs["body"]["task"]["item"]
+        if item == 0:
+            # the first batch is only done once later ones are being built
+            assert serialized_later_batch.wait(5)
+        events.append(f"create {item}")
+
+    fake_tasks_client.fail = fail
+    batch_size = AdaptiveBatchSize(initial=2, increase=0)
+    batch = submitter(fake_tasks_client, batch_size=batch_size)
+    assert batch.submit(items()) == []
+    assert events.index("serialize 3") < events.index("create 0")
+    assert len(fake_tasks_client.created) == 6
@@ -0,0 +1,62 @@
+import builtins
+
+import pytest
+
+import flow.dynamic_import
+from flow.dynamic_import import _code_cache, import_module_from_local_source
+
+
+@pytest.fixture
+def task(tmpdir, monkeypatch):
+    monkeypatch.setenv("FLOW_CACHE_DIR", str(tmpdir.join("cache")))
+    _code_cache.clear()
+    compiles = []
+
+    def counting_compile(*args, **kwargs):
+        compiles.append(args[1])
+        return builtins.compile(*args, **kwargs)
+
+    monkeypatch.setattr(flow.dynamic_import, "compile", counting_compile, raising=False)
+    task = tmpdir.join("task.py")
+    task.write(
+        "counter = []\n\ndef main():\n  counter.append(1)\n  return len(counter)\n"
+    )
+    yield str(task), compiles
+    _code_cache.clear()
+
+
+def test_imports_compile_source_once(task):
+    task_path, compiles = task
+    first = import_module_from_local_source(task_path)
+    second = import_module_from_local_source(task_path)
+    assert len(compiles) == 1
+    assert first.main() == 1
+    assert second.main() == 1  # fresh namespace, not shared state
+    assert first.__name__ != second.__name__
+
+
+def test_compiled_code_is_stored_on_disk(task):
+    task_path, compiles = task
+    import_module_from_local_source(task_path)
+    _code_cache.clear()
+    module = import_module_from_local_source(task_path)
+    assert len(compiles) == 1
+    assert module.main() == 1
+
+
+def test_changed_source_is_recompiled(task, tmpdir):
+    task_path, compiles = task
+    import_module_from_local_source(task_path)
+    tmpdir.join("task.py").write("def main():\n  return 'changed'\n")
+    assert import_module_from_local_source(task_path).main() == "changed"
+    assert len(compiles) == 2
+
+
+def test_stale_magic_number_is_ignored(task, tmpdir):
+    task_path, compiles = task
+    import_module_from_local_source(task_path)
+    _code_cache.clear()
+    for cached in tmpdir.join("cache", "bytecode").listdir():
+        cached.write_binary(b"\0\0\0\0" + cached.read_binary()[4:])
+    assert import_module_from_local_source(task_path).main() == 1
+    assert len(compiles) == 2
@@ -0,0 +1,278 @@
+import time
+
+import pytest
+from absl import flags
+
+from flow.event_handler import FileEventHandler, CoalescingFileEventHandler
+from flow.io_adapter import LocalFSAdapter
+from flow.job_spec import JobSpec, io
+from flow.manifest import read_index, read_manifest
+from flow.provenance import ProvenanceStore
+from flow.queue.enqueuer import Enqueuer
+from flow.queue.sqlite import SQLiteQueue
+
+flags.FLAGS.mark_as_parsed()
+
+
+class RecordingEnqueuer(Enqueuer):
+    def __init__(self):
+        self.batches = []
+
+    def add(self, job_specs):
+        self.batches.append(list(job_specs))
+
+
+@pytest.fixture
+def greetings(tmpdir):
+    tmpdir.join("tasks", "greet.py").write(
+        'name = "/data/names/{name_id}.txt"\n'
+        'greeting = ["hi", "hello"]\n'
+        'output = "/data/greetings/{name_id}-{greeting}.txt"\n\n'
+        "def main():\n  return greeting\n",
+        ensure=True,
+    )
+    for name_id in ["ann", "bob", "cat", "dan"]:
+        tmpdir.join("data", "names", f"{name_id}.txt").write(name_id, ensure=True)
+    tmpdir.join("data", "greetings", "manifest.txt").write("", ensure=True)
+    previous = io.adapter
+    io.configure(LocalFSAdapter(root_dir=str(tmpdir)))
+    yield tmpdir
+    io.configure(previous)
+
+
+@pytest.fixture
+def handler(greetings):
+    handler = FileEventHandler()
+    handler.enqueuer = RecordingEnqueuer()
+    yield handler
+    handler.manifests.close()
+
+
+def outputs(handler):
+    return sorted(job.output for batch in handler.enqueuer.batches for job in batch)
+
+
+def test_new_input_only_enqueues_its_slice(handler):
+    handler.handle_file_event("/data/names/bob.txt")
+    assert outputs(handler) == [
+        "/data/greetings/bob-hello.txt",
+        "/data/greetings/bob-hi.txt",
+    ]
+
+
+def test_new_inputs_are_appended_to_manifest(handler):
+    handler.task_specs
+    handler.manifests.flush()
+    with io.writing("/data/names/eve.txt") as open_file:
+        open_file.write(b"eve")
+    handler.handle_file_event("/data/names/eve.txt")
+    handler.manifests.flush()
+    rows = list(read_manifest("/tasks/greet.json"))
+    assert len(rows) == 10
+    assert ["eve", "hi"] in rows
+
+
+def test_repeated_events_do_not_grow_manifest(handler):
+    handler.task_specs
+    handler.manifests.flush()
+    for _ in range(3):
+        handler.handle_file_event("/data/names/ann.txt")
+    handler.manifests.flush()
+    rows = list(read_manifest("/tasks/greet.json"))
+    assert len(rows) == 8
+    assert len(read_index("/tasks/greet.json")["shards"]) == 1
+
+
+def test_new_inputs_enumerate_each_task_once(handler):
+    paths = ["/data/names/ann.txt", "/data/names/cat.txt", "/data/names/ann.txt"]
+    assert handler.handle_file_events(paths) == 1
+    assert len(handler.enqueuer.batches) == 1
+    assert outputs(handler) == [
+        "/data/greetings/ann-hello.txt",
+        "/data/greetings/ann-hi.txt",
+        "/data/greetings/cat-hello.txt",
+        "/data/greetings/cat-hi.txt",
+    ]
+
+
+def test_new_task_covers_new_inputs(handler):
+    paths = ["/data/names/ann.txt", "/tasks/greet.py"]
+    assert handler.handle_file_events(paths) == 1
+    assert len(outputs(handler)) == 8
+
+
+def test_irrelevant_inputs_enqueue_nothing(handler):
+    assert handler.handle_file_events(["/data/greetings/manifest.txt"]) == 0
+    assert handler.enqueuer.batches == []
+
+
+def test_coalescing_handler_flushes_after_window(handler):
+    with CoalescingFileEventHandler(handler, window=0.2) as coalescing:
+        coalescing.handle_file_event("/data/names/ann.txt")
+        coalescing.handle_file_event("/data/names/bob.txt")
+        coalescing.handle_file_event("/data/names/bob.txt")
+        assert handler.enqueuer.batches == []
+        deadline = time.time() + 5
+        while coalescing.buffered and time.time() < deadline:
+            time.sleep(0.05)
+    assert len(handler.enqueuer.batches) == 1
+    assert len(outputs(handler)) == 4
+    assert coalescing.metrics.counters["duplicate_events"] == 1
+    assert coalescing.metrics.ratio("events", "enumerations") == 3
+
+
+def test_coalescing_handler_bounds_latency(handler):
+    with CoalescingFileEventHandler(handler, window=1.0, max_latency=0.3) as coalescing:
+        start = time.time()
+        while not handler.enqueuer.batches and time.time() - start < 5:
+            coalescing.handle_file_event("/data/names/ann.txt")
+            time.sleep(0.05)
+        assert time.time() - start < 1.0
+
+
+def test_coalescing_handler_flushes_full_buffer(handler):
+    coalescing = CoalescingFileEventHandler(handler, window=60, max_events=2)
+    coalescing.handle_file_event("/data/names/ann.txt")
+    assert handler.enqueuer.batches == []
+    coalescing.handle_file_event("/data/names/bob.txt")
+    assert len(outputs(handler)) == 4
+    coalescing.close()
+    with pytest.raises(ValueError):
+        coalescing.handle_file_event("/data/names/cat.txt")
+
+
+def test_new_task_does_not_reparse_others(handler, greetings):
+    handler.task_specs
+    greetings.join("tasks", "other.py").write(
+        'name = "/data/names/{name_id}.txt"\n'
+        'output = "/data/other/{name_id}.txt"\n\n'
+        "def main():\n  return name\n"
+    )
+    handler.handle_file_events(["/tasks/other.py", "/data/names/ann.txt"])
+    assert handler.registry.metrics.counters["added"] == 2
+    assert "/data/other/ann.txt" in outputs(handler)
+    assert "/data/greetings/ann-hi.txt" in outputs(handler)
+
+
+def test_updated_inputs_enqueue_recorded_dependents(greetings, tmpdir):
+    store = ProvenanceStore(str(tmpdir.join("provenance.sqlite")))
+    handler = FileEventHandler(provenance=store)
+    handler.enqueuer = RecordingEnqueuer()
+    task_spec = handler.registry.update("/tasks/greet.py")
+    bindings = {"names": {"name_id": "/data/names/{name_id}.txt"}}
+    store.record(JobSpec(bindings, "/data/all.txt", task_spec.src_path))
+    store.record(
+        JobSpec(bindings, "/data/old.txt", task_spec.src_path, task_spec.source_hash)
+    )
+    handler.handle_file_event("/data/names/bob.txt")
+    handler.manifests.close()
+    # only the record of the current version of the task
+    assert [job.output for job in handler.enqueuer.batches[-1]] == ["/data/old.txt"]
+
+
+def test_files_read_by_lambdas_reenumerate_their_task(handler, greetings):
+    greetings.join("data", "layers.txt").write("a b", ensure=True)
+    greetings.join("tasks", "layers.py").write(
+        'greeting = ["hi"]\n'
+        "layer = lambda greeting: __import__('flow.job_spec').job_spec.io"
+        ".read_range('/data/layers.txt', 0, 100).decode().split()\n"
+        'output = "/data/layers/{greeting}-{layer}.txt"\n\n'
+        "def main():\n  return layer\n"
+    )
+    handler.handle_file_event("/tasks/layers.py")
+    assert len(handler.enqueuer.batches[-1]) == 2
+    greetings.join("data", "layers.txt").write("a b c")
+    assert handler.handle_file_events(["/data/layers.txt"]) == 1
+    assert len(handler.enqueuer.batches[-1]) == 3
+
+
+def test_deleted_inputs_cancel_queued_jobs(greetings):
+    enqueuer = SQLiteQueue(str(greetings.join("queue.sqlite")))
+    handler = FileEventHandler()
+    handler.enqueuer = enqueuer
+    handler.handle_file_event("/tasks/greet.py")
+    assert enqueuer.counts()["available"] == 8
+    greetings.join("data", "names", "bob.txt").remove()
+    assert handler.handle_file_deletion("/data/names/bob.txt") is None
+    assert enqueuer.counts()["available"] == 6
+    assert not io.exists("/data/names/bob.txt")
+    assert handler.handle_file_deletions(["/tasks/greet.py"]) == 6
+    assert enqueuer.counts()["available"] == 0
+    assert "/tasks/greet.py" not in handler.registry
+    handler.manifests.close()
+
+
+@pytest.mark.parametrize("policy", ["keep", "mark", "remove"])
+def test_deleted_inputs_orphan_recorded_outputs(greetings, tmpdir, policy):
+    store = ProvenanceStore(str(tmpdir.join("provenance.sqlite")))
+    handler = FileEventHandler(provenance=store, deleted_outputs=policy)
+    handler.enqueuer = RecordingEnqueuer()
+    task_spec = handler.registry.update("/tasks/greet.py")
+    source_hash = task_spec.source_hash
+    for name_id in ["ann", "bob"]:
+        bindings = {"name": f"/data/names/{name_id}.txt", "greeting": "hi"}
+        output = f"/data/greetings/{name_id}-hi.txt"
+        store.record(JobSpec(bindings, output, "/tasks/greet.py", source_hash))
+        greetings.join(output).write("hi", ensure=True)
+    aggregated = {"names": {"name_id": "/data/names/{name_id}.txt"}}
+    store.record(JobSpec(aggregated, "/data/all.txt", "/tasks/greet.py", source_hash))
+    greetings.join("data", "names", "bob.txt").remove()
+    assert handler.handle_file_deletions(["/data/names/bob.txt"]) == 2
+    handler.manifests.close()
+    # the aggregating job runs again, as its output is outdated now
+    (job_spec,) = handler.enqueuer.batches[-1]
+    assert job_spec.output == "/data/all.txt" and job_spec.inputs_updated
+    orphaned = "/data/greetings/bob-hi.txt"
+    assert io.exists(orphaned) == (policy != "remove")
+    assert store.orphaned() == ([orphaned] if policy == "mark" else [])
+    assert (store.get(orphaned) is None) == (policy == "remove")
+    assert io.exists("/data/greetings/ann-hi.txt")
+
+
+def test_coalescing_handler_drops_buffered_events_of_deleted_files(handler):
+    with CoalescingFileEventHandler(handler, window=60) as coalescing:
+        coalescing.handle_file_event("/data/names/bob.txt")
+        coalescing.handle_file_event("/data/names/cat.txt")
+        coalescing.handle_file_deletion("/data/names/bob.txt")
+        assert coalescing.buffered == 1
+    assert outputs(handler) == [
+        "/data/greetings/cat-hello.txt",
+        "/data/greetings/cat-hi.txt",
+    ]
+    assert coalescing.metrics.counters["cancelled_events"] == 1
+
+
+def test_new_input_slices_int_iterables(handler, greetings):
+    greetings.join("tasks", "channels.py").write(
+        "channel = range(3)\n"
+        'recording = "/data/recordings/{channel}.txt"\n'
+        'output = "/data/spectra/{channel}.txt"\n\n'
+        "def main():\n  return str(channel)\n"
+    )
+    for channel in range(3):
+        greetings.join("data", "recordings", f"{channel}.txt").write("", ensure=True)
+    task_spec = handler.registry.update("/tasks/channels.py")
+    assert sorted(b["channel"] for b in task_spec.all_bindings()) == [0, 1, 2]
+    handler.handle_file_event("/data/recordings/1.txt")
+    (job_spec,) = handler.enqueuer.batches[-1]
+    # the same job as a full enumeration's, with an int binding
+    assert job_spec.bindings["channel"] == 1
+    assert job_spec == task_spec.to_job_spec(task_spec.all_bindings()[1])
+
+
+def test_new_input_slices_every_matching_input(handler, greetings):
+    greetings.join("tasks", "pairs.py").write(
+        'name = "/data/names/{name_id}.txt"\n'
+        'everyone = {"{other}": "/data/names/{other}.txt"}\n'
+        'output = "/data/pairs/{name_id}.txt"\n\n'
+        "def main():\n  return name\n"
+    )
+    handler.registry.update("/tasks/pairs.py")
+    with io.writing("/data/names/eve.txt") as open_file:
+        open_file.write(b"eve")
+    handler.handle_file_event("/data/names/eve.txt")
+    pairs = [job for job in handler.enqueuer.batches[-1] if "pairs" in job.output]
+    # every job aggregates the new name, not only the one that is about it
+    assert sorted(job.output for job in pairs) == [
+        f"/data/pairs/{name_id}.txt" for name_id in ["ann", "bob", "cat", "dan", "eve"]
+    ]
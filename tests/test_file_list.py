@@ -53,10 +53,26 @@ def test_file_list_fails_loudly(empty_file_list, absolute_url):
         file_list.exists(absolute_url)
     with pytest.raises(ValueError):
         file_list.glob(absolute_url)
-    with pytest.raises(NotImplementedError):
+    with pytest.raises(ValueError):
         file_list.remove(absolute_url)
 
 
+def test_file_list_remove(absolute_path):
+    file_list = FileList(paths=[absolute_path])
+    file_list.remove(absolute_path)
+    assert not file_list.exists(absolute_path)
+    assert file_list.glob(AbsolutePath("/an/*")) == []
+
+
+def test_file_list_glob_only_matches_within_prefix():
+    paths = ["/a/1.txt", "/ab/2.txt", "/b/3.txt", "/a/4.jpg"]
+    file_list = FileList(paths=[AbsolutePath(path) for path in paths])
+    assert file_list.glob(AbsolutePath("/a/*.txt")) == ["/a/1.txt"]
+    all_a = ["/a/1.txt", "/a/4.jpg", "/ab/2.txt"]
+    assert file_list.glob(AbsolutePath("/a*")) == all_a
+    assert file_list.glob(AbsolutePath("/b/3.txt")) == ["/b/3.txt"]
+
+
 def test_joining_absolute_paths():
     absolute_one = AbsolutePath("/an/absolute/path.ext")
     absolute_two = AbsolutePath("/prefix/absolute/path")
@@ -0,0 +1,191 @@
+import pytest
+
+from flow.io_adapter import LocalFSAdapter, LazyIOAdapter
+from flow.memory_io_adapter import MemoryIOAdapter
+from flow.path import AbsolutePath
+from flow.ranged_reader import RangedReader
+
+
+@pytest.fixture
+def local_fs(tmpdir):
+    tmpdir.join("data", "names", "name1.txt").write("Katherine", ensure=True)
+    tmpdir.join("data", "names", "name2.txt").write("Chris", ensure=True)
+    return LocalFSAdapter(root_dir=str(tmpdir))
+
+
+def test_local_fs_reading(local_fs):
+    with local_fs.reading("/data/names/name1.txt") as handle:
+        assert handle.read() == b"Katherine"
+
+
+def test_local_fs_writing_creates_dirs(local_fs):
+    with local_fs.writing("/data/greetings/hello.txt") as handle:
+        handle.write(b"Hello")
+    assert local_fs.exists("/data/greetings/hello.txt")
+
+
+def test_local_fs_glob(local_fs):
+    paths = local_fs.glob("/data/names/*.txt")
+    assert sorted(paths) == ["/data/names/name1.txt", "/data/names/name2.txt"]
+
+
+def test_download_many_reports_errors_per_item(local_fs):
+    results = local_fs.download_many(["/data/names/name1.txt", "/data/missing.txt"])
+    assert results[0].ok
+    assert open(results[0].value).read() == "Katherine"
+    assert not results[1].ok
+    assert isinstance(results[1].error, FileNotFoundError)
+
+
+def test_upload_many(local_fs, tmpdir):
+    local_file = tmpdir.join("local.txt")
+    local_file.write("uploaded")
+    results = local_fs.upload_many(
+        [(str(local_file), "/out/a.txt"), (str(local_file), "/out/b.txt")]
+    )
+    assert all(result.ok for result in results)
+    assert [result.path for result in results] == ["/out/a.txt", "/out/b.txt"]
+    assert local_fs.exist(["/out/a.txt", "/out/b.txt"]) == [True, True]
+
+
+def test_stat_many(local_fs):
+    results = local_fs.stat_many(["/data/names/name2.txt", "/data/missing.txt"])
+    stat, missing = [result.value for result in results]
+    assert stat.path == AbsolutePath("/data/names/name2.txt")
+    assert stat.size == len("Chris")
+    assert missing is None
+
+
+def test_reading_mapped(local_fs):
+    with local_fs.reading_mapped("/data/names/name1.txt") as view:
+        assert view.readonly
+        assert bytes(view[:4]) == b"Kath"
+
+
+def test_read_range(local_fs):
+    assert local_fs.read_range("/data/names/name1.txt", 4, 3) == b"eri"
+    assert local_fs.read_range("/data/names/name1.txt", 7, 100) == b"ne"
+
+
+def test_open_ranged_seeks_and_caches_blocks(local_fs):
+    # "Katherine" in blocks of 4 bytes: "Kath", "erin", "e"
+    with local_fs.open_ranged("/data/names/name1.txt", block_size=4) as handle:
+        handle.seek(-2, 2)
+        assert handle.read() == b"ne"
+        assert handle.fetches == 2
+        handle.seek(0)
+        assert handle.read(2) == b"Ka"
+        assert handle.read(2) == b"th"
+        assert handle.read() == b"erine"
+        assert handle.fetches == 3  # the last two blocks were still cached
+
+
+def test_open_ranged_missing_file(local_fs):
+    with pytest.raises(FileNotFoundError):
+        local_fs.open_ranged("/data/missing.txt")
+
+
+def test_open_ranged_reads_ahead_when_sequential(local_fs):
+    with local_fs.open_ranged(
+        "/data/names/name1.txt", block_size=2, read_ahead=2
+    ) as handle:
+        assert handle.read(2) == b"Ka"
+        assert handle.fetches == 1
+        assert handle.read(2) == b"th"
+        assert handle.fetches == 4  # blocks 2 and 3 were prefetched
+
+
+def test_ranged_reader_fails_on_short_fetch():
+    data = b"truncated"
+    reader = RangedReader(lambda offset, length: data[offset : offset + length], 20, 8)
+    with pytest.raises(IOError):
+        reader.read(20)
+
+
+def test_open_ranged_reads_only_the_stat_generation():
+    memory = MemoryIOAdapter({"/data/a.txt": b"a long original"})
+    with memory.open_ranged("/data/a.txt", block_size=4) as handle:
+        assert handle.read(4) == b"a lo"
+        memory.put("/data/a.txt", b"short")
+        with pytest.raises(FileNotFoundError):
+            handle.read()
+
+
+def test_local_fs_index_tracks_own_writes(local_fs):
+    assert local_fs.glob("/data/greetings/*") == []
+    with local_fs.writing("/data/greetings/hello.txt") as handle:
+        handle.write(b"Hello")
+    assert local_fs.glob("/data/greetings/*") == ["/data/greetings/hello.txt"]
+
+
+def test_local_fs_index_notices_events(local_fs, tmpdir):
+    local_fs.glob("/data/*")  # builds the index
+    tmpdir.join("data", "names", "name3.txt").write("Ludwig")
+    local_fs.notice_created(str(tmpdir.join("data", "names", "name3.txt")))
+    local_fs.notice_deleted(str(tmpdir.join("data", "names", "name1.txt")))
+    names = local_fs.glob("/data/names/*.txt")
+    assert names == ["/data/names/name2.txt", "/data/names/name3.txt"]
+    local_fs.notice_deleted(str(tmpdir.join("data")))
+    assert local_fs.glob("/data/*") == []
+
+
+def test_local_fs_changing_root_resets_index(local_fs, tmpdir):
+    assert local_fs.glob("/data/names/*")
+    local_fs.root_dir = str(tmpdir.join("data"))
+    assert local_fs.glob("/names/*") == ["/names/name1.txt", "/names/name2.txt"]
+
+
+def test_lazy_io_adapter_forwards_to_configured_backend(local_fs):
+    lazy = LazyIOAdapter()
+    lazy.configure(local_fs)
+    assert lazy.exists("/data/names/name1.txt")
+    lazy.root_dir = "/somewhere/else"
+    assert local_fs.root_dir == "/somewhere/else"
+
+
+@pytest.fixture(params=["local", "memory"])
+def claimable(request, tmpdir):
+    if request.param == "local":
+        return LocalFSAdapter(root_dir=str(tmpdir))
+    return MemoryIOAdapter()
+
+
+def test_delete_updates_file_list(claimable):
+    with claimable.writing("/data/out.txt") as open_file:
+        open_file.write(b"out")
+    assert claimable.glob("/data/*.txt") == ["/data/out.txt"]
+    assert claimable.delete("/data/out.txt")
+    assert not claimable.exists("/data/out.txt")
+    assert claimable.glob("/data/*.txt") == []
+    assert not claimable.delete("/data/out.txt")
+
+
+def test_claims_are_exclusive(claimable):
+    claim = claimable.claim("/data/out.txt", "worker-1", ttl=60)
+    assert claim.owner == "worker-1"
+    assert claimable.exists(claim.path)
+    assert claimable.claim("/data/out.txt", "worker-2", ttl=60) is None
+    assert claimable.release(claim)
+    assert not claimable.exists(claim.path)
+    assert claimable.claim("/data/out.txt", "worker-2", ttl=60) is not None
+
+
+def test_expired_claims_are_taken_over_once(claimable):
+    expired = claimable.claim("/data/out.txt", "worker-1", ttl=-1)
+    claims = [claimable.claim("/data/out.txt", f"worker-{i}", ttl=60) for i in [2, 3]]
+    assert claims[0] is not None and claims[1] is None
+    # the first worker's claim was taken over, so it can no longer release it
+    assert not claimable.release(expired)
+    assert claimable.release(claims[0])
+
+
+def test_concurrent_claims_have_one_winner(claimable):
+    from flow.util import io_executor
+
+    claims = list(
+        io_executor().map(
+            lambda i: claimable.claim("/data/out.txt", f"worker-{i}", ttl=60),
+            range(16),
+        )
+    )
+    assert len([claim for claim in claims if claim is not None]) == 1
@@ -1,6 +1,8 @@
 import json
 
 from flow.queue import LocalEnqueuer, GCPullTasksEnqueuer
+from flow.queue.sqlite import SQLiteQueue
+from flow.job_spec import JobSpec
 from flow import io_adapter
 from flow.io_adapter import GCStorageAdapter
 import logging
@@ -29,3 +31,149 @@ io_adapter.io = GCStorageAdapter()
 def test_remote_job_enqueuer(noop_job_spec):
     enqueuer = GCPullTasksEnqueuer()
     enqueuer.add([noop_job_spec])
+
+
+def test_local_job_enqueuer_isolates_failures(local_tasks):
+    hello = JobSpec({}, "/data/hello.txt", "/tasks/hello.py")
+    broken = JobSpec({}, "/data/broken.txt", "/tasks/broken.py")
+    enqueuer = LocalEnqueuer(num_workers=2, job_timeout=30)
+    completions = {
+        JobSpec.from_json(completion.item).output: completion
+        for completion in enqueuer.execute([hello, broken])
+    }
+    assert completions["/data/hello.txt"].ok
+    assert "ValueError: broken" in completions["/data/broken.txt"].error
+    assert local_tasks.join("data", "hello.txt").read() == "Hello!"
+
+
+def test_gctasks_enqueuer_batches_task_creation(local_tasks, fake_tasks_client):
+    from flow.queue import GCTasksEnqueuer
+
+    enqueuer = GCTasksEnqueuer(client=fake_tasks_client, new_http=None)
+    enqueuer.add(
+        [JobSpec({"i": i}, f"/data/{i}.txt", "/tasks/hello.py") for i in range(25)]
+    )
+    assert len(fake_tasks_client.created) == 25
+    assert fake_tasks_client.batches == [25]
+    assert enqueuer.metrics.counters["succeeded"] == 25
+
+
+def test_gcpulltasks_enqueuer_requeues_only_failed_requests(
+    local_tasks, fake_tasks_client
+):
+    import base64
+    from collections import Counter
+
+    attempts = Counter()
+
+    def fail(request):
+        payload = request.kwargs["body"]["task"]["pullMessage"]["payload"]
+        job_spec = JobSpec.from_json(base64.b64decode(payload).decode())
+        attempts[payload] += 1
+        if job_spec.bindings["i"] % 7 == 0 and attempts[payload] == 1:
+            return 429
+
+    fake_tasks_client.fail = fail
+    enqueuer = GCPullTasksEnqueuer(client=fake_tasks_client, new_http=None)
+    enqueuer.submitter.initial_backoff = 0
+    job_specs = [
+        JobSpec({"i": i}, f"/data/{i}.txt", "/tasks/hello.py") for i in range(30)
+    ]
+    enqueuer.add(job_specs)
+    payloads = [
+        base64.b64decode(task["pullMessage"]["payload"]).decode()
+        for task in fake_tasks_client.created
+    ]
+    assert sorted(payloads) == sorted(job_spec.to_json() for job_spec in job_specs)
+    assert enqueuer.metrics.counters["retried"] == 5
+
+
+def test_in_flight_set_expires_identities(monkeypatch):
+    from flow.queue.enqueuer import InFlightSet
+
+    now = [1000.0]
+    monkeypatch.setattr("flow.queue.enqueuer.time.time", lambda: now[0])
+    in_flight = InFlightSet(ttl=10, max_size=2)
+    assert in_flight.add("a")
+    assert not in_flight.add("a")
+    now[0] += 5
+    assert in_flight.add("b")
+    now[0] += 6
+    assert "a" not in in_flight and "b" in in_flight
+    assert in_flight.add("a")
+    assert in_flight.add("c")
+    assert len(in_flight) == 2  # "b" was evicted to stay under max_size
+
+
+def test_enqueuers_skip_jobs_in_flight(local_tasks, fake_tasks_client, tmpdir):
+    from flow.queue import GCTasksEnqueuer
+
+    job_specs = [
+        JobSpec({"i": i}, f"/data/{i}.txt", "/tasks/hello.py") for i in range(3)
+    ]
+    enqueuer = GCTasksEnqueuer(client=fake_tasks_client, new_http=None)
+    enqueuer.add(job_specs)
+    enqueuer.add(job_specs + job_specs)
+    assert enqueuer.metrics.counters["succeeded"] == 3
+    assert enqueuer.metrics.counters["ignored"] == 0
+    names = [task["name"] for task in fake_tasks_client.created]
+    assert names == [enqueuer.task_name(job_spec.identity) for job_spec in job_specs]
+
+    queue = SQLiteQueue(str(tmpdir.join("queue.sqlite")))
+    queue.add(job_specs)
+    # a second enqueuer process has its own in-flight set
+    SQLiteQueue(queue.path).add(job_specs)
+    assert queue.counts()["available"] == 3
+
+
+def test_gctasks_enqueuer_treats_existing_tasks_as_created(
+    local_tasks, fake_tasks_client
+):
+    from flow.queue import GCTasksEnqueuer
+
+    job_spec = JobSpec({}, "/data/hello.txt", "/tasks/hello.py")
+    GCTasksEnqueuer(client=fake_tasks_client, new_http=None).add([job_spec])
+    # e.g. enqueued by another instance of the task handler
+    enqueuer = GCTasksEnqueuer(client=fake_tasks_client, new_http=None)
+    enqueuer.add([job_spec])
+    assert enqueuer.metrics.counters["ignored"] == 1
+    assert len(fake_tasks_client.created) == 1
+
+
+def test_in_flight_set_indexes_dependency_paths():
+    from flow.queue.enqueuer import InFlightSet
+
+    in_flight = InFlightSet(max_size=2)
+    in_flight.add("a", ["/tasks/t.py", "/data/x.txt"])
+    in_flight.add("b", ["/tasks/t.py", "/data/y.txt"])
+    assert in_flight.dependents(["/data/x.txt"]) == {"a"}
+    assert in_flight.dependents(["/tasks/t.py"]) == {"a", "b"}
+    in_flight.add("c", ["/data/x.txt"])  # evicts "a"
+    assert in_flight.dependents(["/data/x.txt"]) == {"c"}
+    in_flight.discard("c")
+    assert in_flight.dependents(["/data/x.txt"]) == set()
+
+
+def test_enqueuers_cancel_jobs_of_deleted_inputs(
+    local_tasks, fake_tasks_client, tmpdir
+):
+    job_specs = [
+        JobSpec({"name": f"/data/{i}.txt"}, f"/out/{i}.txt", "/tasks/hello.py")
+        for i in range(3)
+    ]
+    enqueuer = GCPullTasksEnqueuer(client=fake_tasks_client, new_http=None)
+    enqueuer.add(job_specs)
+    assert enqueuer.cancel_dependents(["/data/1.txt"]) == 1
+    names = [task["name"] for task in fake_tasks_client.created]
+    assert enqueuer.task_name(job_specs[1].identity) not in names
+    assert len(names) == 2
+    # cancelled jobs can be enqueued again
+    enqueuer.add(job_specs)
+    assert len(fake_tasks_client.created) == 3
+
+    queue = SQLiteQueue(str(tmpdir.join("queue.sqlite")))
+    queue.add(job_specs)
+    leased = queue.lease(1)
+    assert queue.cancel_dependents(["/tasks/hello.py"]) == 2
+    assert queue.counts() == dict(available=0, leased=1, dead=0)
+    assert queue.ack(leased[0])
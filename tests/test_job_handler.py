@@ -1 +1,37 @@
+import asyncio
+import time
+
+from flow.async_io_adapter import ExecutorAsyncIOAdapter
 from flow.event_handler import JobEventHandler
+from flow.job_spec import JobSpec, io
+from flow.memory_io_adapter import MemoryIOAdapter
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+def test_job_events_skip_current_outputs_with_overlapping_lookups():
+    memory = MemoryIOAdapter(latency=0.1)
+    job_specs = [JobSpec({}, f"/out/{i}.txt", "/tasks/hello.py") for i in range(8)]
+    for job_spec in job_specs:
+        memory.put(job_spec.output, b"done")
+    handler = JobEventHandler(async_io=ExecutorAsyncIOAdapter(memory))
+    start = time.time()
+    executed = run(handler.handle_job_events([job.to_json() for job in job_specs]))
+    assert executed == 0
+    assert memory.requests == 8
+    # one lookup after another would take 0.8s
+    assert time.time() - start < 0.4
+
+
+def test_job_events_execute_jobs_with_missing_outputs(local_tasks):
+    local_tasks.join("data", "done.txt").write("Hello!", ensure=True)
+    job_specs = [
+        JobSpec({}, "/data/done.txt", "/tasks/hello.py"),
+        JobSpec({}, "/data/hello.txt", "/tasks/hello.py"),
+    ]
+    handler = JobEventHandler()
+    assert run(handler.handle_job_events([job.to_json() for job in job_specs])) == 1
+    with io.reading("/data/hello.txt") as open_file:
+        assert open_file.read() == b"Hello!"
@@ -49,3 +49,48 @@ def test_execute(simple_job_spec, mocker):
 
   mocked_open.assert_called_once_with(simple_job_spec.output)
   file_stub.__enter__().write.assert_called_once_with(simple_job_spec.result.encode())
+
+def test_identity_is_stable_and_canonical():
+  job_spec = JobSpec({'x': 2, 'name': 'Ludwig'}, 'out.txt', 'task.py', 'abc')
+  same = JobSpec.from_json(JobSpec({'name': 'Ludwig', 'x': 2}, 'out.txt', 'task.py', 'abc').to_json())
+  assert job_spec.identity == same.identity
+  assert len(job_spec.identity) == 64
+
+def test_identity_changes_with_task_source_bindings_and_output():
+  job_spec = JobSpec({'x': 2}, 'out.txt', 'task.py', 'abc')
+  others = [
+    JobSpec({'x': 2}, 'out.txt', 'task.py', 'def'),
+    JobSpec({'x': 3}, 'out.txt', 'task.py', 'abc'),
+    JobSpec({'x': 2}, 'other.txt', 'task.py', 'abc'),
+  ]
+  assert all(other.identity != job_spec.identity for other in others)
+
+def test_execute_skips_claimed_or_existing_outputs(local_tasks, monkeypatch):
+  monkeypatch.setattr(JobSpec, 'claim_ttl', 60)
+  job_spec = JobSpec({}, '/data/hello.txt', '/tasks/hello.py')
+  claim = flow.job_spec.io.claim('/data/hello.txt', 'other-worker', 60)
+  assert job_spec.execute() is None
+  assert job_spec.skipped
+  flow.job_spec.io.release(claim)
+  assert job_spec.execute() == 'Hello!'
+  assert not job_spec.skipped
+  # the claim was released after saving
+  assert not local_tasks.join('.flow', 'claims', 'data', 'hello.txt.claim').exists()
+  assert job_spec.execute() is None
+  assert job_spec.skipped
+
+def test_executed_job_specs_still_serialize(local_tasks, monkeypatch):
+  monkeypatch.setattr(JobSpec, 'claim_ttl', 60)
+  job_spec = JobSpec({}, '/data/hello.txt', '/tasks/hello.py')
+  job_spec.execute()
+  assert JobSpec.from_json(job_spec.to_json()) == job_spec
+  assert job_spec.execute() is None
+  assert job_spec.skipped
+  assert JobSpec.from_json(job_spec.to_json()) == job_spec
+
+def test_execute_releases_claims_of_failing_jobs(local_tasks, monkeypatch):
+  monkeypatch.setattr(JobSpec, 'claim_ttl', 60)
+  job_spec = JobSpec({}, '/data/broken.txt', '/tasks/broken.py')
+  with raises(ValueError):
+    job_spec.execute()
+  assert flow.job_spec.io.claim('/data/broken.txt', 'other-worker', 60)
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from flow.io_adapter import LocalFSAdapter
+from flow.job_spec import io
+from flow.manifest import (
+    ManifestWriter,
+    append_to_manifest,
+    read_index,
+    read_manifest,
+    write_manifest,
+)
+from flow.task_spec import IterableInputSpec, OutputSpec, TaskSpec
+
+
+@pytest.fixture
+def storage(tmpdir):
+    previous = io.adapter
+    io.configure(LocalFSAdapter(root_dir=str(tmpdir)))
+    yield tmpdir
+    io.configure(previous)
+
+
+def task_spec(numbers, source_hash="v1"):
+    inputs = [IterableInputSpec("number", numbers), IterableInputSpec("kind", "ab")]
+    output = OutputSpec.build("/out/{number}-{kind}.txt")
+    return TaskSpec(inputs, output, "/tasks/count.py", "count.py", source_hash)
+
+
+def test_write_manifest_in_shards(storage):
+    assert write_manifest(task_spec(range(5)), shard_size=3) == 10
+    index = read_index("/tasks/count.json")
+    assert index["count"] == 10
+    assert index["keys"] == ["number", "kind"]
+    assert len(index["shards"]) == 4
+    rows = sorted(read_manifest("/tasks/count.json"))
+    assert rows == sorted([n, k] for n in range(5) for k in "ab")
+
+
+def test_append_to_manifest_adds_delta_shard(storage):
+    write_manifest(task_spec(range(2)))
+    shard = storage.join("tasks", "count.manifest", "00000.jsonl")
+    written = shard.read()
+    new = [{"number": 7, "kind": "a"}, {"number": 7, "kind": "b"}]
+    assert append_to_manifest(task_spec(range(2)), new) == 2
+    assert shard.read() == written
+    assert read_index("/tasks/count.json")["count"] == 6
+    assert [7, "b"] in list(read_manifest("/tasks/count.json"))
+
+
+def test_append_rewrites_manifest_of_changed_task(storage):
+    write_manifest(task_spec(range(2)))
+    assert append_to_manifest(task_spec(range(3), "v2"), []) == 6
+    assert read_index("/tasks/count.json")["source_hash"] == "v2"
+
+
+def test_old_manifest_is_rewritten(storage):
+    storage.join("tasks", "count.json").write(json.dumps({"bindings": {}}), ensure=True)
+    assert read_index("/tasks/count.json") is None
+    writer = ManifestWriter()
+    writer.write_if_needed(task_spec(range(2)))
+    writer.write_if_needed(task_spec(range(2)))
+    writer.close()
+    assert read_index("/tasks/count.json")["count"] == 4
+    assert writer.metrics.counters["written_rows"] == 4
+
+
+def test_append_skips_listed_jobs(storage):
+    write_manifest(task_spec(range(2)))
+    listed = {}
+    old = [{"number": 1, "kind": "a"}, {"number": 1, "kind": "b"}]
+    for _ in range(3):
+        assert append_to_manifest(task_spec(range(2)), old, listed=listed) == 0
+    new = [{"number": 7, "kind": "a"}] * 2
+    assert append_to_manifest(task_spec(range(2)), new, listed=listed) == 1
+    assert append_to_manifest(task_spec(range(2)), new, listed=listed) == 0
+    index = read_index("/tasks/count.json")
+    assert (index["count"], len(index["shards"])) == (5, 2)
+
+
+def test_append_compacts_delta_shards(storage):
+    write_manifest(task_spec(range(2)))
+    for number in range(10, 14):
+        new = [{"number": number, "kind": "a"}]
+        append_to_manifest(task_spec(range(2)), new, max_deltas=3)
+    index = read_index("/tasks/count.json")
+    assert index["count"] == 8
+    assert len(index["shards"]) == 1 and "/delta-" not in index["shards"][0]
+    assert len(storage.join("tasks", "count.manifest").listdir()) == 1
+    assert sorted(read_manifest("/tasks/count.json"))[-1] == [13, "a"]
@@ -0,0 +1,66 @@
+import pytest
+
+from flow.memory_io_adapter import MemoryIOAdapter, SimulatedIOError
+
+
+@pytest.fixture
+def memory_io():
+    return MemoryIOAdapter({"/data/names/name1.txt": b"Katherine"})
+
+
+def test_reading_and_writing(memory_io):
+    with memory_io.writing("/data/greetings/hello.txt", mode="w") as handle:
+        handle.write("Hello")
+    with memory_io.reading("/data/greetings/hello.txt") as handle:
+        assert handle.read() == b"Hello"
+
+
+def test_generations_increase_on_every_write(memory_io):
+    first = memory_io.stat("/data/names/name1.txt")
+    memory_io.put("/data/names/name1.txt", b"Chris")
+    second = memory_io.stat("/data/names/name1.txt")
+    assert second.generation > first.generation
+    assert second.size == len("Chris")
+
+
+def test_file_list_is_kept_in_sync(memory_io):
+    memory_io.put("/data/names/name2.txt", b"Chris")
+    assert memory_io.glob("/data/names/*") == [
+        "/data/names/name1.txt",
+        "/data/names/name2.txt",
+    ]
+    memory_io.delete("/data/names/name1.txt")
+    assert memory_io.file_list.glob(memory_io.normpath("/data/*")) == [
+        "/data/names/name2.txt"
+    ]
+    assert memory_io.exist(["/data/names/name1.txt"]) == [False]
+
+
+def test_delete_is_a_request(memory_io):
+    assert memory_io.delete("/data/names/name1.txt")
+    assert not memory_io.delete("/data/names/name1.txt")
+    assert memory_io.requests == 2
+
+
+def test_download_and_read_range(memory_io):
+    local_path = memory_io.download("/data/names/name1.txt")
+    assert open(local_path, "rb").read() == b"Katherine"
+    assert memory_io.read_range("/data/names/name1.txt", 4, 3) == b"eri"
+    with pytest.raises(FileNotFoundError):
+        memory_io.download("/data/missing.txt")
+
+
+def test_injected_failures_are_reported_per_item():
+    memory_io = MemoryIOAdapter({"/a": b"a"}, failure_rate=1.0)
+    with pytest.raises(SimulatedIOError):
+        memory_io.download("/a")
+    results = memory_io.download_many(["/a", "/a"])
+    assert all(isinstance(result.error, SimulatedIOError) for result in results)
+
+
+def test_injected_latency_and_bandwidth(mocker):
+    sleep = mocker.patch("flow.memory_io_adapter.time.sleep")
+    memory_io = MemoryIOAdapter({"/a": b"x" * 100}, latency=0.5, bandwidth=100)
+    memory_io.download("/a")
+    sleep.assert_called_once_with(1.5)
+    assert memory_io.requests == 1
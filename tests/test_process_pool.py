@@ -0,0 +1,84 @@
+import os
+import time
+
+import pytest
+
+from flow.process_pool import IsolatedProcessPool
+
+
+def square(x):
+    return x * x
+
+
+def fail_on_three(x):
+    if x == 3:
+        raise ValueError("three")
+    return x
+
+
+def sleep_for(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def crash(x):
+    os._exit(1)
+
+
+def allocate(num_bytes):
+    data = b"x" * num_bytes  # touches every page, unlike a zeroed bytearray
+    time.sleep(5)
+    return len(data)
+
+
+def reserve(num_bytes):
+    import mmap
+
+    return len(mmap.mmap(-1, num_bytes))  # mapped, but never resident
+
+
+@pytest.fixture
+def pool():
+    with IsolatedProcessPool(num_workers=2, timeout=2) as pool:
+        yield pool
+
+
+def test_imap_unordered(pool):
+    completions = list(pool.imap_unordered(square, range(10)))
+    assert sorted(c.result for c in completions) == [x * x for x in range(10)]
+    assert all(c.ok for c in completions)
+
+
+def test_failures_are_isolated(pool):
+    completions = {c.item: c for c in pool.imap_unordered(fail_on_three, range(5))}
+    assert not completions[3].ok
+    assert "ValueError: three" in completions[3].error
+    assert [completions[i].result for i in [0, 1, 2, 4]] == [0, 1, 2, 4]
+
+
+def test_timeouts_kill_only_the_slow_item():
+    with IsolatedProcessPool(num_workers=2, timeout=0.5) as pool:
+        completions = {c.item: c for c in pool.imap_unordered(sleep_for, [5, 0.01])}
+        assert "Timed out" in completions[5].error
+        assert completions[0.01].ok
+        # the killed worker was replaced
+        assert pool.run(square, 4).result == 16
+
+
+def test_crashed_worker_is_replaced(pool):
+    assert "died" in pool.run(crash, None).error
+    assert pool.run(square, 3).result == 9
+
+
+def test_memory_limit():
+    with IsolatedProcessPool(num_workers=1, max_rss_bytes=128 * 1024 ** 2) as pool:
+        start = time.perf_counter()
+        completion = pool.run(allocate, 256 * 1024 ** 2)
+        assert "128 MB" in completion.error
+        assert time.perf_counter() - start < 4
+        assert pool.run(square, 3).result == 9
+
+
+def test_memory_limit_ignores_reserved_address_space():
+    with IsolatedProcessPool(num_workers=1, max_rss_bytes=128 * 1024 ** 2) as pool:
+        assert pool.run(reserve, 1024 ** 3).result == 1024 ** 3
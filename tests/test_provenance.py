@@ -0,0 +1,98 @@
+import pytest
+
+from flow.job_spec import JobSpec, io
+from flow.memory_io_adapter import MemoryIOAdapter
+from flow.provenance import ProvenanceStore, provenance_store
+
+
+@pytest.fixture
+def memory():
+    previous = io.adapter
+    memory_io = MemoryIOAdapter(
+        {
+            "/tasks/greet.py": b"",
+            "/tasks/all.py": b"",
+            "/names/ann.txt": b"ann",
+            "/names/bob.txt": b"bob",
+        }
+    )
+    io.configure(memory_io)
+    yield memory_io
+    io.configure(previous)
+
+
+@pytest.fixture
+def store(tmpdir):
+    return ProvenanceStore(str(tmpdir.join("provenance.sqlite")))
+
+
+def greet(name):
+    bindings = {"name": f"/names/{name}.txt", "greeting": "hi"}
+    return JobSpec(bindings, f"/out/{name}.txt", "/tasks/greet.py", "v1")
+
+
+def everyone():
+    bindings = {"names": {"name": "/names/{name}.txt"}}
+    return JobSpec(bindings, "/out/all.txt", "/tasks/all.py", "v1")
+
+
+def test_record_resolves_inputs(memory, store):
+    store.record(greet("ann"))
+    store.record(everyone())
+    assert len(store) == 2
+    assert store.inputs("/out/ann.txt") == ["/names/ann.txt"]
+    assert store.inputs("/out/all.txt") == ["/names/ann.txt", "/names/bob.txt"]
+    record = store.get("/out/ann.txt")
+    assert record.to_job_spec() == greet("ann")
+    assert store.get("/out/missing.txt") is None
+
+
+def test_recording_again_replaces_record(memory, store):
+    store.record(greet("ann"), inputs=["/names/old.txt"])
+    store.record(greet("ann"))
+    assert len(store) == 1
+    assert store.inputs("/out/ann.txt") == ["/names/ann.txt"]
+
+
+def test_dependents_of_inputs_and_tasks(memory, store):
+    for job_spec in [greet("ann"), greet("bob"), everyone()]:
+        store.record(job_spec)
+    outputs = lambda records: [record.output for record in records]
+    assert outputs(store.dependents(["/names/bob.txt"])) == [
+        "/out/all.txt",
+        "/out/bob.txt",
+    ]
+    assert outputs(store.dependents(["/tasks/greet.py"])) == [
+        "/out/ann.txt",
+        "/out/bob.txt",
+    ]
+    assert store.dependents(["/names/eve.txt"]) == []
+
+
+def test_remove_orphans(memory, store):
+    for job_spec in [greet("ann"), greet("bob"), everyone()]:
+        store.record(job_spec)
+        memory.put(job_spec.output, b"result")
+    memory.delete("/names/bob.txt")
+    orphans = store.remove_orphans(delete_outputs=True)
+    assert [orphan.output for orphan in orphans] == ["/out/all.txt", "/out/bob.txt"]
+    assert len(store) == 1
+    assert not io.exists("/out/bob.txt")
+    assert io.exists("/out/ann.txt")
+
+
+def test_execute_records_provenance(local_tasks, monkeypatch):
+    path = str(local_tasks.join("provenance.sqlite"))
+    monkeypatch.setenv("FLOW_PROVENANCE_PATH", path)
+    job_spec = JobSpec({}, "/data/hello.txt", "/tasks/hello.py", "v1")
+    job_spec.execute()
+    record = provenance_store().get("/data/hello.txt")
+    assert (record.task_path, record.task_hash) == ("/tasks/hello.py", "v1")
+
+
+def test_producing_orphaned_output_again_clears_mark(memory, store):
+    store.record(greet("ann"))
+    store.mark_orphaned(["/out/ann.txt"])
+    assert store.orphaned() == ["/out/ann.txt"]
+    store.record(greet("ann"))
+    assert store.orphaned() == []
@@ -0,0 +1,65 @@
+import pytest
+
+from flow.job_spec import JobSpec
+from flow.process_pool import IsolatedProcessPool
+from flow.pull_worker import PullWorker
+from flow.queue.sqlite import SQLiteQueue
+
+
+@pytest.fixture
+def queue(tmpdir):
+    return SQLiteQueue(str(tmpdir.join("queue.sqlite")), max_attempts=2)
+
+
+def payload(name):
+    return JobSpec({}, f"/data/{name}.txt", f"/tasks/{name}.py").to_json()
+
+
+def run_worker(queue, num_workers=2, **kwargs):
+    with IsolatedProcessPool(num_workers, timeout=30) as pool:
+        worker = PullWorker(queue, pool, min_backoff=0.01, max_backoff=0.01, **kwargs)
+        worker.run(max_empty_polls=2)
+    return worker.metrics.counters
+
+
+def test_pull_worker_acks_finished_jobs(local_tasks, queue):
+    queue.insert([payload("hello")] * 5)
+    counters = run_worker(queue)
+    assert counters["acked"] == 5
+    assert queue.counts() == dict(available=0, leased=0, dead=0)
+    assert local_tasks.join("data", "hello.txt").read() == "Hello!"
+
+
+def test_pull_worker_nacks_failed_jobs(local_tasks, queue):
+    queue.insert([payload("broken"), payload("hello")])
+    counters = run_worker(queue)
+    assert counters["acked"] == 1
+    assert counters["nacked"] == 2
+    (dead,) = queue.dead_letters()
+    assert "ValueError: broken" in dead.last_error
+
+
+def test_pull_worker_renews_leases_of_long_jobs(local_tasks, queue):
+    queue.insert([payload("slow")])
+    counters = run_worker(queue, lease_seconds=0.4, renew_margin=0.2)
+    assert counters["renewed"] >= 1
+    assert counters["acked"] == 1
+    assert counters["leased"] == 1
+
+
+def test_pull_worker_leases_only_free_capacity(local_tasks, queue):
+    queue.insert([payload("slow")] * 3)
+    with IsolatedProcessPool(2, timeout=30) as pool:
+        worker = PullWorker(queue, pool)
+        worker._lease()
+        assert queue.counts()["available"] == 1
+        worker.stop()
+        worker.run()
+    assert worker.metrics.counters["acked"] == 2
+
+
+def test_parse_cloud_tasks_timestamps():
+    from flow.queue.gcpulltasks import _parse_timestamp
+
+    assert _parse_timestamp("1970-01-01T00:01:00Z") == 60.0
+    assert _parse_timestamp("1970-01-01T00:01:00.250000Z") == 60.25
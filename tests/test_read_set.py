@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+from flow.job_spec import JobSpec, io
+from flow.memory_io_adapter import MemoryIOAdapter
+from flow.provenance import ProvenanceStore
+from flow.read_set import record_read, tracking_reads
+from flow.staleness import StalenessPlanner
+from flow.task_spec import DependentInputSpec
+
+
+@pytest.fixture
+def memory():
+    previous = io.adapter
+    memory_io = MemoryIOAdapter({"/models/a.json": b"[1, 2]"})
+    io.configure(memory_io)
+    yield memory_io
+    io.configure(previous)
+
+
+def test_read_sets_nest():
+    record_read("/untracked.txt")
+    with tracking_reads() as outer:
+        record_read("/a.txt", 3)
+        with tracking_reads() as inner:
+            record_read("/b.txt")
+            record_read("/a.txt")
+        assert inner == {"/b.txt": None, "/a.txt": None}
+    assert outer == {"/a.txt": 3, "/b.txt": None}
+
+
+def test_reads_record_generations(memory):
+    with tracking_reads() as reads:
+        with io.reading("/models/a.json") as open_file:
+            open_file.read()
+    assert reads == {"/models/a.json": memory.stat("/models/a.json").generation}
+
+
+def test_bulk_downloads_record_generations(memory):
+    memory.put("/models/b.json", b"[3]")
+    with tracking_reads() as reads:
+        io.download_many(["/models/a.json", "/models/b.json"])
+    paths = ["/models/a.json", "/models/b.json"]
+    assert reads == {path: memory.stat(path).generation for path in paths}
+    assert None not in reads.values()
+
+
+def test_local_reads_are_recorded_without_generation(local_tasks):
+    with tracking_reads() as reads:
+        io.download("/tasks/hello.py")
+    assert reads == {"/tasks/hello.py": None}
+
+
+def test_execute_records_read_set(local_tasks):
+    local_tasks.join("models", "a.json").write("[1, 2]", ensure=True)
+    local_tasks.join("tasks", "count.py").write(
+        "from flow.job_spec import io\n\n"
+        "def main():\n"
+        "  with io.reading('/models/a.json') as open_file:\n"
+        "    return str(len(open_file.read()))\n"
+    )
+    job_spec = JobSpec({}, "/data/count.txt", "/tasks/count.py")
+    assert job_spec.execute() == "6"
+    generation = io.stat("/models/a.json").generation
+    assert job_spec.reads == {"/models/a.json": generation}
+
+
+def test_changed_reads_make_jobs_stale(memory, tmpdir):
+    store = ProvenanceStore(str(tmpdir.join("provenance.sqlite")))
+    memory.put("/tasks/count.py", b"")
+    memory.put("/data/count.txt", b"2")
+    job_spec = JobSpec({}, "/data/count.txt", "/tasks/count.py")
+    generation = memory.stat("/models/a.json").generation
+    store.record(job_spec, reads={"/models/a.json": generation})
+    assert store.reads(["/data/count.txt"]) == {
+        "/data/count.txt": {"/models/a.json": generation}
+    }
+    planner = StalenessPlanner(provenance=store)
+    assert list(planner.stale([job_spec])) == []
+    # an older copy, so only its generation tells it changed
+    memory.put("/models/a.json", b"[1, 2, 3]")
+    memory.objects["/models/a.json"] = memory.objects["/models/a.json"]._replace(
+        updated=time.time() - 60
+    )
+    memory.file_list.add(memory.normpath("/models/a.json"))
+    assert list(planner.stale([job_spec])) == [job_spec]
+    assert planner.metrics.counters["reads_changed"] == 1
+
+
+def test_dependent_inputs_record_reads_of_their_function(memory):
+    def layers(model):
+        with io.reading(f"/models/{model}.json") as open_file:
+            return open_file.read().decode().strip("[]").split(", ")
+
+    input_spec = DependentInputSpec("layer", layers)
+    assert input_spec.values("layer", {"model": "a"}) == ["1", "2"]
+    assert list(input_spec.reads) == ["/models/a.json"]
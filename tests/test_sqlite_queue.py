@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from flow.process_pool import IsolatedProcessPool
+from flow.queue.sqlite import SQLiteQueue
+
+
+@pytest.fixture
+def queue(tmpdir):
+    return SQLiteQueue(str(tmpdir.join("queue.sqlite")), max_attempts=2)
+
+
+def test_sqlite_queue_lease_and_ack(queue):
+    assert queue.insert(["a", "b", "c"]) == 3
+    leased = queue.lease(2, lease_seconds=60)
+    assert [task.payload for task in leased] == ["a", "b"]
+    assert [task.payload for task in queue.lease(5)] == ["c"]
+    assert queue.lease(5) == []
+    assert all(queue.ack(task) for task in leased)
+    assert queue.counts() == dict(available=0, leased=1, dead=0)
+
+
+def test_sqlite_queue_expired_leases_are_released(queue):
+    queue.insert(["a"])
+    (first,) = queue.lease(1, lease_seconds=0.05)
+    time.sleep(0.1)
+    (second,) = queue.lease(1)
+    assert second.attempts == 2
+    # the first worker lost its lease
+    assert not queue.ack(first)
+    assert not queue.renew([first])
+    assert queue.renew([second])
+    assert queue.ack(second)
+
+
+def test_sqlite_queue_nack_retries_then_dead_letters(queue):
+    queue.insert(["a"])
+    (task,) = queue.lease(1)
+    assert queue.nack(task, error="first", delay=60)
+    assert queue.lease(1) == []
+    queue.connection.execute("UPDATE tasks SET available_at = 0")
+    (task,) = queue.lease(1)
+    assert task.attempts == 2
+    assert queue.nack(task, error="second")
+    assert queue.lease(1) == []
+    (dead,) = queue.dead_letters()
+    assert (dead.payload, dead.attempts, dead.last_error) == ("a", 2, "second")
+
+
+def test_sqlite_queue_dead_letters_exhausted_leases(queue):
+    queue.insert(["a"])
+    queue.lease(1, lease_seconds=0)
+    queue.lease(1, lease_seconds=0)
+    assert queue.lease(1) == []
+    assert queue.dead_letters()[0].last_error == "Lease expired."
+
+
+def drain(queue):
+    payloads = []
+    while True:
+        leased = queue.lease(10)
+        if not leased:
+            return payloads
+        for task in leased:
+            assert queue.ack(task)
+            payloads.append(task.payload)
+
+
+def test_sqlite_queue_concurrent_workers(queue):
+    expected = [str(i) for i in range(500)]
+    queue.insert(expected)
+    with IsolatedProcessPool(num_workers=4, timeout=60) as pool:
+        completions = list(pool.imap_unordered(drain, [queue] * 4))
+    assert all(completion.ok for completion in completions)
+    drained = [payload for c in completions for payload in c.result]
+    assert sorted(drained) == sorted(expected)
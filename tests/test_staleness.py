@@ -0,0 +1,183 @@
+import time
+
+import pytest
+from absl import flags
+
+from flow.event_handler import FileEventHandler
+from flow.file_list import FileStat
+from flow.job_spec import JobSpec, io
+from flow.memory_io_adapter import MemoryIOAdapter
+from flow.path import AbsolutePath
+from flow.queue.enqueuer import Enqueuer
+from flow.queue.sqlite import SQLiteQueue
+from flow.staleness import StalenessPlanner, dependency_paths
+
+flags.FLAGS.mark_as_parsed()
+
+
+@pytest.fixture
+def memory():
+    previous = io.adapter
+    memory_io = MemoryIOAdapter()
+    io.configure(memory_io)
+    yield memory_io
+    io.configure(previous)
+
+
+def put(memory, path, data=b"x"):
+    # keeps update times of consecutive writes apart
+    time.sleep(0.01)
+    memory.put(path, data)
+
+
+def greet(name):
+    bindings = {"name": f"/names/{name}.txt"}
+    return JobSpec(bindings, f"/out/{name}.txt", "/tasks/greet.py", "v1")
+
+
+def test_dependency_paths_resolve_aggregating_inputs(memory):
+    put(memory, "/names/ann.txt")
+    put(memory, "/names/bob.txt")
+    bindings = {"names": {"name": "/names/{name}.txt"}, "x": 1, "title": "Hi"}
+    job_spec = JobSpec(bindings, "/out/all.txt", "/tasks/all.py")
+    paths = dependency_paths(job_spec)
+    assert paths == ["/tasks/all.py", "/names/ann.txt", "/names/bob.txt"]
+
+
+def test_stale_jobs_have_missing_or_outdated_outputs(memory):
+    put(memory, "/tasks/greet.py")
+    for name in ["ann", "bob", "cat"]:
+        put(memory, f"/names/{name}.txt")
+    put(memory, "/out/ann.txt")
+    put(memory, "/out/bob.txt")
+    put(memory, "/names/bob.txt", b"updated")
+    planner = StalenessPlanner(batch_size=2)
+    stale = list(planner.stale(greet(name) for name in ["ann", "bob", "cat"]))
+    assert [job_spec.output for job_spec in stale] == ["/out/bob.txt", "/out/cat.txt"]
+    assert planner.metrics.counters["current"] == 1
+    assert planner.metrics.counters["stale"] == 1
+    assert planner.metrics.counters["missing"] == 1
+    assert stale[0].inputs_updated == memory.stat("/names/bob.txt").updated
+
+
+def test_edited_task_makes_all_its_jobs_stale(memory):
+    put(memory, "/names/ann.txt")
+    put(memory, "/out/ann.txt")
+    put(memory, "/tasks/greet.py")
+    stale = list(StalenessPlanner().stale([greet("ann")]))
+    assert [job_spec.output for job_spec in stale] == ["/out/ann.txt"]
+    assert stale[0].inputs_updated == memory.stat("/tasks/greet.py").updated
+
+
+def test_new_aggregated_input_makes_job_stale(memory):
+    put(memory, "/tasks/all.py")
+    put(memory, "/names/ann.txt")
+    put(memory, "/out/all.txt")
+    bindings = {"names": {"name": "/names/{name}.txt"}}
+    job_spec = JobSpec(bindings, "/out/all.txt", "/tasks/all.py")
+    assert list(StalenessPlanner().stale([job_spec])) == []
+    put(memory, "/names/bob.txt")
+    assert list(StalenessPlanner().stale([job_spec])) == [job_spec]
+
+
+def test_stats_come_from_file_list_without_requests(memory):
+    put(memory, "/tasks/greet.py")
+    put(memory, "/names/ann.txt")
+    requests = memory.requests
+    planner = StalenessPlanner()
+    assert len(list(planner.stale([greet("ann")]))) == 1
+    assert planner.metrics.counters["listed"] == 2
+    # only the missing output needs a request
+    assert memory.requests == requests + 1
+
+
+def test_file_list_forgets_stats_of_paths_added_without_one():
+    file_list = MemoryIOAdapter({"/a": b"a"}).file_list
+    path = AbsolutePath("/a")
+    assert file_list.stat(path).size == 1
+    file_list.add(path)
+    assert file_list.stat(path) is None
+    assert file_list.exists(path)
+
+
+def test_output_is_current_compares_with_inputs_updated():
+    job_spec = greet("ann")
+    output = FileStat(AbsolutePath("/out/ann.txt"), 1, updated=10.0)
+    assert not job_spec.output_is_current(None)
+    assert job_spec.output_is_current(output)
+    job_spec.inputs_updated = 10.0
+    assert job_spec.output_is_current(output)
+    job_spec.inputs_updated = 11.0
+    assert not job_spec.output_is_current(output)
+    assert JobSpec.from_json(job_spec.to_json()).inputs_updated == 11.0
+
+
+def test_updated_inputs_change_identity():
+    job_spec = greet("ann")
+    identity = job_spec.identity
+    job_spec.inputs_updated = 10.0
+    assert job_spec.identity != identity
+    updated = greet("ann")
+    updated.inputs_updated = 11.0
+    assert updated.identity != job_spec.identity
+
+
+def test_sqlite_queue_requeues_jobs_with_updated_inputs(memory, tmpdir):
+    queue = SQLiteQueue(str(tmpdir.join("queue.sqlite")))
+    put(memory, "/tasks/greet.py")
+    put(memory, "/names/ann.txt")
+    queue.add([greet("ann")])
+    assert queue.counts()["available"] == 1
+    put(memory, "/out/ann.txt")
+    queue.add([greet("ann")])
+    assert queue.counts()["available"] == 1
+    put(memory, "/names/ann.txt", b"updated")
+    queue.add([greet("ann")])
+    assert queue.counts()["available"] == 2
+
+
+class PlanningEnqueuer(Enqueuer):
+    def __init__(self):
+        self.batches = []
+
+    def add(self, job_specs):
+        self.batches.append(list(self.filter_stale(job_specs)))
+
+
+def overwrite_behind_listing(memory, path, data):
+    # like an upload by another process; the listing keeps the old stat
+    time.sleep(0.01)
+    stored = memory.objects[memory.normpath(path)]
+    memory.objects[memory.normpath(path)] = stored._replace(
+        data=data, updated=time.time(), generation=stored.generation + 1
+    )
+
+
+def test_events_refresh_listed_stats_of_inputs(memory):
+    put(
+        memory,
+        "/tasks/greet.py",
+        b'name = "/names/{name_id}.txt"\noutput = "/out/{name_id}.txt"\n\n'
+        b"def main():\n  return name\n",
+    )
+    put(memory, "/names/ann.txt")
+    put(memory, "/out/ann.txt")
+    handler = FileEventHandler()
+    handler.enqueuer = PlanningEnqueuer()
+    handler.registry.update("/tasks/greet.py")
+    handler.handle_file_event("/names/ann.txt")
+    assert handler.enqueuer.batches[-1] == []
+    overwrite_behind_listing(memory, "/names/ann.txt", b"updated")
+    handler.handle_file_event("/names/ann.txt")
+    handler.manifests.close()
+    assert [job.output for job in handler.enqueuer.batches[-1]] == ["/out/ann.txt"]
+
+
+def test_outputs_are_not_stat_from_listing(memory):
+    put(memory, "/tasks/greet.py")
+    put(memory, "/names/ann.txt")
+    put(memory, "/out/ann.txt")
+    put(memory, "/names/ann.txt", b"updated")
+    # a worker writes the output again
+    overwrite_behind_listing(memory, "/out/ann.txt", b"result")
+    assert list(StalenessPlanner().stale([greet("ann")])) == []
@@ -0,0 +1,16 @@
+import numpy as np
+
+from flow import task_io
+from flow.io_adapter import LocalFSAdapter
+
+
+def test_load_npy_is_memory_mapped(tmpdir, mocker):
+    array = np.arange(12, dtype=np.float32).reshape(3, 4)
+    np.save(str(tmpdir.join("activations.npy")), array)
+    mocker.patch("flow.task_io.io", LocalFSAdapter(root_dir=str(tmpdir)))
+
+    loaded = task_io.load("/activations.npy")
+
+    assert isinstance(loaded, np.memmap)
+    assert not loaded.flags.writeable
+    np.testing.assert_array_equal(loaded, array)
@@ -33,3 +33,74 @@ def test_parser_to_task_spec():
   parser = TaskParser("tests/fixtures/task_specs/simple_with_list.py")
   spec = parser.to_spec()
   assert spec is not None
+
+import pytest
+import flow.task_parser
+from flow.task_parser import static_members, _parse_cache
+from flow.task_spec import DependentInputSpec, IterableInputSpec, AggregatingInputSpec
+
+STATIC_TASK = '''"""A task with only literal inputs."""
+from flow.task_io import load
+x = [1, 2, -3]
+pairs = ("a", "b")
+aggregated = {("{a}", "{b}"): "/data/{a}/{b}/{c}.txt"}
+name: str = "/data/names/{name_id}.txt"
+output = "/out/{name_id}-{x}-{c}.txt"
+
+def main():
+  import tensorflow
+  return name
+'''
+
+@pytest.fixture
+def parse_cache(tmpdir, monkeypatch):
+  monkeypatch.setenv("FLOW_CACHE_DIR", str(tmpdir.join("cache")))
+  _parse_cache.clear()
+  yield tmpdir
+  _parse_cache.clear()
+
+def test_static_members():
+  members = static_members(STATIC_TASK.encode())
+  assert members["main"] is None
+  assert members["x"] == [1, 2, -3]
+  assert members["aggregated"] == {("{a}", "{b}"): "/data/{a}/{b}/{c}.txt"}
+  assert "load" not in members
+
+@pytest.mark.parametrize("source", [
+  "import numpy as np\n",
+  "x = range(3)\n",
+  "x = lambda y: [y]\n",
+  "def helper():\n  pass\n",
+  "if True:\n  x = 1\n",
+])
+def test_static_members_refuses_code(source):
+  with raises(flow.task_parser._NotStatic):
+    static_members(source.encode())
+
+def test_parser_does_not_execute_literal_tasks(parse_cache, monkeypatch):
+  task = parse_cache.join("task.py")
+  task.write(STATIC_TASK)
+  def fail(path):
+    raise AssertionError("Task was executed.")
+  monkeypatch.setattr(flow.task_parser, "import_module_from_local_source", fail)
+  spec = TaskParser(str(task)).to_spec()
+  assert spec.input_names == ["aggregated", "name", "pairs", "x"]
+  assert isinstance(spec.input_specs[0], AggregatingInputSpec)
+  assert isinstance(spec.input_specs[3], IterableInputSpec)
+
+def test_parser_executes_tasks_with_lambdas(parse_cache):
+  task = parse_cache.join("task.py")
+  task.write("x = [1]\ny = lambda x: [x]\noutput = '/{x}/{y}'\n\ndef main():\n  pass\n")
+  spec = TaskParser(str(task)).to_spec()
+  assert isinstance(spec.input_specs[1], DependentInputSpec)
+  assert not parse_cache.join("cache").join("task_parser").listdir()
+
+def test_parser_caches_by_source_hash(parse_cache, monkeypatch):
+  task = parse_cache.join("task.py")
+  task.write(STATIC_TASK)
+  TaskParser(str(task))
+  assert len(parse_cache.join("cache").join("task_parser").listdir()) == 1
+  _parse_cache.clear()
+  monkeypatch.setattr(flow.task_parser, "static_members", None)
+  parser = TaskParser(str(task))
+  assert parser.output_object == "/out/{name_id}-{x}-{c}.txt"
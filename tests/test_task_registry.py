@@ -0,0 +1,85 @@
+import pytest
+
+from flow.io_adapter import LocalFSAdapter
+from flow.job_spec import io
+from flow.task_parser import TaskParseError
+from flow.task_registry import TaskRegistry
+
+GREET = (
+    'name = "/data/names/{name_id}.txt"\n'
+    'output = "/data/greetings/{name_id}.txt"\n\n'
+    "def main():\n  return name\n"
+)
+COUNT = (
+    'words = "/data/texts/{language}/{text_id}.txt"\n'
+    'output = "/data/counts/{language}/{text_id}.txt"\n\n'
+    "def main():\n  return words\n"
+)
+
+
+@pytest.fixture
+def tasks(tmpdir):
+    tmpdir.join("tasks", "greet.py").write(GREET, ensure=True)
+    tmpdir.join("tasks", "count.py").write(COUNT, ensure=True)
+    previous = io.adapter
+    io.configure(LocalFSAdapter(root_dir=str(tmpdir)))
+    yield tmpdir
+    io.configure(previous)
+
+
+def test_registry_loads_all_tasks(tasks):
+    registry = TaskRegistry()
+    names = sorted(task_spec.name for task_spec in registry.task_specs)
+    assert names == ["count.py", "greet.py"]
+
+
+def test_registry_routes_files_to_tasks(tasks):
+    registry = TaskRegistry()
+    (greet,) = registry.relevant("/data/names/ann.txt")
+    assert greet.name == "greet.py"
+    (count,) = registry.relevant("/data/texts/en/1.txt")
+    assert count.name == "count.py"
+    assert registry.relevant("/data/names/nested/ann.txt") == []
+    assert registry.relevant("/elsewhere.txt") == []
+
+
+def test_registry_parses_unchanged_tasks_once(tasks):
+    registry = TaskRegistry()
+    registry.load()
+    first = registry.get("/tasks/greet.py")
+    assert registry.update("/tasks/greet.py") is first
+    registry.load()
+    assert registry.get("/tasks/greet.py") is first
+    assert registry.metrics.counters["added"] == 2
+    assert registry.metrics.counters["unchanged"] == 3
+
+
+def test_registry_replaces_changed_task(tasks):
+    changed = []
+    registry = TaskRegistry(on_change=changed.append)
+    registry.load()
+    tasks.join("tasks", "greet.py").write(GREET.replace("/names/", "/people/"))
+    registry.update("/tasks/greet.py")
+    assert registry.relevant("/data/names/ann.txt") == []
+    (greet,) = registry.relevant("/data/people/ann.txt")
+    assert greet is registry.get("/tasks/greet.py")
+    assert changed[-1] is greet
+    assert len(registry) == 2
+
+
+def test_registry_keeps_previous_version_of_broken_task(tasks):
+    registry = TaskRegistry()
+    registry.load()
+    tasks.join("tasks", "greet.py").write("broken = True\n")
+    with pytest.raises(TaskParseError):
+        registry.update("/tasks/greet.py")
+    assert len(registry.relevant("/data/names/ann.txt")) == 1
+
+
+def test_registry_removes_task(tasks):
+    registry = TaskRegistry()
+    registry.load()
+    assert registry.remove("/tasks/greet.py").name == "greet.py"
+    assert registry.remove("/tasks/greet.py") is None
+    assert "/tasks/greet.py" not in registry
+    assert registry.relevant("/data/names/ann.txt") == []
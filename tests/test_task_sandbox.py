@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from flow.task_parser import TaskParseError
+from flow.task_sandbox import SandboxedFunction, TaskSandbox
+from flow.task_spec import DependentInputSpec
+
+DEPENDENT = (
+    "__import__('os').environ['FLOW_SANDBOX_TEST'] = 'imported'\n"
+    "model = ['a', 'b']\n"
+    "layer = lambda model: [model + str(i) for i in range(3)]\n"
+    "output = '/out/{model}/{layer}.txt'\n\n"
+    "def main():\n  return layer\n"
+)
+
+
+@pytest.fixture
+def sandbox():
+    with TaskSandbox(timeout=10, max_rss_bytes=1024 ** 3) as sandbox:
+        yield sandbox
+
+
+def write_task(tmpdir, source):
+    task = tmpdir.join("task.py")
+    task.write(source)
+    return str(task)
+
+
+def test_sandbox_parses_literal_tasks_statically(tmpdir, sandbox):
+    task = write_task(tmpdir, "x = [1, 2]\noutput = '/{x}'\n\ndef main():\n  pass\n")
+    spec = sandbox.parse(task)
+    assert len(spec.all_bindings()) == 2
+    assert sandbox.metrics.counters["static"] == 1
+    assert sandbox._pool is None
+
+
+def test_sandbox_imports_tasks_in_worker(tmpdir, sandbox):
+    spec = sandbox.parse(write_task(tmpdir, DEPENDENT))
+    assert "FLOW_SANDBOX_TEST" not in os.environ
+    (dependent,) = [s for s in spec.input_specs if isinstance(s, DependentInputSpec)]
+    assert isinstance(dependent.function, SandboxedFunction)
+    assert dependent.inputs == ["model"]
+    outputs = sorted(job.output for job in spec.to_job_specs())
+    assert outputs[:3] == ["/out/a/a0.txt", "/out/a/a1.txt", "/out/a/a2.txt"]
+    assert len(outputs) == 6
+    assert sandbox.metrics.counters["parses"] == 1
+    assert sandbox.metrics.counters["calls"] == 2
+
+
+def test_sandbox_times_out_slow_tasks(tmpdir):
+    task = write_task(tmpdir, "import time\ntime.sleep(30)\n" + DEPENDENT)
+    with TaskSandbox(timeout=0.5) as sandbox:
+        with pytest.raises(TaskParseError, match="Timed out"):
+            sandbox.parse(task)
+        assert sandbox.metrics.counters["parse_failures"] == 1
+
+
+def test_sandbox_limits_memory(tmpdir):
+    hog = "hog = b'x' * 512 * 1024 ** 2\n__import__('time').sleep(5)\n"
+    task = write_task(tmpdir, hog + DEPENDENT)
+    with TaskSandbox(max_rss_bytes=256 * 1024 ** 2) as sandbox:
+        with pytest.raises(TaskParseError, match="256 MB of memory"):
+            sandbox.parse(task)
+
+
+def test_sandboxed_functions_report_their_reads(tmpdir, sandbox, local_tasks):
+    local_tasks.join("data", "layers.txt").write("a b", ensure=True)
+    source = DEPENDENT.replace(
+        "[model + str(i) for i in range(3)]",
+        "__import__('flow.job_spec').job_spec.io"
+        ".read_range('/data/layers.txt', 0, 100).decode().split()",
+    )
+    spec = sandbox.parse(write_task(tmpdir, source))
+    assert len(spec.all_bindings()) == 4
+    assert list(spec.reads) == ["/data/layers.txt"]
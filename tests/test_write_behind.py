@@ -0,0 +1,86 @@
+import threading
+import pytest
+
+from flow.path import AbsolutePath
+from flow.write_behind import WriteBehindUploader
+
+
+@pytest.fixture
+def local_file(tmpdir):
+    def make(name, content="result"):
+        path = tmpdir.join(name)
+        path.write(content)
+        return str(path)
+
+    return make
+
+
+def test_uploads_in_order_per_output(local_file):
+    uploaded = []
+    uploader = WriteBehindUploader(
+        lambda local, remote: uploaded.append((remote, open(local).read()))
+    )
+    output = AbsolutePath("/data/out.txt")
+    for i in range(10):
+        uploader.submit(local_file(f"{i}.txt", str(i)), output)
+    uploader.close()
+    assert uploaded == [(output, str(i)) for i in range(10)]
+
+
+def test_acknowledges_and_deletes_local_file(local_file, tmpdir):
+    uploader = WriteBehindUploader(lambda local, remote: None)
+    future = uploader.submit(local_file("a.txt"), AbsolutePath("/a.txt"))
+    assert future.result(timeout=5) == "/a.txt"
+    assert not tmpdir.join("a.txt").exists()
+    uploader.close()
+
+
+def test_retries_with_backoff(local_file):
+    attempts = []
+
+    def flaky_upload(local, remote):
+        attempts.append(remote)
+        if len(attempts) < 3:
+            raise IOError("transient")
+
+    uploader = WriteBehindUploader(flaky_upload, initial_backoff=0.001)
+    uploader.submit(local_file("a.txt"), AbsolutePath("/a.txt"))
+    uploader.flush(timeout=5)
+    assert len(attempts) == 3
+    uploader.close()
+
+
+def test_flush_raises_after_giving_up(local_file):
+    def failing_upload(local, remote):
+        raise IOError("permanent")
+
+    uploader = WriteBehindUploader(
+        failing_upload, max_attempts=2, initial_backoff=0.001
+    )
+    try:
+        future = uploader.submit(local_file("a.txt"), AbsolutePath("/a.txt"))
+        with pytest.raises(IOError):
+            uploader.flush(timeout=5)
+        assert isinstance(future.exception(), IOError)
+    finally:
+        uploader.close()
+
+
+def test_submit_blocks_while_over_budget(local_file):
+    release = threading.Event()
+    uploader = WriteBehindUploader(lambda local, remote: release.wait(), max_pending=1)
+    uploader.submit(local_file("a.txt"), AbsolutePath("/a.txt"))
+    submitted = threading.Event()
+
+    def submit_second():
+        uploader.submit(local_file("b.txt"), AbsolutePath("/b.txt"))
+        submitted.set()
+
+    thread = threading.Thread(target=submit_second)
+    thread.start()
+    assert not submitted.wait(0.1)
+    release.set()
+    assert submitted.wait(5)
+    thread.join()
+    uploader.close()
+    assert uploader.pending == 0